@@ -1,29 +1,99 @@
 import math
 
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+from audio_buffer import SAMPLE_RATE
+from dsp_filters import SOSFilter, peaking, low_shelf, high_shelf
+
+# Every processor below accepts either a Python list (processed with the
+# original per-sample loops) or a float32 ndarray (processed vectorized).
+# Both paths modify the buffer in place and share the same parameters.
+
+_rng = np.random.default_rng() if USE_NUMPY else None
+
+# Samples per block in the vectorized processors, so their temporaries
+# stay the same small size for any length of audio
+BLOCK_SIZE = 1 << 16
+
+def _is_array(audio) -> bool:
+    return USE_NUMPY and isinstance(audio, np.ndarray)
+
+def _db_to_amplitude(db: float) -> float:
+    # 20 * log10(abs(x) + 1e-6) < db  <=>  abs(x) < 10**(db / 20) - 1e-6
+    return 10 ** (db / 20) - 1e-6
+
+def _apply_sos(audio, sos):
+    if _is_array(audio):
+        SOSFilter(sos).process(audio)
+        return
+    # Direct form II, one section after another
+    for b0, b1, b2, _, a1, a2 in sos:
+        w1 = w2 = 0.0
+        for i in range(len(audio)):
+            w = audio[i] - a1 * w1 - a2 * w2
+            audio[i] = b0 * w + b1 * w1 + b2 * w2
+            w2 = w1
+            w1 = w
+
+def three_band_sos(low_gain, mid_gain, high_gain, sample_rate=SAMPLE_RATE):
+    # Low: <300Hz (shelf), Mid: 300-3000Hz (peak at the geometric centre), High: >3000Hz (shelf)
+    sos = []
+    if low_gain:
+        sos.append(low_shelf(300.0, low_gain, 0.7071, sample_rate))
+    if mid_gain:
+        sos.append(peaking(math.sqrt(300.0 * 3000.0), mid_gain, 0.55, sample_rate))
+    if high_gain:
+        sos.append(high_shelf(3000.0, high_gain, 0.7071, sample_rate))
+    return sos
+
 def apply_3band_eq(audio: list, low_gain: float = 0.0, mid_gain: float = 0.0, high_gain: float = 0.0):
-    # Simple 3-band EQ
-    # Low: <300Hz, Mid: 300-3000Hz, High: >3000Hz
-    # Placeholder: apply gains to frequency ranges
-    pass
+    sos = three_band_sos(low_gain, mid_gain, high_gain)
+    if sos:
+        _apply_sos(audio, sos)
 
 def apply_parametric_eq(audio: list, freq: float, gain: float, q: float):
-    # Simple biquad filter approximation
-    # Placeholder for actual EQ
-    pass
+    # One peaking biquad: `gain` dB at `freq` Hz, bandwidth set by `q`
+    if gain:
+        _apply_sos(audio, [peaking(freq, gain, q, SAMPLE_RATE)])
 
 def apply_dithering(audio: list, bits: int):
+    if _is_array(audio):
+        noise = np.empty(min(len(audio), BLOCK_SIZE), dtype=np.float32)
+        for start in range(0, len(audio), BLOCK_SIZE):
+            block = audio[start:start + BLOCK_SIZE]
+            block_noise = noise[:len(block)]
+            _rng.random(dtype=np.float32, out=block_noise)
+            block_noise -= 0.5
+            block_noise *= 1.0 / (1 << bits)
+            block += block_noise
+        return
     import random
     for i in range(len(audio)):
         noise = (random.random() - 0.5) / (1 << bits)
         audio[i] += noise
 
 def apply_noise_gate(audio: list, threshold: float = -60.0, ratio: float = 10.0):
+    if _is_array(audio):
+        level = _db_to_amplitude(threshold)
+        for start in range(0, len(audio), BLOCK_SIZE):
+            block = audio[start:start + BLOCK_SIZE]
+            block[np.abs(block) < level] *= np.float32(1 / ratio)
+        return
     # Simple noise gate
     for i in range(len(audio)):
         if 20 * math.log10(abs(audio[i]) + 1e-6) < threshold:
             audio[i] *= (1 / ratio)
 
 def apply_compressor(audio: list, threshold: float = -20.0, ratio: float = 4.0, attack: float = 0.01, release: float = 0.1):
+    if _is_array(audio):
+        compressor = StreamingCompressor(threshold, ratio)
+        for start in range(0, len(audio), BLOCK_SIZE):
+            compressor.process(audio[start:start + BLOCK_SIZE])
+        return
     # Simple compressor
     gain = 1.0
     for i in range(len(audio)):
@@ -35,13 +105,74 @@ def apply_compressor(audio: list, threshold: float = -20.0, ratio: float = 4.0,
             gain = min(1.0, gain + 1e-4)  # slow release
         audio[i] *= gain
 
+class StreamingCompressor:
+    """apply_compressor for float32 audio arriving in blocks.
+
+    The gain at the end of one block is where the next one starts, so any
+    block split gives the same result as one call over the whole signal.
+    """
+
+    def __init__(self, threshold: float = -20.0, ratio: float = 4.0):
+        self.threshold = threshold
+        self.ratio = ratio
+        self.gain = 1.0
+
+    def process(self, block):
+        self.gain = _apply_compressor_vectorized(block, self.threshold, self.ratio, initial_gain=self.gain)
+
+def _apply_compressor_vectorized(audio, threshold, ratio, release_step=1e-4, initial_gain=1.0):
+    # The loop above is the recurrence
+    #   over threshold:  g[i] = min(g[i-1], target[i])
+    #   otherwise:       g[i] = min(1, g[i-1] + step)
+    # Subtracting the release ramp r[i] = step * (samples released so far)
+    # turns both branches into a running minimum of
+    #   h[i] = g[i] - r[i],  h[i] = min(h[i-1], cap[i] - r[i])
+    # where cap is the target over threshold and 1.0 otherwise.
+    # Returns the gain after the last sample.
+    if len(audio) == 0:
+        return initial_gain
+    magnitude = np.abs(audio)
+    over = magnitude > _db_to_amplitude(threshold)
+    cap = np.ones(len(audio), dtype=np.float64)
+    if over.any():
+        # 10**(-(20*log10(m + 1e-6) - threshold) * k / 20) == 10**(threshold*k/20) * (m + 1e-6)**-k
+        k = 1 - 1 / ratio
+        cap[over] = 10 ** (threshold * k / 20) * (magnitude[over].astype(np.float64) + 1e-6) ** -k
+    ramp = np.cumsum(~over, dtype=np.float64) * release_step
+    gain = np.minimum.accumulate(cap - ramp)
+    np.minimum(gain, initial_gain, out=gain)
+    gain += ramp
+    np.minimum(gain, 1.0, out=gain)
+    audio *= gain.astype(np.float32)
+    return float(gain[-1])
+
 def apply_limiter(audio: list, threshold: float = -6.0):
+    if _is_array(audio):
+        ceiling = 10**(threshold / 20)
+        np.clip(audio, -ceiling, ceiling, out=audio)
+        return
     # Limiter
     for i in range(len(audio)):
         if abs(audio[i]) > 10**(threshold / 20):
             audio[i] = math.copysign(10**(threshold / 20), audio[i])
 
 def trim_silence(audio: list, threshold: float = -60.0):
+    if _is_array(audio):
+        level = _db_to_amplitude(threshold)
+        start = end = None
+        for offset in range(0, len(audio), BLOCK_SIZE):
+            loud = np.flatnonzero(np.abs(audio[offset:offset + BLOCK_SIZE]) > level)
+            if len(loud):
+                start = offset + int(loud[0])
+                break
+        if start is None:
+            return audio
+        for offset in range(len(audio), start, -BLOCK_SIZE):
+            loud = np.flatnonzero(np.abs(audio[max(offset - BLOCK_SIZE, start):offset]) > level)
+            if len(loud):
+                end = max(offset - BLOCK_SIZE, start) + int(loud[-1]) + 1
+                break
+        return audio[start:end]
     # Trim leading/trailing silence
     start = 0
     end = len(audio)
@@ -57,4 +188,4 @@ def trim_silence(audio: list, threshold: float = -60.0):
 
 def apply_stereo_imaging(audio: list, width: float = 1.0):
     # For mono, placeholder
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,275 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from engine import SynthesisEngine, SynthRequest, DEFAULT_WORKERS
+from batching import run_batched, DEFAULT_MAX_BATCH_SIZE
+from tracing import render_metrics, PROMETHEUS_CONTENT_TYPE
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_BATCH_WINDOW_MS = 5.0
+DEFAULT_DEADLINE_MS = 30000.0
+MAX_BODY_BYTES = 1 << 20
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+                429: 'Too Many Requests', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+
+class QueueFullError(Exception):
+    pass
+
+class DeadlineExceededError(Exception):
+    pass
+
+class _PendingSynth:
+    def __init__(self, prepared, deadline, future):
+        self.prepared = prepared
+        self.deadline = deadline
+        self.future = future
+
+class MicroBatchScheduler:
+    """Collects requests for a few milliseconds and batches them by model and voice.
+
+    Admission is bounded: a request counts against `queue_size` from the
+    moment it is accepted until it is answered, through text preparation,
+    the batch queue, inference and encoding, so once `queue_size` requests
+    are in flight new ones are refused and callers can shed load. Requests
+    whose deadline passes at any stage are failed without waiting further.
+
+    Inference runs on its own executor, so text preparation and encoding
+    of other requests never hold up a batch.
+    """
+
+    def __init__(self, engine: SynthesisEngine, queue_size=DEFAULT_QUEUE_SIZE, batch_window_ms=DEFAULT_BATCH_WINDOW_MS,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE, workers=DEFAULT_WORKERS):
+        self.engine = engine
+        self.queue_size = queue_size
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        # Only admitted requests are queued, so the admission bound also bounds the queue
+        self._queue = asyncio.Queue()
+        self._admitted = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='async-infer')
+        # Text preparation, post-processing and encoding
+        self._pipeline_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='async-pipeline')
+        self._slots = asyncio.Semaphore(workers)
+        self._task = None
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def in_flight(self) -> int:
+        return self._admitted
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+        self._pipeline_executor.shutdown(wait=False)
+
+    async def submit(self, request: SynthRequest, deadline: float) -> bytes:
+        """Queue a request and wait for its MP3; `deadline` is in loop time."""
+        loop = asyncio.get_running_loop()
+        if loop.time() >= deadline:
+            raise DeadlineExceededError()
+        if self._admitted >= self.queue_size:
+            raise QueueFullError()
+        self._admitted += 1
+        try:
+            prepare = loop.run_in_executor(self._pipeline_executor, self.engine.prepare, request)
+            prepared = await asyncio.wait_for(prepare, max(deadline - loop.time(), 0))
+            pending = _PendingSynth(prepared, deadline, loop.create_future())
+            self._queue.put_nowait(pending)
+            return await asyncio.wait_for(pending.future, max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError()
+        finally:
+            self._admitted -= 1
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        pending = [await self._queue.get()]
+        window_end = loop.time() + self.batch_window_ms / 1000.0
+        while True:
+            timeout = window_end - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return pending
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            groups = {}
+            for pending in await self._collect():
+                if pending.future.done():
+                    continue
+                if loop.time() >= pending.deadline:
+                    pending.future.set_exception(DeadlineExceededError())
+                    continue
+                key = (pending.prepared.model_path, pending.prepared.voice_key)
+                groups.setdefault(key, []).append(pending)
+            for group in groups.values():
+                await self._slots.acquire()
+                loop.create_task(self._run_group(group))
+
+    async def _run_group(self, group):
+        loop = asyncio.get_running_loop()
+        try:
+            entries = [entry for pending in group for entry in pending.prepared.entries]
+            cache_keys = None
+            if all(pending.prepared.cache_keys is not None for pending in group):
+                cache_keys = [key for pending in group for key in pending.prepared.cache_keys]
+            outputs = await loop.run_in_executor(self._executor, self.engine.infer, entries, cache_keys, self._run_batched)
+            # Post-process and encode per request so each client is answered
+            # as soon as its own audio is ready
+            finishing = []
+            offset = 0
+            for pending in group:
+                count = len(pending.prepared.entries)
+                finishing.append(self._finish(pending, outputs[offset:offset + count]))
+                offset += count
+            await asyncio.gather(*finishing)
+        except Exception as e:
+            for pending in group:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _run_batched(self, entries):
+        return run_batched(entries, self.max_batch_size)
+
+    def _render(self, prepared, outputs) -> bytes:
+        return self.engine.encode(self.engine.finish(prepared, outputs), prepared.request)
+
+    async def _finish(self, pending, outputs):
+        loop = asyncio.get_running_loop()
+        try:
+            mp3_data = await loop.run_in_executor(self._pipeline_executor, self._render, pending.prepared, outputs)
+        except Exception as e:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+            return
+        if not pending.future.done():
+            pending.future.set_result(mp3_data)
+
+class AsyncHTTPServer:
+    """Minimal asyncio HTTP/1.1 front end for the micro-batching scheduler."""
+
+    def __init__(self, scheduler: MicroBatchScheduler, deadline_ms=DEFAULT_DEADLINE_MS, dict_dir=None):
+        self.scheduler = scheduler
+        self.deadline_ms = deadline_ms
+        # Directory clients may pick pronunciation dictionaries from; None refuses 'dict'
+        self.dict_dir = dict_dir
+
+    async def handle(self, reader, writer):
+        try:
+            status, headers, body = await self._respond(reader)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, headers, body = self._json(400, {'error': 'Malformed HTTP request'})
+        head = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}", f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        try:
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _json(status, data, extra_headers=None):
+        headers = {'Content-Type': 'application/json'}
+        headers.update(extra_headers or {})
+        return status, headers, json.dumps(data).encode('utf-8')
+
+    async def _respond(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        method, target, _ = request_line.split(' ', 2)
+        path, _, query_string = target.partition('?')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_BYTES:
+            return self._json(413, {'error': 'Request body too large'})
+        body = await reader.readexactly(length) if length else b''
+
+        if path == '/status':
+            data = {'status': 'running', 'queued': self.scheduler.queued, 'in_flight': self.scheduler.in_flight}
+            cache = self.scheduler.engine.cache
+            if cache is not None:
+                data['cache'] = dict(cache.stats.to_dict(), entries=len(cache), bytes=cache.size_bytes)
+            return self._json(200, data)
+        if path == '/metrics':
+            return 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}, render_metrics().encode('utf-8')
+        if path == '/voices':
+            from voice import find_voices
+            query = {name: values[0] for name, values in parse_qs(query_string).items()}
+            voices = find_voices(query.get('locale'), query.get('gender'))
+            return self._json(200, [{'name': v.name, 'gender': v.gender, 'locale': v.locale} for v in voices])
+        if path != '/synth':
+            return self._json(404, {'error': 'Not found'})
+        if method != 'POST':
+            return self._json(405, {'error': 'Use POST'})
+        try:
+            synth_request = SynthRequest.from_client(json.loads(body or b'null'), self.dict_dir)
+            if not synth_request.text:
+                raise ValueError("'text' is required")
+            deadline_ms = float(headers.get('x-deadline-ms', self.deadline_ms))
+        except ValueError as e:
+            return self._json(400, {'error': str(e)})
+
+        deadline = asyncio.get_running_loop().time() + deadline_ms / 1000.0
+        try:
+            mp3_data = await self.scheduler.submit(synth_request, deadline)
+        except QueueFullError:
+            return self._json(429, {'error': 'Server busy'}, {'Retry-After': '1'})
+        except DeadlineExceededError:
+            return self._json(504, {'error': 'Deadline exceeded'})
+        except Exception as e:
+            return self._json(500, {'error': str(e)})
+        return 200, {'Content-Type': 'audio/mpeg'}, mp3_data
+
+async def serve(port=8080, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                batch_window_ms=DEFAULT_BATCH_WINDOW_MS, deadline_ms=DEFAULT_DEADLINE_MS, cache=None, host='0.0.0.0', warmup=True,
+                dict_dir=None):
+    if warmup:
+        from warmup import warm_up
+        await asyncio.get_running_loop().run_in_executor(None, warm_up)
+    engine = SynthesisEngine(workers, cache)
+    scheduler = MicroBatchScheduler(engine, queue_size, batch_window_ms, workers=workers)
+    scheduler.start()
+    http = AsyncHTTPServer(scheduler, deadline_ms, dict_dir)
+    server = await asyncio.start_server(http.handle, host, port)
+    print(f"Async server listening on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await scheduler.stop()
+        engine.close()
+
+def start_async_http_server(port=8080, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                            batch_window_ms=DEFAULT_BATCH_WINDOW_MS, deadline_ms=DEFAULT_DEADLINE_MS, cache=None, warmup=True,
+                            dict_dir=None):
+    try:
+        asyncio.run(serve(port, workers, queue_size, batch_window_ms, deadline_ms, cache, warmup=warmup, dict_dir=dict_dir))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,90 @@
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+from array import array
+
+SAMPLE_RATE = 44100
+INT16_BLOCK_SIZE = 1 << 16
+
+def as_pcm(audio):
+    """Return `audio` as a contiguous float32 array, copying only if needed."""
+    if not USE_NUMPY:
+        return audio
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def silence(num_samples: int):
+    if not USE_NUMPY:
+        return array('f', bytes(4 * num_samples))
+    return np.zeros(num_samples, dtype=np.float32)
+
+def to_int16(pcm, out=None):
+    """Convert float PCM in [-1, 1] to int16 block by block, clipping overs."""
+    pcm = as_pcm(pcm)
+    if out is None:
+        out = np.empty(len(pcm), dtype=np.int16)
+    scratch = np.empty(min(len(pcm), INT16_BLOCK_SIZE), dtype=np.float32)
+    for start in range(0, len(pcm), INT16_BLOCK_SIZE):
+        block = pcm[start:start + INT16_BLOCK_SIZE]
+        tmp = scratch[:len(block)]
+        np.multiply(block, 32767, out=tmp)
+        np.clip(tmp, -32768, 32767, out=tmp)
+        out[start:start + len(block)] = tmp
+    return out
+
+class PCMBuffer:
+    """Growable mono PCM buffer backed by one contiguous float32 array.
+
+    Appends amortize reallocation by doubling the capacity; `samples` is a
+    view of the filled part, so reading it never copies.
+    """
+
+    def __init__(self, capacity=SAMPLE_RATE, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self._length = 0
+        if USE_NUMPY:
+            self._data = np.zeros(max(capacity, 1), dtype=np.float32)
+        else:
+            self._data = array('f')
+
+    def _reserve(self, extra):
+        needed = self._length + extra
+        if needed > len(self._data):
+            grown = np.zeros(max(needed, 2 * len(self._data)), dtype=np.float32)
+            grown[:self._length] = self._data[:self._length]
+            self._data = grown
+
+    def append(self, pcm):
+        if not USE_NUMPY:
+            self._data.extend(pcm)
+            self._length = len(self._data)
+            return
+        pcm = as_pcm(pcm)
+        self._reserve(len(pcm))
+        self._data[self._length:self._length + len(pcm)] = pcm
+        self._length += len(pcm)
+
+    def append_silence(self, num_samples: int):
+        if not USE_NUMPY:
+            self._data.extend(silence(num_samples))
+            self._length = len(self._data)
+            return
+        self._reserve(num_samples)
+        self._data[self._length:self._length + num_samples] = 0.0
+        self._length += num_samples
+
+    @property
+    def samples(self):
+        return self._data[:self._length]
+
+    @property
+    def duration(self) -> float:
+        return self._length / self.sample_rate
+
+    def clear(self):
+        self._length = 0
+
+    def __len__(self):
+        return self._length
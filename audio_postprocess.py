@@ -4,47 +4,83 @@ try:
 except ImportError:
     USE_NUMPY = False
     np = None
-from advanced_audio import apply_parametric_eq, apply_dithering, apply_noise_gate, apply_compressor, apply_limiter, trim_silence, apply_stereo_imaging
+from audio_buffer import as_pcm, SAMPLE_RATE
+from loudness import integrated_loudness, normalization_gain
+from functools import lru_cache
+from dsp_filters import SOSFilter, peaking, low_shelf, high_shelf, highpass
+from advanced_audio import apply_dithering, apply_noise_gate, apply_compressor, apply_limiter, trim_silence, apply_stereo_imaging
 
-def postprocess_audio(audio: list, eq_preset='neutral', target_lufs=-16.0, dither_bits=16, noise_gate=True, compressor=True, limiter=True, trim_silence_flag=True):
+# name -> filter sections as (kind, frequency Hz, gain dB, Q)
+EQ_PRESETS = {
+    'neutral': (),
+    'narration': (('peaking', 300.0, 2.0, 1.0),),
+    'podcast': (('peaking', 5000.0, -1.0, 2.0),),
+}
+
+_EQ_DESIGNS = {
+    'peaking': peaking,
+    'low_shelf': low_shelf,
+    'high_shelf': high_shelf,
+    'highpass': lambda freq, gain, q, sample_rate: highpass(freq, q, sample_rate),
+}
+
+@lru_cache(maxsize=32)
+def preset_sos(eq_preset, sample_rate=SAMPLE_RATE):
+    """SOS coefficients of a preset; unknown presets have none."""
+    return tuple(_EQ_DESIGNS[kind](freq, gain, q, sample_rate) for kind, freq, gain, q in EQ_PRESETS.get(eq_preset, ()))
+
+def eq_filter(eq_preset, sample_rate=SAMPLE_RATE):
+    """A stateful filter for block-wise EQ, or None when the preset does nothing."""
+    sos = preset_sos(eq_preset, sample_rate)
+    return SOSFilter(sos) if sos else None
+
+def apply_eq_preset(pcm, eq_preset, sample_rate=SAMPLE_RATE):
+    eq = eq_filter(eq_preset, sample_rate)
+    if eq is not None:
+        eq.process(pcm)
+
+def postprocess_audio(audio, eq_preset='neutral', target_lufs=-16.0, dither_bits=16, noise_gate=True, compressor=True, limiter=True, trim_silence_flag=True):
     if not USE_NUMPY:
         print("NumPy not available, skipping postprocessing")
-        return
+        return audio
+    # The whole chain runs vectorized on one float32 buffer; a float32
+    # ndarray is processed in place, anything else is converted once.
+    pcm = as_pcm(audio)
+
     # Trim silence first
     if trim_silence_flag:
-        audio[:] = trim_silence(audio)
+        pcm = trim_silence(pcm)
 
     # Normalize
-    max_val = max(abs(x) for x in audio) if audio else 1.0
+    max_val = max(float(pcm.max()), -float(pcm.min())) if len(pcm) else 1.0
     if max_val > 0:
-        audio[:] = [x / max_val for x in audio]
+        pcm /= np.float32(max_val)
 
     # Apply effects
-    if eq_preset == 'narration':
-        apply_parametric_eq(audio, 300.0, 2.0, 1.0)
-    elif eq_preset == 'podcast':
-        apply_parametric_eq(audio, 5000.0, -1.0, 2.0)
+    apply_eq_preset(pcm, eq_preset)
 
     # Noise gate
     if noise_gate:
-        apply_noise_gate(audio)
+        apply_noise_gate(pcm)
 
     # Compressor
     if compressor:
-        apply_compressor(audio)
+        apply_compressor(pcm)
 
-    # Loudness normalization (simple)
-    rms = np.sqrt(np.mean(np.array(audio)**2))
-    if rms > 0:
-        gain = 10**(target_lufs / 20) / (20 * np.log10(rms + 1e-6))
-        audio[:] = [x * gain for x in audio]
+    # Loudness normalization (BS.1770 integrated loudness)
+    if len(pcm):
+        pcm *= np.float32(normalization_gain(integrated_loudness(pcm), target_lufs))
 
     # Limiter
     if limiter:
-        apply_limiter(audio)
+        apply_limiter(pcm)
 
     # Dithering
-    apply_dithering(audio, dither_bits)
+    apply_dithering(pcm, dither_bits)
 
     # Stereo imaging (placeholder for mono)
-    apply_stereo_imaging(audio)
\ No newline at end of file
+    apply_stereo_imaging(pcm)
+
+    if isinstance(audio, list):
+        audio[:] = pcm.tolist()
+    return pcm
@@ -0,0 +1,157 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+def plan_batch(input_dir: str, out_dir: str, force=False):
+    """Return (todo, skipped) lists of (input_path, output_path) pairs.
+
+    An output counts as up to date when it exists and is not older than its
+    input, so an interrupted batch resumes where it stopped.
+    """
+    todo = []
+    skipped = []
+    for file in sorted(os.listdir(input_dir)):
+        if not file.endswith('.txt'):
+            continue
+        input_path = os.path.join(input_dir, file)
+        output_path = os.path.join(out_dir, file[:-len('.txt')] + '.mp3')
+        if not force and os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path):
+            skipped.append((input_path, output_path))
+        else:
+            todo.append((input_path, output_path))
+    return todo, skipped
+
+def threads_per_worker(jobs: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(jobs, 1))
+
+def model_paths_for(todo) -> list:
+    """Models the files in `todo` will use; locales are detected from each text, as render_file does."""
+    from multilingual import get_model_for_locale, detect_language
+    paths = set()
+    for input_path, _ in todo:
+        try:
+            with open(input_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        paths.add(get_model_for_locale(detect_language(text)).model_path)
+    return sorted(paths)
+
+def init_worker(intra_op_threads: int, model_paths):
+    # Pin ONNX Runtime to this worker's share of the cores and load and
+    # warm the batch's models once, before the first file arrives
+    from session_pool import get_pool
+    from warmup import warm_up_model
+    pool = get_pool()
+    pool.default_options = {'intra_op_num_threads': intra_op_threads, 'inter_op_num_threads': 1}
+    for model_path in model_paths:
+        warm_up_model(model_path, pool=pool)
+
+def render_file(input_path: str, output_path: str, voice='narrator', bitrate=320, qa=False):
+    """Render one text file to MP3; returns (error or None, seconds, audio seconds, quality report or None).
+
+    With `qa`, the rendered PCM is analyzed while it is still in memory and
+    the report is written next to the output.
+    """
+    from engine import SynthRequest, get_engine
+    from mp3_encoder import encode_mp3
+    started = time.perf_counter()
+    try:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        result = get_engine().synthesize(SynthRequest(text=text, voice=voice, bitrate=bitrate))
+        # Write next to the final path and rename, so a crash never leaves a
+        # truncated output that resume would treat as done
+        tmp_path = output_path + '.part'
+        try:
+            if not encode_mp3(result.pcm, tmp_path, bitrate):
+                raise RuntimeError("MP3 encoding is not available")
+            os.replace(tmp_path, output_path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        report = None
+        if qa:
+            from quality_metrics import analyze_pcm, quality_report_path, write_report
+            report = analyze_pcm(result.pcm)
+            write_report(report, quality_report_path(output_path))
+        return None, time.perf_counter() - started, result.duration, report
+    except Exception as e:
+        return str(e), time.perf_counter() - started, 0.0, None
+
+QUALITY_SUMMARY_FILE = 'quality_summary.json'
+
+def load_quality_reports(skipped):
+    """Reports of up-to-date outputs, so a resumed batch's QA summary covers every file.
+
+    Returns ({output_path: report}, pairs whose report is missing, stale or
+    unreadable and which must be rendered again to get one).
+    """
+    import json
+    from quality_metrics import quality_report_path
+    reports = {}
+    missing = []
+    for input_path, output_path in skipped:
+        path = quality_report_path(output_path)
+        try:
+            if os.path.getmtime(path) < os.path.getmtime(output_path):
+                raise ValueError("stale quality report")
+            with open(path, 'r', encoding='utf-8') as f:
+                reports[output_path] = json.load(f)
+        except (OSError, ValueError):
+            missing.append((input_path, output_path))
+    return reports, missing
+
+def run_batch(input_dir: str, out_dir: str, voice='narrator', bitrate=320, jobs=1, force=False, qa=False) -> dict:
+    os.makedirs(out_dir, exist_ok=True)
+    todo, skipped = plan_batch(input_dir, out_dir, force)
+    quality = {}
+    if qa:
+        quality, missing = load_quality_reports(skipped)
+        skipped = [pair for pair in skipped if pair not in missing]
+        todo = sorted(todo + missing)
+    total = len(todo)
+    print(f"Batch: {total} to render, {len(skipped)} up to date, {jobs} job(s)")
+    summary = {'rendered': 0, 'skipped': len(skipped), 'failed': 0, 'audio_seconds': 0.0}
+    model_paths = model_paths_for(todo)
+    started = time.perf_counter()
+
+    def report(done, input_path, output_path, error, seconds, audio_seconds, quality_report):
+        if error:
+            summary['failed'] += 1
+            print(f"[{done}/{total}] FAILED {input_path}: {error}")
+        else:
+            summary['rendered'] += 1
+            summary['audio_seconds'] += audio_seconds
+            qa_note = ''
+            if quality_report is not None:
+                quality[output_path] = quality_report
+                qa_note = f", QA: {'; '.join(quality_report['issues']) or 'pass'}"
+            print(f"[{done}/{total}] {input_path} -> {output_path} ({seconds:.2f}s{qa_note})")
+
+    if jobs <= 1:
+        init_worker(threads_per_worker(1), model_paths)
+        for done, (input_path, output_path) in enumerate(todo, 1):
+            report(done, input_path, output_path, *render_file(input_path, output_path, voice, bitrate, qa))
+    elif todo:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(threads_per_worker(jobs), model_paths)) as executor:
+            futures = {executor.submit(render_file, i, o, voice, bitrate, qa): (i, o) for i, o in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                report(done, *futures[future], *future.result())
+
+    elapsed = time.perf_counter() - started
+    summary['elapsed_seconds'] = elapsed
+    summary['files_per_minute'] = summary['rendered'] / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"Batch synthesis completed in {out_dir}: {summary['rendered']} rendered, "
+          f"{summary['skipped']} skipped, {summary['failed']} failed in {elapsed:.1f}s "
+          f"({summary['files_per_minute']:.1f} files/min)")
+    if qa:
+        from quality_metrics import summarize_reports, write_report
+        summary['quality'] = summarize_reports(quality)
+        summary_path = os.path.join(out_dir, QUALITY_SUMMARY_FILE)
+        write_report(summary['quality'], summary_path)
+        print(f"QA: {summary['quality']['passed']} passed, {summary['quality']['failed']} failed; summary in {summary_path}")
+    return summary
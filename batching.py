@@ -0,0 +1,144 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from session_pool import get_session
+
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 5.0
+
+class BatchEntry:
+    # An InferenceJob plus what it needs to share a batch with others
+    def __init__(self, model_path, voice, job):
+        self.model_path = model_path
+        self.voice = voice
+        self.job = job
+
+    def group_key(self):
+        job = self.job
+        return (self.model_path, self.voice, job.rate, job.pitch, job.volume, job.emotion,
+                job.jitter, job.shimmer, job.emphasis, job.breath)
+
+def plan_batches(entries, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+    """Group entries sharing model, voice and prosody into batches of indices.
+
+    Within a group, entries are ordered by token count so that each batch
+    pads to similar lengths.
+    """
+    groups = {}
+    for i, entry in enumerate(entries):
+        groups.setdefault(entry.group_key(), []).append(i)
+    batches = []
+    for indices in groups.values():
+        indices.sort(key=lambda i: len(entries[i].job.tokens))
+        for start in range(0, len(indices), max_batch_size):
+            batches.append(indices[start:start + max_batch_size])
+    return batches
+
+def run_batched(entries, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+    results = [None] * len(entries)
+    for batch in plan_batches(entries, max_batch_size):
+        session = get_session(entries[batch[0]].model_path)
+        outputs = session.run_batch_inference([entries[i].job for i in batch])
+        for i, pcm in zip(batch, outputs):
+            results[i] = pcm
+    return results
+
+class InferenceBatcher:
+    """Coalesces inference jobs submitted from many threads into batches.
+
+    Jobs that arrive within `max_wait_ms` of the first queued job are
+    grouped with it, so concurrent requests for the same model, voice and
+    prosody share one model call.
+    """
+
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name='inference-batcher', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def submit(self, entries):
+        self.start()
+        futures = []
+        for entry in entries:
+            future = Future()
+            self._queue.put((entry, future))
+            futures.append(future)
+        return futures
+
+    def run(self, entries):
+        return [f.result() for f in self.submit(entries)]
+
+    def _collect(self, first):
+        pending = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while True:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            pending.append(item)
+        return pending
+
+    def _worker(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = self._collect(first)
+            entries = [entry for entry, _ in pending]
+            for batch in plan_batches(entries, self.max_batch_size):
+                try:
+                    session = get_session(entries[batch[0]].model_path)
+                    outputs = session.run_batch_inference([entries[i].job for i in batch])
+                except Exception as e:
+                    for i in batch:
+                        pending[i][1].set_exception(e)
+                    continue
+                for i, pcm in zip(batch, outputs):
+                    pending[i][1].set_result(pcm)
+
+_shared_batcher = None
+_shared_lock = threading.Lock()
+
+def start_shared_batcher(max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS) -> InferenceBatcher:
+    global _shared_batcher
+    with _shared_lock:
+        if _shared_batcher is None:
+            _shared_batcher = InferenceBatcher(max_batch_size, max_wait_ms)
+            _shared_batcher.start()
+        return _shared_batcher
+
+def stop_shared_batcher():
+    global _shared_batcher
+    with _shared_lock:
+        batcher, _shared_batcher = _shared_batcher, None
+    if batcher is not None:
+        batcher.stop()
+
+def run_inference_jobs(entries):
+    # Long-running servers start the shared batcher so concurrent requests
+    # are coalesced; otherwise batch within this call only.
+    batcher = _shared_batcher
+    if batcher is not None:
+        return batcher.run(entries)
+    return run_batched(entries)
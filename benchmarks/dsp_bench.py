@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Benchmark the post-processing chain: per-sample loops vs. vectorized float32.
+
+Run from the repository root:
+    python -m benchmarks.dsp_bench [seconds]
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from advanced_audio import apply_parametric_eq, apply_noise_gate, apply_compressor, apply_limiter, trim_silence, apply_dithering
+
+SAMPLE_RATE = 44100
+
+def _stages():
+    return [
+        ('trim_silence', lambda a: trim_silence(a)),
+        ('eq', lambda a: apply_parametric_eq(a, 300.0, 2.0, 1.0)),
+        ('noise_gate', lambda a: apply_noise_gate(a)),
+        ('compressor', lambda a: apply_compressor(a)),
+        ('limiter', lambda a: apply_limiter(a)),
+        ('dithering', lambda a: apply_dithering(a, 16)),
+    ]
+
+def _time(fn, audio):
+    start = time.perf_counter()
+    fn(audio)
+    return time.perf_counter() - start
+
+def run_benchmark(seconds=10.0):
+    n = int(seconds * SAMPLE_RATE)
+    random.seed(0)
+    source = [random.gauss(0, 0.2) for _ in range(n)]
+    print(f"Post-processing benchmark: {seconds:.0f}s of audio ({n} samples)")
+    print(f"{'stage':<14}{'loop (s)':>12}{'numpy (s)':>12}{'speedup':>10}")
+    total_loop = total_numpy = 0.0
+    for name, fn in _stages():
+        loop_time = _time(fn, list(source))
+        numpy_time = _time(fn, np.array(source, dtype=np.float32))
+        total_loop += loop_time
+        total_numpy += numpy_time
+        print(f"{name:<14}{loop_time:>12.4f}{numpy_time:>12.4f}{loop_time / max(numpy_time, 1e-9):>9.1f}x")
+    print(f"{'total':<14}{total_loop:>12.4f}{total_numpy:>12.4f}{total_loop / max(total_numpy, 1e-9):>9.1f}x")
+    print(f"Vectorized chain runs at {seconds / max(total_numpy, 1e-9):.0f}x real time")
+
+if __name__ == "__main__":
+    run_benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 10.0)
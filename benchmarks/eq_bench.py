@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Benchmark the SOS filter bank: EQ presets and K-weighting, block-wise float32.
+
+Run from the repository root:
+    python -m benchmarks.eq_bench [seconds]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import dsp_filters
+from audio_postprocess import EQ_PRESETS, eq_filter, preset_sos
+from advanced_audio import three_band_sos
+from loudness import k_weighting_sos
+
+SAMPLE_RATE = 44100
+BLOCK_SIZES = (1024, 16384, 1 << 18)
+
+def _filters():
+    filters = [(name, lambda name=name: eq_filter(name)) for name in EQ_PRESETS if preset_sos(name)]
+    filters.append(('3-band', lambda: dsp_filters.SOSFilter(three_band_sos(3.0, -2.0, 1.5))))
+    filters.append(('k-weighting', lambda: dsp_filters.SOSFilter(k_weighting_sos(SAMPLE_RATE))))
+    return filters
+
+def run_benchmark(seconds=60.0):
+    n = int(seconds * SAMPLE_RATE)
+    source = np.random.default_rng(0).normal(0, 0.2, n).astype(np.float32)
+    backend = 'scipy.signal.sosfilt' if dsp_filters.USE_SCIPY else f'numpy fallback (rows of {dsp_filters.ROW_SIZE})'
+    print(f"EQ benchmark: {seconds:.0f}s of audio, {backend}")
+    print(f"{'filter':<13}{'sections':>9}{'block':>9}{'time (s)':>10}{'x real time':>13}{'% of RT':>9}")
+    for name, make in _filters():
+        for block_size in BLOCK_SIZES:
+            audio = source.copy()
+            eq = make()
+            start = time.perf_counter()
+            for offset in range(0, n, block_size):
+                eq.process(audio[offset:offset + block_size])
+            elapsed = time.perf_counter() - start
+            print(f"{name:<13}{len(eq.sos):>9}{block_size:>9}{elapsed:>10.3f}{seconds / max(elapsed, 1e-9):>13.0f}"
+                  f"{100 * elapsed / seconds:>8.2f}%")
+
+if __name__ == "__main__":
+    run_benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 60.0)
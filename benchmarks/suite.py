@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Stage-level benchmark of the synthesis pipeline.
+
+Runs SynthesisEngine over a corpus in several sizes, cold (caches and pools
+emptied) and warm (repeated runs). Each stage (normalization, embedding
+load, tokenization, inference, post-processing and encoding) is timed from
+the engine's own tracing spans, and the suite reports real-time factor,
+p50/p99 latency and peak RSS. Each size runs in its own process, so its
+peak RSS is not inflated by the sizes before it. Results are JSON; a saved result can serve as a baseline for later runs.
+
+Run from the repository root:
+    python main.py bench [--sizes short,paragraph,chapter] [--runs 10] [--out bench.json] [--baseline old.json]
+"""
+
+import json
+import multiprocessing
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import tokenizer
+from embedding_loader import get_embedding_cache
+from session_pool import get_pool
+from engine import SynthesisEngine, SynthRequest
+from tracing import start_trace, stop_trace
+from version import __version__
+
+# Span names recorded by the engine, in pipeline order
+STAGES = ('normalize', 'embedding_load', 'tokenize', 'inference', 'postprocess', 'encode')
+
+PASSAGE = [
+    "The lighthouse keeper climbed the spiral stairs for the last time that winter.",
+    "Below him, the harbour lay still, its boats tied up and dark.",
+    "He had kept the lamp burning for thirty-one years, through storms that tore the roofs off houses.",
+    "Nobody in the village remembered a night without its light.",
+    "Tomorrow a machine would take his place, and it would never need to sleep.",
+    "He wound the clockwork one more time and listened to it tick.",
+    "Then he sat down by the window, poured a cup of tea, and waited for the dawn.",
+    "When the sun finally rose, the sea was calm and the gulls were already calling.",
+]
+
+# Number of sentences per corpus size
+CORPUS_SIZES = {'short': 1, 'paragraph': 8, 'chapter': 120}
+DEFAULT_RUNS = 10
+DEFAULT_THRESHOLD = 0.10
+# Differences below this many milliseconds are treated as noise
+NOISE_FLOOR_MS = 1.0
+
+def corpus(size: str) -> str:
+    count = CORPUS_SIZES[size]
+    return ' '.join(PASSAGE[i % len(PASSAGE)] for i in range(count))
+
+def percentile(values, q: float) -> float:
+    # Nearest-rank percentile; q in [0, 100]
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(int(-(-q * len(ordered) // 100)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def reset_caches():
+    """Drop loaded sessions, embeddings and tokenizers so the next run is cold."""
+    get_pool().clear()
+    get_embedding_cache().clear()
+    tokenizer._tokenizers.clear()
+
+def run_pipeline(engine: SynthesisEngine, request: SynthRequest):
+    """One synthesis through the engine, timed per stage from its tracing
+    spans; returns (stage seconds, audio seconds)."""
+    start_trace()
+    try:
+        result = engine.synthesize(request)
+        try:
+            engine.encode(result, request)
+            encoded = True
+        except RuntimeError:
+            encoded = False
+    finally:
+        events = stop_trace()
+    timings = dict.fromkeys(STAGES, 0.0)
+    for name, start, end, _ in events:
+        if name in timings:
+            timings[name] += (end - start) / 1e9
+    if not encoded:
+        timings['encode'] = None
+    return timings, result.duration
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000.0, 3)
+
+def bench_size(engine: SynthesisEngine, size: str, runs=DEFAULT_RUNS, voice='narrator', locale='en-US') -> dict:
+    request = SynthRequest(text=corpus(size), voice=voice, locale=locale)
+    reset_caches()
+    cold, audio_seconds = run_pipeline(engine, request)
+
+    warm_totals = []
+    warm_stages = {stage: [] for stage in STAGES}
+    for _ in range(runs):
+        timings, audio_seconds = run_pipeline(engine, request)
+        warm_totals.append(sum(t for t in timings.values() if t is not None))
+        for stage in STAGES:
+            if timings[stage] is not None:
+                warm_stages[stage].append(timings[stage])
+
+    p50 = percentile(warm_totals, 50)
+    rss = peak_rss_mb()
+    return {
+        'characters': len(request.text),
+        'audio_seconds': round(audio_seconds, 3),
+        'cold': {
+            'total_ms': _ms(sum(t for t in cold.values() if t is not None)),
+            'stages_ms': {stage: _ms(cold[stage]) for stage in STAGES},
+        },
+        'warm': {
+            'runs': runs,
+            'p50_ms': _ms(p50),
+            'p99_ms': _ms(percentile(warm_totals, 99)),
+            'mean_ms': _ms(sum(warm_totals) / len(warm_totals)) if warm_totals else None,
+            'stages_p50_ms': {stage: _ms(percentile(values, 50)) if values else None for stage, values in warm_stages.items()},
+        },
+        'real_time_factor': round(p50 / audio_seconds, 5) if audio_seconds else None,
+        'peak_rss_mb': round(rss, 1) if rss is not None else None,
+    }
+
+def _bench_size_in_process(size: str, runs: int, voice: str, locale: str) -> dict:
+    return bench_size(SynthesisEngine(max_workers=1), size, runs, voice, locale)
+
+def run_suite(sizes=None, runs=DEFAULT_RUNS, voice='narrator', locale='en-US', log=print) -> dict:
+    # ru_maxrss only ever grows, so every size gets a fresh process. Spawn,
+    # not fork: a forked child starts out with its parent's resident pages.
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for size in sizes or list(CORPUS_SIZES):
+        log(f"Benchmarking '{size}' ({CORPUS_SIZES[size]} sentences, {runs} warm runs)...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[size] = executor.submit(_bench_size_in_process, size, runs, voice, locale).result()
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+def print_report(report: dict, out=print):
+    out(f"{'size':<11}{'audio s':>9}{'cold ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'RTF':>9}{'RSS MB':>9}")
+    for size, r in report['results'].items():
+        out(f"{size:<11}{r['audio_seconds']:>9.2f}{r['cold']['total_ms']:>10.1f}{r['warm']['p50_ms']:>10.1f}"
+            f"{r['warm']['p99_ms']:>10.1f}{r['real_time_factor'] or 0:>9.4f}{r['peak_rss_mb'] or 0:>9.1f}")
+    out("Warm p50 per stage (ms):")
+    out(f"{'size':<11}" + ''.join(f"{stage:>16}" for stage in STAGES))
+    for size, r in report['results'].items():
+        stages = r['warm']['stages_p50_ms']
+        out(f"{size:<11}" + ''.join(f"{stages[stage]:>16.2f}" if stages[stage] is not None else f"{'n/a':>16}" for stage in STAGES))
+
+def _metrics(result: dict) -> dict:
+    # Flat name -> value of everything compared against a baseline
+    metrics = {
+        'cold.total_ms': result['cold']['total_ms'],
+        'warm.p50_ms': result['warm']['p50_ms'],
+        'warm.p99_ms': result['warm']['p99_ms'],
+        'real_time_factor': result['real_time_factor'],
+        'peak_rss_mb': result['peak_rss_mb'],
+    }
+    for stage, value in result['warm']['stages_p50_ms'].items():
+        metrics[f'warm.{stage}_ms'] = value
+    return metrics
+
+def compare(report: dict, baseline: dict, threshold=DEFAULT_THRESHOLD):
+    """List regressions: metrics more than `threshold` (a fraction) worse than the baseline."""
+    regressions = []
+    for size, result in report['results'].items():
+        base = baseline.get('results', {}).get(size)
+        if base is None:
+            continue
+        current, previous = _metrics(result), _metrics(base)
+        for name, value in current.items():
+            old = previous.get(name)
+            if value is None or not old:
+                continue
+            if name.endswith('_ms') and value - old < NOISE_FLOOR_MS:
+                continue
+            if value > old * (1 + threshold):
+                regressions.append({'size': size, 'metric': name, 'baseline': old, 'current': value,
+                                    'change': round(value / old - 1, 4)})
+    return regressions
+
+def load_report(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_report(report: dict, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    print_report(run_suite(runs=int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS))
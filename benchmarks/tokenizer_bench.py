@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark tokenization throughput: cold vs. memoized word cache, and batching.
+
+Run from the repository root:
+    python -m benchmarks.tokenizer_bench [words]
+"""
+
+import random
+import sys
+import time
+
+from tokenizer import Tokenizer, vocabs
+
+BATCH_SIZE = 16
+
+def _corpus(num_words):
+    random.seed(0)
+    # Zipf-like mix: a few very common words and a long tail, as in real scripts
+    common = list(vocabs['en-US'])
+    tail = [''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=random.randint(3, 11))) for _ in range(5000)]
+    words = [random.choice(common) if random.random() < 0.6 else random.choice(tail) for _ in range(num_words)]
+    return [' '.join(words[i:i + 12]) + '.' for i in range(0, num_words, 12)]
+
+def _run(name, fn, sentences):
+    start = time.perf_counter()
+    tokens = fn(sentences)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22}{elapsed:>10.3f}{tokens / max(elapsed, 1e-9):>16,.0f}")
+
+def _sequential(tokenizer):
+    return lambda sentences: sum(len(tokenizer.encode(s)) for s in sentences)
+
+def _batched(tokenizer):
+    def run(sentences):
+        total = 0
+        for i in range(0, len(sentences), BATCH_SIZE):
+            _, lengths = tokenizer.tokenize_batch(sentences[i:i + BATCH_SIZE])
+            total += int(lengths.sum())
+        return total
+    return run
+
+def run_benchmark(num_words=200000):
+    sentences = _corpus(num_words)
+    print(f"Tokenizer benchmark: {num_words} words in {len(sentences)} sentences")
+    print(f"{'mode':<22}{'time (s)':>10}{'tokens/sec':>16}")
+    _run('no word cache', _sequential(Tokenizer('en-US', cache_size=0)), sentences)
+    warm = Tokenizer('en-US')
+    _run('cold word cache', _sequential(warm), sentences)
+    _run('warm word cache', _sequential(warm), sentences)
+    _run(f'batch of {BATCH_SIZE} (warm)', _batched(warm), sentences)
+    info = warm.word_ids.cache_info()
+    print(f"Word cache: {info.currsize} entries, hit rate {info.hits / max(info.hits + info.misses, 1):.1%}")
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -1,22 +1,15 @@
 import argparse
-from text_normalizer import parse_and_normalize_text
-from tokenizer import tokenize
-from onnx_session import ONNXSession
-from embedding_loader import load_embedding, morph_embeddings
-from audio_postprocess import postprocess_audio
-from mp3_encoder import encode_mp3
-from voice import list_voices, import_voice
-from subtitle import generate_timestamps, export_srt, export_vtt, export_chapters
-from http_server import start_http_server
-from multilingual import get_model_for_locale
-from quality_metrics import analyze_audio_quality
+import sys
 from version import __version__
-import os
+
+# Commands import what they need when they run, so that `version`,
+# `list-voices` and shell completion do not pay for numpy, onnxruntime
+# or Flask at startup.
 
 def run_cli(args):
     if not args:
         print("Usage: python main.py <command> [options]")
-        print("Commands: synth, synth-file, batch, stream, list-voices, import-voice, preview-voice, bench, version, server")
+        print("Commands: synth, synth-file, render-script, batch, stream, list-voices, import-voice, preview-voice, compile-dict, bench, version, server")
         return
 
     command = args[0]
@@ -24,6 +17,8 @@ def run_cli(args):
         synth_command(args[1:])
     elif command == "synth-file":
         synth_file_command(args[1:])
+    elif command == "render-script":
+        render_script_command(args[1:])
     elif command == "batch":
         batch_command(args[1:])
     elif command == "stream":
@@ -34,15 +29,16 @@ def run_cli(args):
         import_voice_command(args[1:])
     elif command == "preview-voice":
         preview_voice_command(args[1:])
+    elif command == "compile-dict":
+        compile_dict_command(args[1:])
     elif command == "bench":
-        bench_command()
+        bench_command(args[1:])
     elif command == "extract-voice":
         extract_voice_command(args[1:])
     elif command == "version":
         print(f"Offline TTS v{__version__}")
     elif command == "server":
-        port = int(args[1]) if len(args) > 1 else 8080
-        start_http_server(port)
+        server_command(args[1:])
     else:
         print(f"Unknown command: {command}")
 
@@ -70,49 +66,67 @@ def synth_command(args):
     parser.add_argument('--shimmer', type=float, default=0.0)
     parser.add_argument('--normalize-lufs', type=float, default=-16.0)
     parser.add_argument('--dither-bits', type=int, default=16)
-    parser.add_argument('--eq-preset', default='neutral')
+    parser.add_argument('--eq-preset', help="neutral, narration or podcast (default: the voice's preset)")
     parser.add_argument('--phoneme-subtitles', action='store_true')
     parser.add_argument('--analyze-quality', action='store_true')
+    parser.add_argument('--quality-report', help='write the quality analysis as JSON to this file')
+    parser.add_argument('--cache-dir', help='reuse rendered segments from this cache directory')
+    parser.add_argument('--cache-size-mb', type=float, default=512)
+    parser.add_argument('--long-form', action='store_true', help='spill audio to disk so memory stays flat for book-length text')
+    parser.add_argument('--spill-dir', help='directory for the long-form spill file (default: next to --out)')
+    parser.add_argument('--trace', help='write a Chrome trace (chrome://tracing, Perfetto) of the pipeline stages to this file')
     opts = parser.parse_args(args)
+    if opts.trace:
+        from tracing import start_trace, write_chrome_trace
+        start_trace()
+        try:
+            _synth(opts)
+        finally:
+            print(f"Trace with {write_chrome_trace(opts.trace)} spans written to {opts.trace}")
+    else:
+        _synth(opts)
 
-    if opts.locale == 'auto':
-        from multilingual import detect_language
-        opts.locale = detect_language(opts.text)
-
+def _synth(opts):
+    from engine import SynthRequest, SynthesisEngine, get_engine
+    from mp3_encoder import encode_mp3
+    engine = None
     try:
-        segments = parse_and_normalize_text(opts.text, opts.locale, opts.dict)
-        full_pcm = []
-        for seg in segments:
-            tokens = tokenize(seg.text, opts.locale)
-            embedding = load_embedding(opts.voice)
-            if opts.morph_voice:
-                emb2 = load_embedding(opts.morph_voice)
-                embedding = morph_embeddings(embedding, emb2, opts.blend)
-            lang_model = get_model_for_locale(opts.locale)
-            model_path = lang_model.model_path
-            session = ONNXSession(model_path)
-            seg_rate = opts.rate * seg.rate
-            seg_pitch = opts.pitch + seg.pitch
-            seg_volume = opts.volume * seg.volume
-            pcm = session.run_inference(tokens, embedding, seg_rate, seg_pitch, seg_volume, opts.emotion, opts.jitter, opts.shimmer, seg.emphasis, seg.breath)
-            if seg.break_time > 0:
-                silence = [0.0] * int(seg.break_time * 44100)
-                full_pcm.extend(silence)
-            else:
-                full_pcm.extend(pcm)
-
-        postprocess_audio(full_pcm, opts.eq_preset, opts.normalize_lufs, opts.dither_bits)
-
-        if opts.analyze_quality:
-            report = analyze_audio_quality(full_pcm)
-            print("Audio Quality Analysis:")
-            print(f"  Peak Level: {report.peak_level}")
-            print(f"  RMS Level: {report.rms_level}")
-            print(f"  SNR: {report.snr_db} dB")
-            print(f"  Clipping: {'Yes' if report.has_clipping else 'No'}")
+        if opts.cache_dir:
+            # An engine of its own, so the shared one never picks up this cache
+            from synth_cache import SynthCache
+            engine = SynthesisEngine(cache=SynthCache(opts.cache_dir, opts.cache_size_mb))
+        else:
+            engine = get_engine()
+        analyze = opts.analyze_quality or opts.quality_report
+        if opts.long_form:
+            if opts.subtitle or opts.chapters or opts.timestamps:
+                print("Subtitles, chapters and timestamps are not available in long-form mode")
+            analyzer = None
+            if analyze:
+                from quality_metrics import QualityAnalyzer
+                analyzer = QualityAnalyzer()
+            long_form_render(engine, SynthRequest.from_args(opts), opts.out, opts.spill_dir, analyzer)
+            if analyzer is not None:
+                from quality_metrics import check_report
+                report = analyzer.report()
+                report['issues'] = check_report(report)
+                print_quality_report(report, opts.quality_report)
+            return
+        result = engine.synthesize(SynthRequest.from_args(opts))
+        full_pcm = result.pcm
+        if engine.cache is not None:
+            stats = engine.cache.stats
+            print(f"Segment cache: {stats.hits} hits, {stats.misses} misses")
+
+        if analyze:
+            from quality_metrics import analyze_pcm
+            print_quality_report(analyze_pcm(full_pcm), opts.quality_report)
 
         encode_mp3(full_pcm, opts.out, opts.bitrate, opts.title, opts.artist, opts.album)
 
+        if opts.subtitle or opts.chapters or opts.timestamps:
+            from subtitle import generate_timestamps, export_srt, export_vtt, export_chapters, export_timestamps_json
+
         if opts.subtitle:
             timestamps = generate_timestamps(opts.text, full_pcm, opts.phoneme_subtitles)
             if opts.subtitle.endswith('.srt'):
@@ -134,6 +148,31 @@ def synth_command(args):
         print(f"Synthesized to {opts.out}")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        if opts.cache_dir and engine is not None:
+            engine.close()
+
+def print_quality_report(report, path=None):
+    print("Audio Quality Analysis:")
+    print(f"  Peak Level: {report['peak_dbfs']} dBFS ({report['clipped_samples']} clipped samples)")
+    print(f"  RMS Level: {report['rms_dbfs']} dBFS, crest factor {report['crest_factor_db']} dB")
+    print(f"  Loudness: {report['lufs']} LUFS")
+    print(f"  DC Offset: {report['dc_offset']}")
+    print(f"  Silence: {report['silence_ratio']:.1%} of {len(report['windows']['rms_dbfs'])} windows")
+    print(f"  QA: {'; '.join(report['issues']) if report['issues'] else 'pass'}")
+    if path:
+        from quality_metrics import write_report
+        write_report(report, path)
+        print(f"Quality report written to {path}")
+
+def long_form_render(engine, request, out_path, spill_dir=None, analyzer=None):
+    import time
+    from longform import render_long_form
+    start = time.perf_counter()
+    duration = render_long_form(engine, request, out_path, spill_dir, analyzer=analyzer)
+    elapsed = time.perf_counter() - start
+    print(f"Synthesized {duration / 3600:.2f}h of audio to {out_path} in {elapsed:.0f}s "
+          f"(real-time factor {elapsed / max(duration, 1e-9):.3f})")
 
 # Add other commands similarly, but for brevity, placeholder
 def synth_file_command(args):
@@ -142,59 +181,153 @@ def synth_file_command(args):
     parser.add_argument('--voice', default='narrator')
     parser.add_argument('--out', default='output.mp3')
     parser.add_argument('--bitrate', type=int, default=320)
+    parser.add_argument('--incremental', action='store_true', help='only resynthesize sentences changed since the last render')
+    parser.add_argument('--watch', action='store_true', help='re-render incrementally whenever the input file is saved')
+    parser.add_argument('--long-form', action='store_true', help='spill audio to disk so memory stays flat for book-length text')
+    parser.add_argument('--spill-dir', help='directory for the long-form spill file (default: next to --out)')
     opts = parser.parse_args(args)
+    if opts.incremental or opts.watch:
+        incremental_synth_file(opts)
+        return
+    from engine import SynthRequest, get_engine
+    from mp3_encoder import encode_mp3
     try:
         with open(opts.input_file, 'r', encoding='utf-8') as f:
             text = f.read()
-        args_synth = ['synth', '--text', text, '--voice', opts.voice, '--out', opts.out, '--bitrate', str(opts.bitrate)]
-        run_cli(args_synth)
+        if opts.long_form:
+            long_form_render(get_engine(), SynthRequest(text=text, voice=opts.voice, bitrate=opts.bitrate), opts.out, opts.spill_dir)
+            return
+        result = get_engine().synthesize(SynthRequest(text=text, voice=opts.voice, bitrate=opts.bitrate))
+        encode_mp3(result.pcm, opts.out, opts.bitrate)
         print(f"Synthesized from file to {opts.out}")
     except Exception as e:
         print(f"Error: {e}")
 
+def render_script_command(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('script', help='dialogue script: `SPEAKER [attrs]: text` lines, see the README')
+    parser.add_argument('--out', default='output.mp3')
+    parser.add_argument('--timeline', help='timeline JSON path (default: next to --out)')
+    parser.add_argument('--workers', type=int, default=4, help='voice groups rendered in parallel')
+    parser.add_argument('--gap', type=float, default=0.35, help='seconds of silence between lines')
+    parser.add_argument('--bitrate', type=int, default=320)
+    parser.add_argument('--title')
+    parser.add_argument('--artist')
+    parser.add_argument('--album')
+    parser.add_argument('--locale', default='auto')
+    parser.add_argument('--normalize-lufs', type=float, default=-16.0)
+    parser.add_argument('--dither-bits', type=int, default=16)
+    parser.add_argument('--eq-preset', help="neutral, narration or podcast (default: the voice's preset)")
+    opts = parser.parse_args(args)
+    from engine import SynthesisEngine, SynthRequest
+    from mp3_encoder import encode_mp3
+    from dialogue import load_script, render_script, export_timeline, default_timeline_path
+    from audio_buffer import SAMPLE_RATE
+    engine = SynthesisEngine(opts.workers)
+    try:
+        script = load_script(opts.script)
+        pcm, timeline = render_script(engine, script, SynthRequest.from_args(opts).to_dict(), opts.gap)
+        encode_mp3(pcm, opts.out, opts.bitrate, opts.title, opts.artist, opts.album)
+        timeline_path = opts.timeline or default_timeline_path(opts.out)
+        export_timeline(timeline, timeline_path, round(len(pcm) / SAMPLE_RATE, 3))
+        speakers = len({line['speaker'] for line in timeline})
+        print(f"Rendered {len(timeline)} lines from {speakers} speakers to {opts.out}, timeline in {timeline_path}")
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        engine.close()
+
+def incremental_synth_file(opts):
+    import time
+    from engine import SynthRequest, get_engine
+    from incremental import IncrementalRenderer, watch
+    renderer = IncrementalRenderer(get_engine(), opts.out)
+
+    def render():
+        start = time.perf_counter()
+        try:
+            with open(opts.input_file, 'r', encoding='utf-8') as f:
+                text = f.read()
+            counts = renderer.render(text, SynthRequest(voice=opts.voice, bitrate=opts.bitrate))
+        except Exception as e:
+            print(f"Error: {e}")
+            return
+        print(f"Rendered {counts['rendered']} of {counts['units']} sentences ({counts['reused']} reused) "
+              f"to {opts.out} in {time.perf_counter() - start:.2f}s")
+
+    if not opts.watch:
+        render()
+        return
+    print(f"Watching {opts.input_file}, press Ctrl+C to stop")
+    try:
+        watch(opts.input_file, render)
+    except KeyboardInterrupt:
+        pass
+
 def batch_command(args):
+    from batch_render import run_batch
     parser = argparse.ArgumentParser()
     parser.add_argument('input_dir')
     parser.add_argument('--voice', default='narrator')
     parser.add_argument('--out-dir', default='output')
     parser.add_argument('--bitrate', type=int, default=320)
+    parser.add_argument('--jobs', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--force', action='store_true', help='re-render outputs that are already up to date')
+    parser.add_argument('--qa', action='store_true', help='write a quality report next to each output and a batch summary')
     opts = parser.parse_args(args)
-    import os
-    os.makedirs(opts.out_dir, exist_ok=True)
-    for file in os.listdir(opts.input_dir):
-        if file.endswith('.txt'):
-            input_path = os.path.join(opts.input_dir, file)
-            output_path = os.path.join(opts.out_dir, file.replace('.txt', '.mp3'))
-            args_file = ['synth-file', input_path, '--voice', opts.voice, '--out', output_path, '--bitrate', str(opts.bitrate)]
-            run_cli(args_file)
-    print(f"Batch synthesis completed in {opts.out_dir}")
+    run_batch(opts.input_dir, opts.out_dir, opts.voice, opts.bitrate, opts.jobs, opts.force, opts.qa)
 
 def stream_command(args):
+    import time
+    from streaming import iter_stream_chunks
+    from loudness import StreamingNormalizer, USE_NUMPY
+    from text_normalizer import iter_segments
+    from embedding_loader import load_embedding
+    from session_pool import get_session
+    from multilingual import get_model_for_locale
     parser = argparse.ArgumentParser()
     parser.add_argument('--text', required=True)
     parser.add_argument('--voice', default='narrator')
+    parser.add_argument('--locale', default='en-US')
+    parser.add_argument('--rate', type=float, default=1.0)
+    parser.add_argument('--pitch', type=float, default=0.0)
+    parser.add_argument('--volume', type=float, default=1.0)
+    parser.add_argument('--emotion', default='neutral')
+    parser.add_argument('--frame-size', type=int, default=1024)
+    parser.add_argument('--crossfade-ms', type=float, default=5.0)
+    parser.add_argument('--target-latency-ms', type=float, default=100.0)
+    parser.add_argument('--normalize-lufs', type=float, default=-16.0)
     opts = parser.parse_args(args)
     try:
-        segments = parse_and_normalize_text(opts.text)
-        tokens = tokenize(segments[0].text)
+        started_at = time.perf_counter()
+        # Parsed lazily so the first phrase is synthesized before the rest is parsed
+        segments = iter_segments(opts.text, opts.locale)
         embedding = load_embedding(opts.voice)
-        model_path = get_model_for_locale('en-US').model_path
-        session = ONNXSession(model_path)
+        session = get_session(get_model_for_locale(opts.locale).model_path)
+        normalizer = StreamingNormalizer(opts.normalize_lufs) if USE_NUMPY else None
         def callback(pcm_chunk):
+            if normalizer is not None:
+                normalizer.process(pcm_chunk)
             # In real implementation, stream to audio device
             print(f"Streaming chunk of {len(pcm_chunk)} samples")
-        session.run_streaming_inference(tokens, embedding, callback, rate=1.0, pitch=0.0, volume=1.0)
+        chunks = iter_stream_chunks(segments, embedding, opts.locale, opts.rate, opts.pitch, opts.volume, opts.emotion)
+        stats = session.run_streaming_inference(chunks, callback, opts.frame_size, opts.crossfade_ms, started_at)
+        if stats is not None:
+            print(f"Time to first audio: {stats.time_to_first_audio_ms:.1f} ms (target {opts.target_latency_ms:.0f} ms)")
+            print(f"Streamed {stats.audio_duration:.2f}s of audio, real-time factor {stats.real_time_factor:.3f}")
         print("Streaming completed")
     except Exception as e:
         print(f"Error: {e}")
 
 def list_voices_command():
+    from voice import list_voices
     voices = list_voices()
     print("Available voices:")
     for v in voices:
         print(f"- {v.name} ({v.gender}, {v.locale}): {v.description}")
 
 def import_voice_command(args):
+    from voice import import_voice
     parser = argparse.ArgumentParser()
     parser.add_argument('embedding_path')
     parser.add_argument('--name', default='imported_voice')
@@ -204,32 +337,104 @@ def import_voice_command(args):
     else:
         print("Failed to import voice")
 
+def compile_dict_command(args):
+    import time
+    from lexicon import compile_lexicon, load_lexicon
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dict_file')
+    parser.add_argument('--out', help='compiled lexicon path (default: <dict_file>.lex)')
+    opts = parser.parse_args(args)
+    try:
+        out_path = compile_lexicon(opts.dict_file, opts.out)
+        start = time.perf_counter()
+        lexicon = load_lexicon(out_path)
+        print(f"Compiled {len(lexicon)} entries to {out_path} (loads in {(time.perf_counter() - start) * 1000:.1f} ms)")
+    except Exception as e:
+        print(f"Error: {e}")
+
 def preview_voice_command(args):
     parser = argparse.ArgumentParser()
     parser.add_argument('voice')
     opts = parser.parse_args(args)
+    from text_normalizer import parse_and_normalize_text
+    from tokenizer import tokenize
+    from embedding_loader import load_embedding
+    from session_pool import get_session
+    from multilingual import get_model_for_locale
+    from audio_postprocess import postprocess_audio
+    from mp3_encoder import encode_mp3
     sample_text = f"This is a sample of the {opts.voice} voice."
     try:
         segments = parse_and_normalize_text(sample_text)
         tokens = tokenize(segments[0].text)
         embedding = load_embedding(opts.voice)
-        model_path = get_model_for_locale('en-US').model_path
-        session = ONNXSession(model_path)
+        session = get_session(get_model_for_locale('en-US').model_path)
         pcm = session.run_inference(tokens, embedding)
-        postprocess_audio(pcm, 'neutral', -16.0, 16)
+        pcm = postprocess_audio(pcm, 'neutral', -16.0, 16)
         encode_mp3(pcm, f'/tmp/preview_{opts.voice}.mp3', 320)
         print(f"Preview saved to /tmp/preview_{opts.voice}.mp3")
     except Exception as e:
         print(f"Error: {e}")
 
-def bench_command():
-    import time
-    sample_text = "This is a benchmark test for the TTS system."
-    start = time.time()
-    args = ['synth', '--text', sample_text, '--out', '/tmp/bench.mp3']
-    run_cli(args)
-    end = time.time()
-    print(f"Benchmark completed in {end - start:.2f} seconds")
+def bench_command(args):
+    from benchmarks.suite import run_suite, print_report, save_report, load_report, compare, CORPUS_SIZES, DEFAULT_RUNS, DEFAULT_THRESHOLD
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default=','.join(CORPUS_SIZES), help='comma-separated corpus sizes')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='warm runs per size')
+    parser.add_argument('--voice', default='narrator')
+    parser.add_argument('--locale', default='en-US')
+    parser.add_argument('--out', help='write results as JSON')
+    parser.add_argument('--baseline', help='compare against a saved JSON result')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='allowed slowdown as a fraction')
+    opts = parser.parse_args(args)
+    sizes = [size.strip() for size in opts.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in CORPUS_SIZES]
+    if unknown:
+        print(f"Unknown corpus sizes: {', '.join(unknown)} (choose from {', '.join(CORPUS_SIZES)})")
+        return
+    report = run_suite(sizes, opts.runs, opts.voice, opts.locale)
+    print_report(report)
+    if opts.out:
+        save_report(report, opts.out)
+        print(f"Results written to {opts.out}")
+    if opts.baseline:
+        regressions = compare(report, load_report(opts.baseline), opts.threshold)
+        if not regressions:
+            print(f"No regressions against {opts.baseline}")
+            return
+        print(f"{len(regressions)} regression(s) against {opts.baseline}:")
+        for r in regressions:
+            print(f"  {r['size']}: {r['metric']} {r['baseline']} -> {r['current']} (+{r['change']:.0%})")
+        sys.exit(1)
+
+def server_command(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('port', type=int, nargs='?', default=8080)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--async', dest='async_mode', action='store_true', help='asyncio front end with micro-batching')
+    parser.add_argument('--queue-size', type=int, default=256)
+    parser.add_argument('--batch-window-ms', type=float, default=5.0)
+    parser.add_argument('--deadline-ms', type=float, default=30000.0)
+    parser.add_argument('--cache-dir', help='reuse rendered segments from this cache directory')
+    parser.add_argument('--cache-size-mb', type=float, default=512)
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false', help='skip preloading models at startup')
+    parser.add_argument('--session-config', help='ONNX Runtime session options file (default models/session_options.json)')
+    parser.add_argument('--dict-dir', help="directory of dictionaries clients may name in the 'dict' field (default: refuse 'dict')")
+    opts = parser.parse_args(args)
+    if opts.session_config:
+        from session_pool import get_pool
+        get_pool().config_path = opts.session_config
+    cache = None
+    if opts.cache_dir:
+        from synth_cache import SynthCache
+        cache = SynthCache(opts.cache_dir, opts.cache_size_mb)
+    if opts.async_mode:
+        from async_server import start_async_http_server
+        start_async_http_server(opts.port, opts.workers, opts.queue_size, opts.batch_window_ms, opts.deadline_ms, cache, opts.warmup,
+                                opts.dict_dir)
+    else:
+        from http_server import start_http_server
+        start_http_server(opts.port, opts.workers, cache, opts.warmup, opts.dict_dir)
 
 def extract_voice_command(args):
     parser = argparse.ArgumentParser()
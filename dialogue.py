@@ -0,0 +1,164 @@
+"""Multi-speaker dialogue scripts; the format is described in the README."""
+
+import json
+import os
+import re
+from collections import OrderedDict
+
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+from engine import SynthRequest
+from multilingual import detect_language
+from text_normalizer import parse_attrs
+from advanced_audio import apply_limiter
+from audio_buffer import SAMPLE_RATE
+
+DEFAULT_GAP = 0.35
+# Request fields a speaker or a line may set; the rest apply to the whole render
+LINE_FIELDS = ('voice', 'morph_voice', 'blend', 'locale', 'rate', 'pitch', 'volume', 'emotion', 'jitter', 'shimmer', 'dict')
+
+_line_pattern = re.compile(r'^(?P<speaker>[^\s@#:\[][^:\[]*?)\s*(?:\[(?P<attrs>[^\]]*)\])?\s*:\s*(?P<text>.*)$')
+# Undeclared speakers must follow the uppercase tag convention
+_speaker_tag = re.compile(r'^[A-Z][A-Z0-9_-]*$')
+
+class ScriptLine:
+    def __init__(self, index, speaker, text, params, gap=None, pause=0.0):
+        self.index = index
+        self.speaker = speaker
+        self.text = text
+        # Speaker defaults merged with this line's overrides
+        self.params = params
+        # None: the script's default gap
+        self.gap = gap
+        self.pause = pause
+
+class DialogueScript:
+    def __init__(self, speakers=None, lines=None):
+        # name -> default request fields
+        self.speakers = speakers or {}
+        self.lines = lines or []
+
+def _line_params(attrs: str, lineno: int):
+    params = parse_attrs(attrs)
+    gap = params.pop('gap', None)
+    unknown = set(params) - set(LINE_FIELDS)
+    if unknown:
+        raise ValueError(f"Line {lineno}: unknown attributes: {', '.join(sorted(unknown))}")
+    try:
+        return params, float(gap) if gap is not None else None
+    except ValueError:
+        raise ValueError(f"Line {lineno}: gap must be a number of seconds")
+
+def parse_script(text: str) -> DialogueScript:
+    script = DialogueScript()
+    pause = 0.0
+    for lineno, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('@speaker'):
+            parts = line.split(None, 2)
+            if len(parts) < 2:
+                raise ValueError(f"Line {lineno}: @speaker needs a name")
+            params, _ = _line_params(parts[2] if len(parts) > 2 else '', lineno)
+            script.speakers[parts[1]] = params
+            continue
+        if line.startswith('@pause'):
+            try:
+                pause += float(line.split(None, 1)[1])
+            except (IndexError, ValueError):
+                raise ValueError(f"Line {lineno}: @pause needs a number of seconds")
+            continue
+        match = _line_pattern.match(line)
+        if match is not None and match.group('speaker') not in script.speakers \
+                and not _speaker_tag.match(match.group('speaker')):
+            match = None
+        if match is None:
+            if not script.lines:
+                raise ValueError(f"Line {lineno}: expected 'SPEAKER: text'")
+            script.lines[-1].text += ' ' + line
+            continue
+        speaker = match.group('speaker')
+        params, gap = _line_params(match.group('attrs') or '', lineno)
+        merged = dict(script.speakers.get(speaker, {'voice': speaker.lower()}))
+        merged.update(params)
+        script.lines.append(ScriptLine(len(script.lines), speaker, match.group('text'), merged, gap, pause))
+        pause = 0.0
+    return script
+
+def load_script(path: str) -> DialogueScript:
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_script(f.read())
+
+def line_request(line: ScriptLine, base: dict) -> SynthRequest:
+    request = SynthRequest(**dict(base, **line.params, text=line.text))
+    if request.locale == 'auto':
+        request.locale = detect_language(line.text)
+    return request
+
+def group_lines(lines, base: dict):
+    """Requests grouped by voice and locale, so each group shares one embedding,
+    one session and batched inference. Returns {key: [(line, request)]}."""
+    groups = OrderedDict()
+    for line in lines:
+        request = line_request(line, base)
+        key = (request.voice, request.morph_voice, request.blend, request.locale)
+        groups.setdefault(key, []).append((line, request))
+    return groups
+
+def render_script(engine, script: DialogueScript, base=None, default_gap=DEFAULT_GAP):
+    """Render every line and mix them into one track.
+
+    Voice groups are synthesized concurrently on the engine's workers.
+    Each line is post-processed on its own, so speakers come out at the
+    same loudness, then placed at its offset; the mix goes through the
+    limiter to catch peaks where lines overlap. Returns (pcm, timeline).
+    """
+    if not USE_NUMPY:
+        raise RuntimeError("Dialogue rendering requires numpy")
+    base = dict(base or {})
+    base.pop('text', None)
+    groups = group_lines(script.lines, base)
+    futures = [(members, engine.submit_many([request for _, request in members])) for members in groups.values()]
+    rendered = {}
+    for members, future in futures:
+        for (line, request), result in zip(members, future.result()):
+            rendered[line.index] = (request, result.pcm)
+
+    placements = []
+    cursor = 0
+    for line in script.lines:
+        request, pcm = rendered[line.index]
+        gap = default_gap if line.gap is None else line.gap
+        if not placements:
+            gap = 0.0
+        start = max(0, cursor + int(round((gap + line.pause) * SAMPLE_RATE)))
+        placements.append((line, request, start, pcm))
+        cursor = max(cursor, start + len(pcm))
+
+    mix = np.zeros(cursor, dtype=np.float32)
+    timeline = []
+    for line, request, start, pcm in placements:
+        mix[start:start + len(pcm)] += pcm
+        timeline.append({
+            'index': line.index,
+            'speaker': line.speaker,
+            'voice': request.voice,
+            'locale': request.locale,
+            'text': line.text,
+            'start': round(start / SAMPLE_RATE, 3),
+            'end': round((start + len(pcm)) / SAMPLE_RATE, 3),
+        })
+    apply_limiter(mix)
+    return mix, timeline
+
+def export_timeline(timeline, output_path: str, duration=None):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'sample_rate': SAMPLE_RATE, 'duration': duration, 'lines': timeline}, f, indent=2, ensure_ascii=False)
+
+def default_timeline_path(output_path: str) -> str:
+    return os.path.splitext(output_path)[0] + '.timeline.json'
@@ -0,0 +1,154 @@
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+
+try:
+    from scipy.signal import sosfilt
+    USE_SCIPY = True
+except ImportError:
+    USE_SCIPY = False
+    sosfilt = None
+import math
+from functools import lru_cache
+
+# Samples per row in the NumPy fallback; each row costs a ROW_SIZE-wide
+# dot product per sample, so larger rows trade BLAS work for fewer
+# Python-level steps between rows
+ROW_SIZE = 256
+
+def _zero_input(a1, a2, w1, w2, n):
+    out = np.empty(n)
+    for i in range(n):
+        w1, w2 = -a1 * w1 - a2 * w2, w1
+        out[i] = w1
+    return out
+
+@lru_cache(maxsize=64)
+def _section_tables(a1, a2, row_size):
+    # Responses to the initial conditions w[-1] = 1 and w[-2] = 1
+    g = np.stack([_zero_input(a1, a2, 1.0, 0.0, row_size), _zero_input(a1, a2, 0.0, 1.0, row_size)], axis=1)
+    # The impulse response is the w[-1] = 1 response shifted by one sample
+    h = np.concatenate(([1.0], g[:-1, 0]))
+    index = np.arange(row_size)
+    lag = index[:, np.newaxis] - index[np.newaxis, :]
+    # Transposed lower-triangular Toeplitz matrix of h, so rows @ T is the convolution
+    toeplitz_t = np.where(lag >= 0, h[np.clip(lag, 0, None)], 0.0).T
+    for table in (g, toeplitz_t):
+        table.setflags(write=False)
+    return toeplitz_t, g, g[[row_size - 1, row_size - 2]]
+
+class _Section:
+    """One biquad (direct form II) for the NumPy fallback.
+
+    The recursive part is solved a row of ROW_SIZE samples at a time: the
+    zero-state response of every row is one matrix product with the
+    impulse response, and only the two-sample state is carried from row
+    to row in Python.
+    """
+
+    def __init__(self, b0, b1, b2, a1, a2, row_size=ROW_SIZE):
+        self.b = (b0, b1, b2)
+        self.row_size = row_size
+        self.toeplitz_t, self.initial, self.carry = _section_tables(a1, a2, row_size)
+        # w[n-1], w[n-2]
+        self.state = [0.0, 0.0]
+
+    def process(self, x):
+        n = len(x)
+        k = self.row_size
+        rows = -(-n // k)
+        padded = np.zeros(rows * k)
+        padded[:n] = x
+        w = padded.reshape(rows, k) @ self.toeplitz_t
+        last, second = w[:, k - 1].tolist(), w[:, k - 2].tolist()
+        (c11, c12), (c21, c22) = self.carry.tolist()
+        s1, s2 = self.state
+        starts = np.empty((rows, 2))
+        for r in range(rows):
+            starts[r] = (s1, s2)
+            s1, s2 = last[r] + c11 * s1 + c12 * s2, second[r] + c21 * s1 + c22 * s2
+        w += starts @ self.initial.T
+        w = np.concatenate(([self.state[1], self.state[0]], w.reshape(-1)[:n]))
+        b0, b1, b2 = self.b
+        y = b0 * w[2:] + b1 * w[1:-1] + b2 * w[:-2]
+        self.state = [float(w[-1]), float(w[-2])]
+        return y
+
+    def reset(self):
+        self.state = [0.0, 0.0]
+
+class SOSFilter:
+    """Cascade of second-order sections with state carried between blocks.
+
+    `sos` uses SciPy's layout, one [b0, b1, b2, a0, a1, a2] row per
+    section. Blocks are filtered in place (a float32 ndarray stays
+    float32), so a signal split into any number of blocks comes out the
+    same as if it were filtered whole. Uses scipy.signal.sosfilt when
+    SciPy is installed, a vectorized NumPy fallback otherwise.
+    """
+
+    def __init__(self, sos):
+        sos = np.asarray(sos, dtype=np.float64).reshape(-1, 6)
+        # Normalize so a0 == 1
+        self.sos = sos / sos[:, 3:4]
+        self._zi = None
+        self._sections = None
+        self.reset()
+
+    def reset(self):
+        if USE_SCIPY:
+            self._zi = np.zeros((len(self.sos), 2))
+        else:
+            self._sections = [_Section(b0, b1, b2, a1, a2) for b0, b1, b2, _, a1, a2 in self.sos.tolist()]
+
+    def process(self, block):
+        if not len(block):
+            return block
+        if USE_SCIPY:
+            y, self._zi = sosfilt(self.sos, block, zi=self._zi)
+        else:
+            y = block
+            for section in self._sections:
+                y = section.process(y)
+        block[:] = y
+        return block
+
+# Biquad designs from the Audio EQ Cookbook (R. Bristow-Johnson); each
+# returns one SOS row
+
+def _biquad(b0, b1, b2, a0, a1, a2):
+    return (b0 / a0, b1 / a0, b2 / a0, 1.0, a1 / a0, a2 / a0)
+
+def peaking(freq, gain_db, q, sample_rate):
+    a = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * freq / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    return _biquad(1 + alpha * a, -2 * cos_w0, 1 - alpha * a, 1 + alpha / a, -2 * cos_w0, 1 - alpha / a)
+
+def low_shelf(freq, gain_db, q, sample_rate):
+    a = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * freq / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    k = 2 * math.sqrt(a) * alpha
+    return _biquad(a * ((a + 1) - (a - 1) * cos_w0 + k), 2 * a * ((a - 1) - (a + 1) * cos_w0), a * ((a + 1) - (a - 1) * cos_w0 - k),
+                   (a + 1) + (a - 1) * cos_w0 + k, -2 * ((a - 1) + (a + 1) * cos_w0), (a + 1) + (a - 1) * cos_w0 - k)
+
+def high_shelf(freq, gain_db, q, sample_rate):
+    a = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * freq / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    k = 2 * math.sqrt(a) * alpha
+    return _biquad(a * ((a + 1) + (a - 1) * cos_w0 + k), -2 * a * ((a - 1) + (a + 1) * cos_w0), a * ((a + 1) + (a - 1) * cos_w0 - k),
+                   (a + 1) - (a - 1) * cos_w0 + k, 2 * ((a - 1) - (a + 1) * cos_w0), (a + 1) - (a - 1) * cos_w0 - k)
+
+def highpass(freq, q, sample_rate):
+    w0 = 2 * math.pi * freq / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    return _biquad((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2, 1 + alpha, -2 * cos_w0, 1 - alpha)
@@ -6,27 +6,121 @@ except ImportError:
     np = None
 import os
 import hashlib
-from voice import get_voice_metadata
+import threading
+from collections import OrderedDict
+from voice import get_voice_index
 
-def load_embedding(voice_name: str) -> list:
-    if not USE_NUMPY:
-        print("NumPy not available, using dummy embedding")
-        return [0.5] * 256
-    try:
-        meta = get_voice_metadata(voice_name)
-        path = f"voices/{voice_name}.bin"
-        if not os.path.exists(path):
+EMBEDDING_DIM = 256
+MAX_CACHED_MORPHS = 64
+
+class EmbeddingCache:
+    """Memory-mapped speaker embeddings, verified once per file version.
+
+    A voice's version is the (mtime, size) of its .bin plus the mtime of its
+    metadata .json; editing either invalidates the cached array and its
+    checksum verification.
+    """
+
+    def __init__(self, voices_dir="voices"):
+        self.voices_dir = voices_dir
+        self._embeddings = {}
+        self._morphs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, voice_name):
+        return os.path.join(self.voices_dir, f"{voice_name}.bin")
+
+    def _version(self, voice_name):
+        try:
+            st = os.stat(self._path(voice_name))
+        except OSError:
             raise RuntimeError("Embedding file not found")
-        embedding = np.fromfile(path, dtype=np.float32).tolist()
-        # Check checksum
+        try:
+            meta_mtime = os.stat(os.path.join(self.voices_dir, f"{voice_name}.json")).st_mtime_ns
+        except OSError:
+            meta_mtime = None
+        return (st.st_mtime_ns, st.st_size, meta_mtime)
+
+    def get(self, voice_name: str):
+        version = self._version(voice_name)
+        with self._lock:
+            cached = self._embeddings.get(voice_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        # The voice index throttles its scans; make sure it has seen the
+        # metadata file this version was taken from
+        index = get_voice_index(self.voices_dir)
+        index.refresh(force=True)
+        meta = index.get(voice_name)
+        if meta is None:
+            raise RuntimeError("Voice not found")
+        if version[1] == 0:
+            # np.memmap cannot map an empty file
+            raise RuntimeError("Embedding file is empty")
+        embedding = np.memmap(self._path(voice_name), dtype=np.float32, mode='r')
         if meta.checksum:
-            computed = hashlib.sha256(np.array(embedding, dtype=np.float32).tobytes()).hexdigest()
+            computed = hashlib.sha256(embedding).hexdigest()
             if computed != meta.checksum:
                 raise RuntimeError("Checksum mismatch")
+        with self._lock:
+            self._embeddings[voice_name] = (version, embedding)
         return embedding
+
+    def get_morphed(self, voice_name: str, other_voice: str, blend: float):
+        emb1 = self.get(voice_name)
+        emb2 = self.get(other_voice)
+        key = (voice_name, self._version(voice_name), other_voice, self._version(other_voice), blend)
+        with self._lock:
+            morphed = self._morphs.get(key)
+            if morphed is not None:
+                self._morphs.move_to_end(key)
+                return morphed
+        morphed = morph_embeddings(emb1, emb2, blend)
+        with self._lock:
+            self._morphs[key] = morphed
+            while len(self._morphs) > MAX_CACHED_MORPHS:
+                self._morphs.popitem(last=False)
+        return morphed
+
+    def clear(self):
+        with self._lock:
+            self._embeddings.clear()
+            self._morphs.clear()
+
+_cache = EmbeddingCache()
+
+def get_embedding_cache() -> EmbeddingCache:
+    return _cache
+
+def _fallback_embedding():
+    if USE_NUMPY:
+        return np.full(EMBEDDING_DIM, 0.5, dtype=np.float32)
+    return [0.5] * EMBEDDING_DIM
+
+def load_embedding(voice_name: str):
+    if not USE_NUMPY:
+        print("NumPy not available, using dummy embedding")
+        return _fallback_embedding()
+    try:
+        return _cache.get(voice_name)
     except Exception as e:
         print(f"Error loading embedding: {e}")
-        return [0.5] * 256  # fallback
+        return _fallback_embedding()
 
-def morph_embeddings(emb1: list, emb2: list, blend: float) -> list:
-    return [e1 * (1 - blend) + e2 * blend for e1, e2 in zip(emb1, emb2)]
\ No newline at end of file
+def load_morphed_embedding(voice_name: str, other_voice: str, blend: float):
+    if not USE_NUMPY:
+        return morph_embeddings(load_embedding(voice_name), load_embedding(other_voice), blend)
+    try:
+        return _cache.get_morphed(voice_name, other_voice, blend)
+    except Exception as e:
+        print(f"Error loading embedding: {e}")
+        return _fallback_embedding()
+
+def morph_embeddings(emb1, emb2, blend: float):
+    if not USE_NUMPY:
+        return [e1 * (1 - blend) + e2 * blend for e1, e2 in zip(emb1, emb2)]
+    emb1 = np.asarray(emb1, dtype=np.float32)
+    emb2 = np.asarray(emb2, dtype=np.float32)
+    n = min(len(emb1), len(emb2))
+    return emb1[:n] * np.float32(1 - blend) + emb2[:n] * np.float32(blend)
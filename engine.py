@@ -0,0 +1,311 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from text_normalizer import parse_and_normalize_text, iter_segments
+from tokenizer import tokenize
+from onnx_session import InferenceJob
+from batching import BatchEntry, run_inference_jobs
+from embedding_loader import load_embedding, load_morphed_embedding
+from audio_postprocess import postprocess_audio, eq_filter
+from audio_buffer import PCMBuffer, SAMPLE_RATE
+from voice import get_voice_eq_preset
+from multilingual import get_model_for_locale, detect_language, get_model_checksum
+from mp3_encoder import encode_mp3, MP3StreamEncoder
+from session_pool import get_session
+from streaming import iter_stream_chunks, StreamAssembler, DEFAULT_FRAME_SIZE
+from loudness import StreamingNormalizer
+from lexicon import resolve_lexicon
+import synth_cache
+from synth_cache import embedding_checksum, segment_cache_key
+from tracing import span, metrics
+
+DEFAULT_WORKERS = 4
+
+class SynthRequest:
+    """Full parameter set of one synthesis, shared by the CLI and the server."""
+
+    # name -> (type, default)
+    FIELDS = {
+        'text': (str, ''),
+        'voice': (str, 'narrator'),
+        'morph_voice': (str, None),
+        'blend': (float, 0.0),
+        'bitrate': (int, 320),
+        'title': (str, None),
+        'artist': (str, None),
+        'album': (str, None),
+        'rate': (float, 1.0),
+        'pitch': (float, 0.0),
+        'volume': (float, 1.0),
+        'emotion': (str, 'neutral'),
+        'locale': (str, 'auto'),
+        'dict': (str, None),
+        'jitter': (float, 0.0),
+        'shimmer': (float, 0.0),
+        'normalize_lufs': (float, -16.0),
+        'dither_bits': (int, 16),
+        # None: the voice's own preset
+        'eq_preset': (str, None),
+    }
+
+    def __init__(self, **params):
+        for name, (kind, default) in self.FIELDS.items():
+            value = params.pop(name, default)
+            if value is not None:
+                value = kind(value)
+            setattr(self, name, value)
+        if params:
+            raise ValueError(f"Unknown synthesis parameters: {', '.join(sorted(params))}")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SynthRequest':
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object")
+        try:
+            return cls(**{key.replace('-', '_'): value for key, value in data.items()})
+        except (TypeError, ValueError) as e:
+            raise ValueError(str(e))
+
+    @classmethod
+    def from_client(cls, data: dict, lexicon_dir=None) -> 'SynthRequest':
+        """A request from a network client: `dict` may only name a file in `lexicon_dir`."""
+        request = cls.from_dict(data)
+        if request.dict:
+            request.dict = resolve_lexicon(request.dict, lexicon_dir)
+        return request
+
+    @classmethod
+    def from_args(cls, opts) -> 'SynthRequest':
+        return cls(**{name: getattr(opts, name) for name in cls.FIELDS if hasattr(opts, name)})
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+def eq_preset_for(request: SynthRequest) -> str:
+    return request.eq_preset or get_voice_eq_preset(request.voice)
+
+class SynthResult:
+    def __init__(self, pcm, locale, sample_rate=SAMPLE_RATE):
+        self.pcm = pcm
+        self.locale = locale
+        self.sample_rate = sample_rate
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / self.sample_rate
+
+class PreparedSynth:
+    # A request after text processing, waiting for inference
+    def __init__(self, request, locale, model_path, voice_key, segments, entries, cache_keys=None):
+        self.request = request
+        self.locale = locale
+        self.model_path = model_path
+        self.voice_key = voice_key
+        self.segments = segments
+        self.entries = entries
+        self.cache_keys = cache_keys
+
+class SynthesisEngine:
+    """Warm, thread-safe synthesis pipeline for long-running processes.
+
+    Sessions and embeddings come from the process-wide pools, so once a
+    model or voice has been used it stays loaded. Rendering happens in
+    memory; callers decide where the audio goes.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, cache=None):
+        self.max_workers = max_workers
+        # Optional synth_cache.SynthCache of per-segment inference output
+        self.cache = cache
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def embedding_for(self, request: SynthRequest):
+        """Speaker embedding for the request's voice, morphed if it asks for it."""
+        if request.morph_voice:
+            return load_morphed_embedding(request.voice, request.morph_voice, request.blend)
+        return load_embedding(request.voice)
+
+    def prepare(self, request: SynthRequest) -> 'PreparedSynth':
+        """Normalize and tokenize a request into inference jobs."""
+        with span('normalize'):
+            locale = request.locale
+            if locale == 'auto':
+                locale = detect_language(request.text)
+            segments = parse_and_normalize_text(request.text, locale, request.dict)
+        lang_model = get_model_for_locale(locale)
+        with span('embedding_load'):
+            embedding = self.embedding_for(request)
+
+        voice_key = (request.voice, request.morph_voice, request.blend)
+        entries = []
+        with span('tokenize'):
+            for seg in segments:
+                if seg.break_time > 0:
+                    continue
+                tokens = tokenize(seg.text, locale)
+                job = InferenceJob(tokens, embedding, request.rate * seg.rate, request.pitch + seg.pitch, request.volume * seg.volume,
+                                   request.emotion, request.jitter, request.shimmer, seg.emphasis, seg.breath)
+                entries.append(BatchEntry(lang_model.model_path, voice_key, job))
+
+        cache_keys = None
+        if self._cache_enabled():
+            embedding_sum = embedding_checksum(embedding)
+            model_sum = get_model_checksum(lang_model.model_path)
+            cache_keys = [segment_cache_key(locale, embedding_sum, model_sum, entry.job) for entry in entries]
+        return PreparedSynth(request, locale, lang_model.model_path, voice_key, segments, entries, cache_keys)
+
+    def _cache_enabled(self) -> bool:
+        return self.cache is not None and synth_cache.USE_NUMPY
+
+    def infer(self, entries, cache_keys=None, runner=run_inference_jobs):
+        """Run inference for `entries`, serving repeated segments from the cache."""
+        if not cache_keys or not self._cache_enabled():
+            return runner(entries)
+        outputs = [self.cache.get(key) for key in cache_keys]
+        missing = {}
+        for i, pcm in enumerate(outputs):
+            if pcm is None:
+                missing.setdefault(cache_keys[i], []).append(i)
+        if missing:
+            fresh = runner([entries[indices[0]] for indices in missing.values()])
+            for (key, indices), pcm in zip(missing.items(), fresh):
+                self.cache.put(key, pcm)
+                for i in indices:
+                    outputs[i] = pcm
+        return outputs
+
+    def finish(self, prepared: 'PreparedSynth', outputs, postprocess=True) -> SynthResult:
+        """Assemble inference outputs and silences, then post-process."""
+        request = prepared.request
+        outputs = iter(outputs)
+        full_pcm = PCMBuffer()
+        for seg in prepared.segments:
+            if seg.break_time > 0:
+                full_pcm.append_silence(int(seg.break_time * SAMPLE_RATE))
+            else:
+                full_pcm.append(next(outputs))
+        if not postprocess:
+            return SynthResult(full_pcm.samples, prepared.locale)
+        result = SynthResult(self.postprocess(full_pcm.samples, request), prepared.locale)
+        metrics.inc('tts_requests_total')
+        metrics.inc('tts_audio_seconds_total', result.duration)
+        return result
+
+    def postprocess(self, pcm, request: SynthRequest):
+        with span('postprocess'):
+            return postprocess_audio(pcm, eq_preset_for(request), request.normalize_lufs, request.dither_bits)
+
+    def synthesize(self, request: SynthRequest, postprocess=True) -> SynthResult:
+        prepared = self.prepare(request)
+        # Segments sharing prosody are synthesized together in batches
+        return self.finish(prepared, self.infer(prepared.entries, prepared.cache_keys), postprocess)
+
+    def synthesize_many(self, requests, postprocess=True):
+        """Synthesize several requests with their segments batched together."""
+        prepared = [self.prepare(request) for request in requests]
+        entries = [entry for p in prepared for entry in p.entries]
+        cache_keys = None
+        if all(p.cache_keys is not None for p in prepared):
+            cache_keys = [key for p in prepared for key in p.cache_keys]
+        outputs = self.infer(entries, cache_keys)
+        results = []
+        offset = 0
+        for p in prepared:
+            results.append(self.finish(p, outputs[offset:offset + len(p.entries)], postprocess))
+            offset += len(p.entries)
+        return results
+
+    def encode(self, result: SynthResult, request: SynthRequest) -> bytes:
+        out = io.BytesIO()
+        if not encode_mp3(result.pcm, out, request.bitrate, request.title or '', request.artist or '', request.album or ''):
+            raise RuntimeError("MP3 encoding is not available")
+        return out.getvalue()
+
+    def render_mp3(self, request: SynthRequest) -> bytes:
+        return self.encode(self.synthesize(request), request)
+
+    def stream_mp3(self, request: SynthRequest, frame_size=DEFAULT_FRAME_SIZE):
+        """Yield MP3 bytes phrase by phrase, as soon as each phrase is synthesized.
+
+        Text is parsed lazily and synthesized one prosodic phrase at a time
+        through the streaming assembler. A stream has no finished buffer to
+        post-process, so frames get the EQ preset and a StreamingNormalizer
+        instead of the whole-file chain. Phrases run on the engine's worker
+        pool, so streams count against `max_workers` like any other job.
+        """
+        locale = request.locale
+        if locale == 'auto':
+            locale = detect_language(request.text)
+        segments = iter_segments(request.text, locale, request.dict)
+        embedding = self.embedding_for(request)
+        session = get_session(get_model_for_locale(locale).model_path)
+        eq = eq_filter(eq_preset_for(request))
+        normalizer = StreamingNormalizer(request.normalize_lufs)
+        encoder = MP3StreamEncoder(None, request.bitrate, request.title or '', request.artist or '', request.album or '')
+        encoded = [encoder.open()]
+
+        def emit(frame):
+            # Frames are reused by the assembler
+            frame = frame.copy()
+            if eq is not None:
+                eq.process(frame)
+            encoded.append(encoder.write(normalizer.process(frame)))
+
+        def drain() -> bytes:
+            data = b''.join(encoded)
+            encoded.clear()
+            return data
+
+        try:
+            assembler = StreamAssembler(emit, frame_size)
+            for chunk in iter_stream_chunks(segments, embedding, locale, request.rate, request.pitch, request.volume,
+                                            request.emotion, request.jitter, request.shimmer):
+                if isinstance(chunk, int):
+                    assembler.push_silence(chunk)
+                else:
+                    assembler.push(self._pool().submit(
+                        session.run_inference, chunk.tokens, chunk.embedding, chunk.rate, chunk.pitch, chunk.volume,
+                        chunk.emotion, chunk.jitter, chunk.shimmer, chunk.emphasis, chunk.breath).result())
+                data = drain()
+                if data:
+                    yield data
+            assembler.close()
+            encoded.append(encoder.close())
+            data = drain()
+            if data:
+                yield data
+        finally:
+            # Releases the encoder when the client goes away mid-stream
+            encoder.close()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='synth')
+            return self._executor
+
+    def submit(self, request: SynthRequest):
+        return self._pool().submit(self.synthesize, request)
+
+    def submit_many(self, requests, postprocess=True):
+        return self._pool().submit(self.synthesize_many, requests, postprocess)
+
+    def submit_mp3(self, request: SynthRequest):
+        return self._pool().submit(self.render_mp3, request)
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> SynthesisEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SynthesisEngine()
+        return _engine
@@ -8,53 +8,89 @@ except ImportError:
     jsonify = None
     Response = None
 
-import io
+from engine import SynthesisEngine, SynthRequest, DEFAULT_WORKERS
+from tracing import render_metrics, PROMETHEUS_CONTENT_TYPE
+
+# Warm engine shared by every request; replaced by start_http_server
+engine = SynthesisEngine(DEFAULT_WORKERS)
+# Directory clients may pick pronunciation dictionaries from; None refuses 'dict'
+lexicon_dir = None
+
+def _parse_request():
+    data = request.get_json(silent=True)
+    if data is None:
+        raise ValueError("Request body must be JSON")
+    synth_request = SynthRequest.from_client(data, lexicon_dir)
+    if not synth_request.text:
+        raise ValueError("'text' is required")
+    return synth_request
 
 if USE_FLASK:
     app = Flask(__name__)
 
     @app.route('/voices', methods=['GET'])
     def get_voices():
-        from voice import list_voices
-        voices = list_voices()
+        from voice import find_voices
+        voices = find_voices(request.args.get('locale'), request.args.get('gender'))
         return jsonify([{'name': v.name, 'gender': v.gender, 'locale': v.locale} for v in voices])
 
     @app.route('/synth', methods=['POST'])
     def synth():
-        from cli import run_cli
-        data = request.json
-        text = data.get('text', '')
-        voice = data.get('voice', 'narrator')
-        # Run synth
-        args = ['synth', '--text', text, '--voice', voice, '--out', '/tmp/temp.mp3']
-        run_cli(args)
-        # Read file and return
-        with open('/tmp/temp.mp3', 'rb') as f:
-            mp3_data = f.read()
+        try:
+            synth_request = _parse_request()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            mp3_data = engine.submit_mp3(synth_request).result()
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
         return mp3_data, 200, {'Content-Type': 'audio/mpeg'}
 
     @app.route('/status', methods=['GET'])
     def status():
-        return jsonify({'status': 'running'})
+        data = {'status': 'running', 'workers': engine.max_workers}
+        if engine.cache is not None:
+            data['cache'] = dict(engine.cache.stats.to_dict(), entries=len(engine.cache), bytes=engine.cache.size_bytes)
+        return jsonify(data)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain', content_type=PROMETHEUS_CONTENT_TYPE)
 
     @app.route('/stream', methods=['POST'])
     def stream():
-        from cli import run_cli
-        data = request.json
-        text = data.get('text', '')
-        voice = data.get('voice', 'narrator')
-        # Stream PCM
+        try:
+            synth_request = _parse_request()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # MP3 frames go out phrase by phrase as they are synthesized; the
+        # first phrase is rendered here so errors still get a JSON answer
+        chunks = engine.stream_mp3(synth_request)
+        try:
+            first = next(chunks, b'')
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
         def generate():
-            # Placeholder for streaming
-            args = ['synth', '--text', text, '--voice', voice, '--out', '/tmp/stream.mp3']
-            run_cli(args)
-            with open('/tmp/stream.mp3', 'rb') as f:
-                while chunk := f.read(1024):
-                    yield chunk
+            yield first
+            yield from chunks
         return Response(generate(), mimetype='audio/mpeg')
 
-def start_http_server(port=8080):
+def start_http_server(port=8080, workers=DEFAULT_WORKERS, cache=None, warmup=True, dict_dir=None):
+    global engine, lexicon_dir
     if USE_FLASK:
-        app.run(host='0.0.0.0', port=port)
+        from batching import start_shared_batcher, stop_shared_batcher
+        if warmup:
+            # Pay for model loading and graph optimization before the first request
+            from warmup import warm_up
+            warm_up()
+        engine = SynthesisEngine(workers, cache)
+        lexicon_dir = dict_dir
+        # Coalesce inference from concurrent requests into shared batches
+        start_shared_batcher()
+        try:
+            app.run(host='0.0.0.0', port=port, threaded=True)
+        finally:
+            stop_shared_batcher()
+            engine.close()
     else:
-        print("Flask not available, cannot start HTTP server")
\ No newline at end of file
+        print("Flask not available, cannot start HTTP server")
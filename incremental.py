@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+from engine import SynthRequest, SynthResult
+from multilingual import detect_language, get_model_for_locale, get_model_checksum
+from synth_cache import embedding_checksum
+
+MANIFEST_VERSION = 1
+DEFAULT_WATCH_INTERVAL = 0.5
+
+# Request fields that only affect post-processing or tagging; changing them
+# does not invalidate the raw per-unit audio
+_POST_FIELDS = ('text', 'bitrate', 'title', 'artist', 'album', 'normalize_lufs', 'dither_bits', 'eq_preset')
+
+_tag = re.compile(r'(<[^>]+>)')
+_unit_boundary = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+def split_units(text: str):
+    """Split text into sentence units, never cutting inside an SSML element.
+
+    A sentence boundary only counts at the top level, so a <prosody> or
+    <emphasis> span that covers several sentences stays one unit.
+    """
+    units = []
+    current = []
+    depth = 0
+    for part in _tag.split(text):
+        if not part:
+            continue
+        if part.startswith('<'):
+            if part.startswith('</'):
+                depth = max(depth - 1, 0)
+            elif not part.endswith('/>'):
+                depth += 1
+            current.append(part)
+            continue
+        if depth > 0:
+            current.append(part)
+            continue
+        pieces = _unit_boundary.split(part)
+        for piece in pieces[:-1]:
+            current.append(piece)
+            units.append(''.join(current))
+            current = []
+        current.append(pieces[-1])
+    units.append(''.join(current))
+    return [unit.strip() for unit in units if unit.strip()]
+
+def unit_hash(unit: str, params_hash: str) -> str:
+    return hashlib.sha256((params_hash + '\0' + ' '.join(unit.split())).encode('utf-8')).hexdigest()
+
+class IncrementalRenderer:
+    """Re-renders a text file, resynthesizing only the sentences that changed.
+
+    Next to the output sit two sidecars: `<out>.manifest.json` with a hash
+    and sample range per unit, and `<out>.pcm` with the raw float32 audio
+    of every unit before post-processing. Unchanged units are copied from
+    the previous render; post-processing and encoding always run on the
+    whole spliced result.
+    """
+
+    def __init__(self, engine, output_path: str):
+        self.engine = engine
+        self.output_path = output_path
+        self.manifest_path = output_path + '.manifest.json'
+        self.pcm_path = output_path + '.pcm'
+
+    def _params_hash(self, request: SynthRequest) -> str:
+        params = {name: value for name, value in request.to_dict().items() if name not in _POST_FIELDS}
+        params['model'] = get_model_checksum(get_model_for_locale(request.locale).model_path)
+        # Covers edits to the voice's .bin, not just its name
+        params['embedding'] = embedding_checksum(self.engine.embedding_for(request))
+        if request.dict and os.path.exists(request.dict):
+            st = os.stat(request.dict)
+            params['dict_version'] = [st.st_mtime_ns, st.st_size]
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _load_previous(self, params_hash: str):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != MANIFEST_VERSION or manifest.get('params') != params_hash:
+                return {}, None
+            pcm = np.memmap(self.pcm_path, dtype=np.float32, mode='r') if os.path.getsize(self.pcm_path) else np.zeros(0, np.float32)
+        except (OSError, ValueError):
+            return {}, None
+        previous = {}
+        for unit in manifest.get('units', []):
+            start, length = unit['offset'], unit['length']
+            if start + length <= len(pcm):
+                previous.setdefault(unit['hash'], (start, length))
+        return previous, pcm
+
+    def render(self, text: str, request: SynthRequest) -> dict:
+        """Render `text` to the output file; returns unit counts."""
+        if not USE_NUMPY:
+            raise RuntimeError("Incremental rendering requires numpy")
+        if request.locale == 'auto':
+            # Detect once for the whole file so units never switch language
+            request.locale = detect_language(text)
+        params_hash = self._params_hash(request)
+        previous, old_pcm = self._load_previous(params_hash)
+
+        units = split_units(text)
+        hashes = [unit_hash(unit, params_hash) for unit in units]
+        changed = {}
+        for unit, h in zip(units, hashes):
+            if h not in previous and h not in changed:
+                changed[h] = unit
+        fresh = {}
+        if changed:
+            base = request.to_dict()
+            requests = [SynthRequest(**dict(base, text=unit)) for unit in changed.values()]
+            results = self.engine.synthesize_many(requests, postprocess=False)
+            fresh = {h: result.pcm for h, result in zip(changed, results)}
+
+        pieces = []
+        manifest_units = []
+        offset = 0
+        for h in hashes:
+            if h in fresh:
+                pcm = fresh[h]
+            else:
+                start, length = previous[h]
+                pcm = old_pcm[start:start + length]
+            pieces.append(pcm)
+            manifest_units.append({'hash': h, 'offset': offset, 'length': len(pcm)})
+            offset += len(pcm)
+        raw = np.concatenate(pieces).astype(np.float32, copy=False) if pieces else np.zeros(0, np.float32)
+        del pieces, old_pcm
+
+        tmp_path = self.pcm_path + '.tmp'
+        raw.tofile(tmp_path)
+        os.replace(tmp_path, self.pcm_path)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'params': params_hash, 'units': manifest_units}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+        pcm = self.engine.postprocess(raw.copy(), request)
+        with open(self.output_path, 'wb') as out:
+            out.write(self.engine.encode(SynthResult(pcm, request.locale), request))
+        return {'units': len(units), 'rendered': len(changed), 'reused': len(units) - len(changed)}
+
+def watch(path: str, on_change, interval=DEFAULT_WATCH_INTERVAL):
+    """Call `on_change()` whenever `path` is saved; runs until interrupted."""
+    last = None
+    while True:
+        try:
+            st = os.stat(path)
+            version = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            version = None
+        if version is not None and version != last:
+            last = version
+            on_change()
+        time.sleep(interval)
@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import threading
+
+# The compiled format is this header then a JSON list of [word, replacement]
+# pairs; the trie is rebuilt on load, so a .lex file is only ever data
+LEXICON_MAGIC = b'TTSLEX\x00\x02'
+LEXICON_EXTENSION = '.lex'
+
+# Words and single punctuation marks; dictionary keys are split the same
+# way so "Dr." or "AT&T" match as a run of adjacent tokens
+_token = re.compile(r'\w+|[^\w\s]')
+# Trie key marking the end of an entry; tokens are never empty
+_LEAF = ''
+
+class Lexicon:
+    """Pronunciation dictionary compiled into a token trie.
+
+    `apply` makes one pass over the text and, at every token, takes the
+    longest entry that starts there, so lookups cost the same with ten
+    entries or fifty thousand.
+    """
+
+    def __init__(self, entries=None):
+        self._root = {}
+        self._size = 0
+        for word, replacement in (entries or {}).items():
+            self.add(word, replacement)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, word: str, replacement: str):
+        tokens = _token.findall(word)
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if _LEAF not in node:
+            self._size += 1
+        node[_LEAF] = replacement
+
+    def apply(self, text: str) -> str:
+        root = self._root
+        if not root:
+            return text
+        tokens = [(m.start(), m.end(), m.group()) for m in _token.finditer(text)]
+        out = []
+        pos = 0
+        i = 0
+        n = len(tokens)
+        while i < n:
+            node = root.get(tokens[i][2])
+            if node is None:
+                i += 1
+                continue
+            best = None
+            j = i + 1
+            while True:
+                if _LEAF in node:
+                    best = (j, node[_LEAF])
+                # Entries never span whitespace
+                if j >= n or tokens[j][0] != tokens[j - 1][1]:
+                    break
+                node = node.get(tokens[j][2])
+                if node is None:
+                    break
+                j += 1
+            if best is None:
+                i += 1
+                continue
+            end, replacement = best
+            out.append(text[pos:tokens[i][0]])
+            out.append(replacement)
+            pos = tokens[end - 1][1]
+            i = end
+        out.append(text[pos:])
+        return ''.join(out)
+
+    def entries(self):
+        """(word, replacement) pairs; keys come back as their tokens joined."""
+        stack = [((), self._root)]
+        while stack:
+            tokens, node = stack.pop()
+            for token, child in node.items():
+                if token == _LEAF:
+                    yield ''.join(tokens), child
+                else:
+                    stack.append((tokens + (token,), child))
+
+    def save(self, path: str):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(LEXICON_MAGIC)
+            f.write(json.dumps(sorted(self.entries()), ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _from_compiled(cls, f) -> 'Lexicon':
+        entries = json.loads(f.read().decode('utf-8'))
+        if not isinstance(entries, list):
+            raise ValueError("Corrupt compiled lexicon")
+        lexicon = cls()
+        for entry in entries:
+            if not (isinstance(entry, list) and len(entry) == 2 and all(isinstance(part, str) for part in entry)):
+                raise ValueError("Corrupt compiled lexicon")
+            lexicon.add(*entry)
+        return lexicon
+
+def read_dict_file(path: str) -> dict:
+    """Parse the text format: one `word replacement...` entry per line."""
+    entries = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) >= 2:
+                entries[parts[0]] = ' '.join(parts[1:])
+    return entries
+
+def read_lexicon(path: str) -> Lexicon:
+    """Load a text dictionary or a compiled .lex file, detected by its header."""
+    with open(path, 'rb') as f:
+        if f.read(len(LEXICON_MAGIC)) == LEXICON_MAGIC:
+            return Lexicon._from_compiled(f)
+    return Lexicon(read_dict_file(path))
+
+def resolve_lexicon(name: str, lexicon_dir) -> str:
+    """Path of a dictionary named by an untrusted client.
+
+    Only plain file names inside `lexicon_dir` are accepted; without a
+    directory, client-supplied dictionaries are refused.
+    """
+    if not lexicon_dir:
+        raise ValueError("'dict' is not accepted by this server")
+    if name in ('.', '..') or os.path.basename(name) != name or os.sep in name or (os.altsep and os.altsep in name):
+        raise ValueError("'dict' must be a dictionary name, not a path")
+    root = os.path.realpath(lexicon_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.dirname(path) != root or not os.path.isfile(path):
+        raise ValueError(f"Unknown dictionary: {name}")
+    return path
+
+def compile_lexicon(dict_path: str, out_path=None) -> str:
+    out_path = out_path or os.path.splitext(dict_path)[0] + LEXICON_EXTENSION
+    read_lexicon(dict_path).save(out_path)
+    return out_path
+
+# path -> ((mtime_ns, size), Lexicon)
+_cache = {}
+_cache_lock = threading.Lock()
+
+def load_lexicon(path):
+    """Cached load of a dictionary; re-read only when the file changes.
+
+    Returns None when there is no dictionary or it cannot be read.
+    """
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    version = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    try:
+        lexicon = read_lexicon(path)
+    except (OSError, ValueError, UnicodeDecodeError):
+        return None
+    with _cache_lock:
+        _cache[path] = (version, lexicon)
+    return lexicon
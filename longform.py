@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+from engine import SynthRequest, eq_preset_for
+from incremental import split_units
+from multilingual import detect_language
+from audio_buffer import SAMPLE_RATE
+from audio_postprocess import eq_filter
+from loudness import LoudnessMeter, normalization_gain
+from advanced_audio import _db_to_amplitude, apply_noise_gate, StreamingCompressor, apply_limiter, apply_dithering
+from mp3_encoder import MP3StreamEncoder
+
+# Sentences synthesized per engine call; bounds the PCM held in memory
+UNITS_PER_WINDOW = 32
+# Samples per post-processing block (about 6s)
+BLOCK_SIZE = 1 << 18
+TRIM_THRESHOLD_DB = -60.0
+
+class SpillFile:
+    """Append-only float32 PCM on disk, processed through short-lived memory maps.
+
+    While samples are appended it tracks what the post-processing chain
+    would otherwise need a full pass for: the trim bounds and the peak.
+    Only one block is ever mapped at a time, so resident memory does not
+    grow with the length of the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.length = 0
+        self.trim_start = None
+        self.trim_end = 0
+        self.peak = 0.0
+        self._loud = _db_to_amplitude(TRIM_THRESHOLD_DB)
+        self._file = open(path, 'wb')
+
+    def append(self, pcm):
+        pcm = np.asarray(pcm, dtype=np.float32)
+        if len(pcm):
+            magnitude = np.abs(pcm)
+            loud = magnitude > self._loud
+            if loud.any():
+                if self.trim_start is None:
+                    self.trim_start = self.length + int(np.argmax(loud))
+                self.trim_end = self.length + len(loud) - int(np.argmax(loud[::-1]))
+            self.peak = max(self.peak, float(magnitude.max()))
+        pcm.tofile(self._file)
+        self.length += len(pcm)
+
+    def finish_writing(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def bounds(self):
+        # Range kept after trim_silence; an all-silent file is kept whole
+        if self.trim_start is None:
+            return 0, self.length
+        return self.trim_start, self.trim_end
+
+    def blocks(self, start: int, end: int, block_size=BLOCK_SIZE, writable=False):
+        """Yield memory-mapped views of [start, end) one block at a time."""
+        self.finish_writing()
+        mode = 'r+' if writable else 'r'
+        for offset in range(start, end, block_size):
+            n = min(block_size, end - offset)
+            block = np.memmap(self.path, dtype=np.float32, mode=mode, offset=offset * 4, shape=(n,))
+            yield block
+            if writable:
+                block.flush()
+            del block
+
+    def remove(self):
+        self.finish_writing()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+class Progress:
+    """Single-line progress with an ETA extrapolated from the rate so far."""
+
+    def __init__(self, label: str, total: float, stream=None):
+        self.label = label
+        self.total = total
+        self.stream = stream or sys.stdout
+        self.started_at = time.perf_counter()
+
+    def update(self, done: float, detail=''):
+        elapsed = time.perf_counter() - self.started_at
+        fraction = done / self.total if self.total else 1.0
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else 0.0
+        self.stream.write(f"\r{self.label}: {fraction:6.1%} {detail} elapsed {_clock(elapsed)}, ETA {_clock(eta)}   ")
+        self.stream.flush()
+
+    def done(self):
+        self.stream.write(f"\r{self.label}: done in {_clock(time.perf_counter() - self.started_at)}" + ' ' * 40 + "\n")
+        self.stream.flush()
+
+def _clock(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def postprocess_spill(spill: SpillFile, request: SynthRequest, sink, progress=None, block_size=BLOCK_SIZE):
+    """postprocess_audio over a spill file, block by block, feeding `sink(block)`.
+
+    The first pass applies everything up to the compressor in place and
+    meters loudness; the second applies loudness gain, limiter and dither
+    and hands each block to the sink. Results match postprocess_audio
+    with its default chain.
+    """
+    start, end = spill.bounds
+    total = max(end - start, 1)
+    # Filter state runs on from block to block
+    eq = eq_filter(eq_preset_for(request))
+    compressor = StreamingCompressor()
+    meter = LoudnessMeter()
+    done = 0
+    for block in spill.blocks(start, end, block_size, writable=True):
+        if spill.peak > 0:
+            block /= np.float32(spill.peak)
+        if eq is not None:
+            eq.process(block)
+        apply_noise_gate(block)
+        compressor.process(block)
+        meter.add(block)
+        done += len(block)
+        if progress:
+            progress.update(0.5 * done / total)
+
+    gain = np.float32(normalization_gain(meter.integrated(), request.normalize_lufs))
+    scratch = np.empty(block_size, dtype=np.float32)
+    done = 0
+    for block in spill.blocks(start, end, block_size):
+        out = scratch[:len(block)]
+        np.multiply(block, gain, out=out)
+        apply_limiter(out)
+        apply_dithering(out, request.dither_bits)
+        sink(out)
+        done += len(block)
+        if progress:
+            progress.update(0.5 + 0.5 * done / total)
+    return (end - start) / SAMPLE_RATE
+
+def render_long_form(engine, request: SynthRequest, output_path: str, spill_dir=None, units_per_window=UNITS_PER_WINDOW, analyzer=None):
+    """Render a book-length request to MP3 with memory independent of its length.
+
+    Text is synthesized a window of sentences at a time and spilled to a
+    float32 file next to the output (or in `spill_dir`); post-processing
+    and encoding then stream over that file. An optional
+    quality_metrics.QualityAnalyzer sees the final blocks on their way to
+    the encoder. Returns the audio duration.
+    """
+    if not USE_NUMPY:
+        raise RuntimeError("Long-form rendering requires numpy")
+    if request.locale == 'auto':
+        request.locale = detect_language(request.text)
+    units = split_units(request.text)
+    spill_path = os.path.join(spill_dir or os.path.dirname(os.path.abspath(output_path)),
+                              os.path.basename(output_path) + f'.{os.getpid()}.spill')
+    spill = SpillFile(spill_path)
+    try:
+        base = request.to_dict()
+        total_chars = sum(len(unit) for unit in units)
+        chars = 0
+        progress = Progress('Synthesizing', total_chars)
+        for start in range(0, len(units), units_per_window):
+            window = units[start:start + units_per_window]
+            result = engine.synthesize(SynthRequest(**dict(base, text=' '.join(window))), postprocess=False)
+            spill.append(result.pcm)
+            chars += sum(len(unit) for unit in window)
+            progress.update(chars, f"({min(start + units_per_window, len(units))}/{len(units)} sentences, "
+                                   f"{spill.length / SAMPLE_RATE / 60:.1f} min audio)")
+        progress.done()
+
+        progress = Progress('Post-processing and encoding', 1.0)
+        tmp_path = output_path + '.part'
+        try:
+            with open(tmp_path, 'wb') as f:
+                with MP3StreamEncoder(f, request.bitrate, request.title or '', request.artist or '', request.album or '') as encoder:
+                    def analyzer_sink(block):
+                        analyzer.add(block)
+                        encoder.write(block)
+                    sink = analyzer_sink if analyzer is not None else encoder.write
+                    duration = postprocess_spill(spill, request, sink, progress)
+            os.replace(tmp_path, output_path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        progress.done()
+        return duration
+    finally:
+        spill.remove()
@@ -0,0 +1,175 @@
+import math
+
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+from audio_buffer import SAMPLE_RATE
+from dsp_filters import SOSFilter
+
+# ITU-R BS.1770-4: 400 ms gating blocks overlapping by 75%
+GATE_BLOCK_SECONDS = 0.4
+GATE_STEP_SECONDS = 0.1
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+# Samples measured per call when metering a whole buffer, which bounds
+# the filtered copy the meter needs
+METER_CHUNK = 1 << 16
+# Limits on the gain the streaming normalizer applies while it has
+# heard too little to trust its measurement
+MAX_STREAM_GAIN_DB = 20.0
+MIN_STREAM_GAIN_DB = -20.0
+
+_k_weighting_cache = {}
+
+def k_weighting_sos(sample_rate=SAMPLE_RATE):
+    """The BS.1770 K-weighting filter (high shelf, then high pass) for any sample rate."""
+    sos = _k_weighting_cache.get(sample_rate)
+    if sos is not None:
+        return sos
+    # Stage 1: the head's acoustic effect, a +4 dB shelf around 1.7 kHz
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    # Stage 2: the RLB high pass at 38 Hz
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    sos = _k_weighting_cache[sample_rate] = (tuple(shelf), tuple(highpass))
+    return sos
+
+def _lufs(mean_square: float) -> float:
+    return -0.691 + 10 * math.log10(mean_square) if mean_square > 0 else float('-inf')
+
+# Gating blocks above the absolute gate are kept in a histogram of
+# HISTOGRAM_STEP_LU-wide loudness bins (total energy and count per bin),
+# so the relative gate costs the same however long the signal is
+HISTOGRAM_STEP_LU = 0.01
+HISTOGRAM_MAX_LUFS = 10.0
+
+def _energy(lufs: float) -> float:
+    return 10 ** ((lufs + 0.691) / 10)
+
+class LoudnessMeter:
+    """Integrated loudness (ITU-R BS.1770-4) of a mono signal fed in blocks.
+
+    Only the K-weighting filter state, a partial 100 ms step, the last few
+    step energies and a fixed-size histogram of gating blocks are kept, so
+    a meter can follow a render of any length alongside the other
+    processing and each update costs the same:
+
+        meter = LoudnessMeter()
+        for block in blocks:
+            meter.add(block)
+        meter.integrated()
+
+    Blocks are only split by the relative gate at histogram bin
+    boundaries, which moves the result by far less than 0.01 LU.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.step = int(round(GATE_STEP_SECONDS * sample_rate))
+        self.steps_per_block = int(round(GATE_BLOCK_SECONDS / GATE_STEP_SECONDS))
+        self._filter = SOSFilter(k_weighting_sos(sample_rate))
+        # Sums of squares of the last steps_per_block - 1 complete 100 ms steps
+        self._recent = np.zeros(0)
+        self._pending = np.zeros(0)
+        self.samples = 0
+        self.sum_squares = 0.0
+        self.blocks = 0
+        # Count and total energy of the blocks above the absolute gate
+        self._gated_count = 0
+        self._gated_energy = 0.0
+        bins = int(round((HISTOGRAM_MAX_LUFS - ABSOLUTE_GATE_LUFS) / HISTOGRAM_STEP_LU)) + 1
+        self._gate = _energy(ABSOLUTE_GATE_LUFS)
+        self._counts = np.zeros(bins, dtype=np.int64)
+        self._energies = np.zeros(bins)
+
+    def add(self, block):
+        weighted = self._filter.process(np.array(block, dtype=np.float64))
+        self.samples += len(weighted)
+        self.sum_squares += float(np.dot(weighted, weighted))
+        if len(self._pending):
+            weighted = np.concatenate((self._pending, weighted))
+        complete = len(weighted) // self.step * self.step
+        self._pending = weighted[complete:]
+        if not complete:
+            return
+        steps = np.concatenate((self._recent, np.square(weighted[:complete]).reshape(-1, self.step).sum(axis=1)))
+        self._recent = steps[max(len(steps) - (self.steps_per_block - 1), 0):]
+        if len(steps) < self.steps_per_block:
+            return
+        energies = np.convolve(steps, np.ones(self.steps_per_block), mode='valid') / (self.step * self.steps_per_block)
+        self.blocks += len(energies)
+        energies = energies[energies > self._gate]
+        if len(energies):
+            self._gated_count += len(energies)
+            self._gated_energy += float(energies.sum())
+            lufs = -0.691 + 10 * np.log10(energies)
+            bins = np.clip(((lufs - ABSOLUTE_GATE_LUFS) / HISTOGRAM_STEP_LU).astype(np.int64), 0, len(self._counts) - 1)
+            np.add.at(self._counts, bins, 1)
+            np.add.at(self._energies, bins, energies)
+
+    def integrated(self) -> float:
+        """Gated integrated loudness in LUFS; -inf for silence.
+
+        Input shorter than one gating block is measured ungated.
+        """
+        if not self.blocks:
+            return _lufs(self.sum_squares / self.samples) if self.samples else float('-inf')
+        if not self._gated_count:
+            return float('-inf')
+        relative_gate = _lufs(self._gated_energy / self._gated_count) + RELATIVE_GATE_LU
+        first = max(int((relative_gate - ABSOLUTE_GATE_LUFS) / HISTOGRAM_STEP_LU), 0)
+        # The bin holding the gate counts when its blocks are above it on average
+        if first < len(self._counts) and self._counts[first] and \
+                self._energies[first] / self._counts[first] <= _energy(relative_gate):
+            first += 1
+        count = int(self._counts[first:].sum())
+        return _lufs(float(self._energies[first:].sum()) / count) if count else float('-inf')
+
+def integrated_loudness(pcm, sample_rate=SAMPLE_RATE) -> float:
+    meter = LoudnessMeter(sample_rate)
+    for start in range(0, len(pcm), METER_CHUNK):
+        meter.add(pcm[start:start + METER_CHUNK])
+    return meter.integrated()
+
+def normalization_gain(measured_lufs: float, target_lufs: float) -> float:
+    """Linear gain that moves a signal from `measured_lufs` to `target_lufs`."""
+    if not math.isfinite(measured_lufs):
+        return 1.0
+    return 10 ** ((target_lufs - measured_lufs) / 20)
+
+class StreamingNormalizer:
+    """Loudness normalization for audio that is played as it is produced.
+
+    The gain follows the integrated loudness of everything heard so far
+    and is ramped across each block, so it settles on the same gain a
+    whole-file normalization would use without ever stepping audibly.
+    """
+
+    def __init__(self, target_lufs: float, sample_rate=SAMPLE_RATE):
+        self.target_lufs = target_lufs
+        self.meter = LoudnessMeter(sample_rate)
+        self.gain = 1.0
+
+    def process(self, block):
+        """Measure a float32 block and apply the gain to it in place."""
+        self.meter.add(block)
+        gain_db = self.target_lufs - self.meter.integrated()
+        if math.isfinite(gain_db):
+            target = 10 ** (min(max(gain_db, MIN_STREAM_GAIN_DB), MAX_STREAM_GAIN_DB) / 20)
+        else:
+            target = self.gain
+        if len(block):
+            block *= np.linspace(self.gain, target, len(block), dtype=np.float32)
+        self.gain = target
+        return block
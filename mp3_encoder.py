@@ -12,13 +12,177 @@ except ImportError:
     USE_NUMPY = False
     np = None
 
-def encode_mp3(pcm: list, output_path: str, bitrate=320, title='', artist='', album=''):
+try:
+    import lameenc
+    USE_LAMEENC = True
+except ImportError:
+    USE_LAMEENC = False
+    lameenc = None
+
+import queue
+import shutil
+import subprocess
+import threading
+from audio_buffer import to_int16, as_pcm, SAMPLE_RATE, INT16_BLOCK_SIZE
+from tracing import span
+
+def _syncsafe(n: int) -> bytes:
+    return bytes([(n >> 21) & 0x7f, (n >> 14) & 0x7f, (n >> 7) & 0x7f, n & 0x7f])
+
+def id3_tag(title='', artist='', album='') -> bytes:
+    """Minimal ID3v2.4 tag with UTF-8 title, artist and album frames."""
+    frames = b''
+    for frame_id, value in (('TIT2', title), ('TPE1', artist), ('TALB', album)):
+        if value:
+            data = b'\x03' + value.encode('utf-8')
+            frames += frame_id.encode('ascii') + _syncsafe(len(data)) + b'\x00\x00' + data
+    if not frames:
+        return b''
+    return b'ID3\x04\x00\x00' + _syncsafe(len(frames)) + frames
+
+def streaming_available() -> bool:
+    return USE_NUMPY and (USE_LAMEENC or shutil.which('ffmpeg') is not None)
+
+class _LameBackend:
+    def __init__(self, bitrate, sample_rate):
+        self._encoder = lameenc.Encoder()
+        self._encoder.set_bit_rate(bitrate)
+        self._encoder.set_in_sample_rate(sample_rate)
+        self._encoder.set_channels(1)
+        self._encoder.set_quality(2)
+        self._encoder.silence()
+
+    def encode(self, pcm16) -> bytes:
+        return bytes(self._encoder.encode(pcm16.tobytes()))
+
+    def flush(self) -> bytes:
+        return bytes(self._encoder.flush())
+
+class _FFmpegBackend:
+    # Pipes raw PCM through an ffmpeg process; a reader thread collects frames
+    def __init__(self, bitrate, sample_rate):
+        self._process = subprocess.Popen(
+            ['ffmpeg', '-loglevel', 'error', '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+             '-f', 'mp3', '-b:a', f'{bitrate}k', '-id3v2_version', '0', '-write_xing', '0', 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._output = queue.Queue()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        while chunk := self._process.stdout.read1(65536):
+            self._output.put(chunk)
+
+    def _drain(self) -> bytes:
+        chunks = []
+        while True:
+            try:
+                chunks.append(self._output.get_nowait())
+            except queue.Empty:
+                return b''.join(chunks)
+
+    def encode(self, pcm16) -> bytes:
+        self._process.stdin.write(pcm16.tobytes())
+        return self._drain()
+
+    def flush(self) -> bytes:
+        self._process.stdin.close()
+        self._reader.join()
+        self._process.wait()
+        return self._drain()
+
+class MP3StreamEncoder:
+    """Incremental MP3 encoder: open(), write(chunk) as PCM arrives, close().
+
+    Encoded bytes go to `output` (anything with a write method) and are
+    also returned from write() and close(), so a caller without a file can
+    forward them directly, e.g. as an HTTP response body. Memory use does
+    not depend on the length of the audio.
+    """
+
+    def __init__(self, output=None, bitrate=320, title='', artist='', album='', sample_rate=SAMPLE_RATE):
+        self.output = output
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.tags = (title or '', artist or '', album or '')
+        self.bytes_written = 0
+        self._backend = None
+        self._scratch = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self) -> bytes:
+        if not USE_NUMPY:
+            raise RuntimeError("NumPy not available, cannot encode MP3")
+        if USE_LAMEENC:
+            self._backend = _LameBackend(self.bitrate, self.sample_rate)
+        elif shutil.which('ffmpeg'):
+            self._backend = _FFmpegBackend(self.bitrate, self.sample_rate)
+        else:
+            raise RuntimeError("No MP3 encoder available (install lameenc or ffmpeg)")
+        self._scratch = np.empty(INT16_BLOCK_SIZE, dtype=np.int16)
+        return self._emit(id3_tag(*self.tags))
+
+    def write(self, pcm) -> bytes:
+        pcm = as_pcm(pcm)
+        data = []
+        for start in range(0, len(pcm), INT16_BLOCK_SIZE):
+            block = pcm[start:start + INT16_BLOCK_SIZE]
+            pcm16 = to_int16(block, self._scratch[:len(block)])
+            data.append(self._backend.encode(pcm16))
+        return self._emit(b''.join(data))
+
+    def close(self) -> bytes:
+        if self._backend is None:
+            return b''
+        backend, self._backend = self._backend, None
+        return self._emit(backend.flush())
+
+    def _emit(self, data: bytes) -> bytes:
+        if data and self.output is not None:
+            self.output.write(data)
+        self.bytes_written += len(data)
+        return data
+
+def iter_mp3(pcm, bitrate=320, title='', artist='', album='', chunk_samples=INT16_BLOCK_SIZE):
+    """Encode PCM block by block, yielding MP3 bytes as soon as they exist."""
+    encoder = MP3StreamEncoder(None, bitrate, title, artist, album)
+    header = encoder.open()
+    if header:
+        yield header
+    pcm = as_pcm(pcm)
+    try:
+        for start in range(0, len(pcm), chunk_samples):
+            data = encoder.write(pcm[start:start + chunk_samples])
+            if data:
+                yield data
+    finally:
+        data = encoder.close()
+    if data:
+        yield data
+
+def encode_mp3(pcm, output_path, bitrate=320, title='', artist='', album=''):
+    with span('encode'):
+        return _encode_mp3(pcm, output_path, bitrate, title, artist, album)
+
+def _encode_mp3(pcm, output_path, bitrate, title, artist, album):
+    if streaming_available():
+        if isinstance(output_path, str):
+            with open(output_path, 'wb') as f:
+                return _encode_mp3(pcm, f, bitrate, title, artist, album)
+        with MP3StreamEncoder(output_path, bitrate, title, artist, album) as encoder:
+            encoder.write(pcm)
+        return True
     if not USE_NUMPY or not USE_PYDUB:
         print("NumPy or pydub not available, skipping MP3 encoding")
         return False
     # Convert to pydub
-    audio = np.array(pcm, dtype=np.float32)
-    audio = (audio * 32767).astype(np.int16)
+    audio = to_int16(pcm)
     seg = AudioSegment(
         audio.tobytes(),
         frame_rate=44100,
@@ -26,4 +190,4 @@ def encode_mp3(pcm: list, output_path: str, bitrate=320, title='', artist='', al
         channels=1
     )
     seg.export(output_path, format='mp3', bitrate=f'{bitrate}k', tags={'title': title, 'artist': artist, 'album': album})
-    return True
\ No newline at end of file
+    return True
@@ -1,6 +1,11 @@
 from typing import List
+import json
+import os
 import re
 
+MANIFEST_PATH = 'models/manifest.json'
+_manifest_cache = {}
+
 class LanguageModel:
     def __init__(self, locale, model_path, sample_rate=44100, tokenizer_path=''):
         self.locale = locale
@@ -29,4 +34,27 @@ def detect_language(text: str) -> str:
     elif re.search(r'\b(le|la|les|et|est|dans)\b', text, re.IGNORECASE):
         return 'fr-FR'
     else:
-        return 'en-US'
\ No newline at end of file
+        return 'en-US'
+
+def load_model_manifest(path=MANIFEST_PATH) -> dict:
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'r') as f:
+            cached = (mtime, json.load(f).get('models', {}))
+        _manifest_cache[path] = cached
+    return cached[1]
+
+def get_model_checksum(model_path: str) -> str:
+    entry = load_model_manifest().get(os.path.basename(model_path))
+    if entry and entry.get('checksum'):
+        return entry['checksum']
+    # Unlisted model: identify it by file version rather than hashing it
+    try:
+        st = os.stat(model_path)
+        return f"{os.path.abspath(model_path)}:{st.st_size}:{st.st_mtime_ns}"
+    except OSError:
+        return model_path
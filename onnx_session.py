@@ -11,12 +11,80 @@ try:
 except ImportError:
     USE_NUMPY = False
     np = None
+import hashlib
+import json
+import os
+from tokenizer import pad_batch
+from tracing import span, metrics
+
+# Names accepted for the enum-valued options in a session config file
+GRAPH_OPTIMIZATION_LEVELS = {'disabled': 'ORT_DISABLE_ALL', 'basic': 'ORT_ENABLE_BASIC',
+                             'extended': 'ORT_ENABLE_EXTENDED', 'all': 'ORT_ENABLE_ALL'}
+EXECUTION_MODES = {'sequential': 'ORT_SEQUENTIAL', 'parallel': 'ORT_PARALLEL'}
+# Not a SessionOptions attribute: where optimized graphs are cached
+OPTIMIZED_MODEL_DIR = 'optimized_model_dir'
+
+def build_session_options(options):
+    if not options or not USE_ONNX:
+        return None
+    so = ort.SessionOptions()
+    for name, value in options.items():
+        if name == OPTIMIZED_MODEL_DIR:
+            continue
+        if name == 'graph_optimization_level' and isinstance(value, str):
+            value = getattr(ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[value.lower()])
+        elif name == 'execution_mode' and isinstance(value, str):
+            value = getattr(ort.ExecutionMode, EXECUTION_MODES[value.lower()])
+        setattr(so, name, value)
+    return so
+
+def optimized_model_path(model_path, options) -> str:
+    """Cache file for the optimized graph of `model_path` under `options`.
+
+    The name changes with the model file, the options and the ONNX Runtime
+    version, so a stale graph is never loaded. Graphs optimized at the
+    'all' level can be specific to this machine's hardware, which is why
+    the cache lives on local disk rather than next to the shipped model.
+    """
+    st = os.stat(model_path)
+    settings = sorted((k, v) for k, v in options.items() if k != OPTIMIZED_MODEL_DIR)
+    key = json.dumps([os.path.abspath(model_path), st.st_size, st.st_mtime_ns,
+                      ort.__version__ if USE_ONNX else None, settings], default=str)
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(options[OPTIMIZED_MODEL_DIR], f"{stem}.{digest}.onnx")
+
+EMOTION_IDS = {'neutral': 0, 'happy': 1, 'sad': 2}
+
+def emotion_id(emotion: str) -> int:
+    return EMOTION_IDS.get(emotion, 3)
+
+class InferenceJob:
+    # One segment's worth of model input
+    def __init__(self, tokens, embedding, rate=1.0, pitch=0.0, volume=1.0, emotion='neutral', jitter=0.0, shimmer=0.0, emphasis=1.0, breath=False):
+        self.tokens = tokens
+        self.embedding = embedding
+        self.rate = rate
+        self.pitch = pitch
+        self.volume = volume
+        self.emotion = emotion
+        self.jitter = jitter
+        self.shimmer = shimmer
+        self.emphasis = emphasis
+        self.breath = breath
+
+# Input names through which a model can mask out batch padding
+TOKEN_LENGTHS_INPUT = 'token_lengths'
+TOKEN_MASK_INPUT = 'tokens_mask'
+# Optional output giving the number of valid samples in each batch row
+AUDIO_LENGTHS_OUTPUT = 'audio_lengths'
 
 class ONNXSession:
-    def __init__(self, model_path):
+    def __init__(self, model_path, session_options=None):
+        self.model_path = model_path
         if USE_ONNX:
             try:
-                self.session = ort.InferenceSession(model_path)
+                self.session = self._load(model_path, session_options)
                 self.input_names = [i.name for i in self.session.get_inputs()]
                 self.output_names = [o.name for o in self.session.get_outputs()]
             except Exception as e:
@@ -26,11 +94,113 @@ class ONNXSession:
             print("ONNX Runtime not available, using dummy implementation")
             self.session = None
 
+    @staticmethod
+    def _load(model_path, options):
+        so = build_session_options(options)
+        if not options or not options.get(OPTIMIZED_MODEL_DIR):
+            return ort.InferenceSession(model_path, sess_options=so)
+        cached = optimized_model_path(model_path, options)
+        if os.path.exists(cached):
+            # Already optimized; running the optimizers again would only cost time
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            return ort.InferenceSession(cached, sess_options=so)
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+        except OSError as e:
+            print(f"Cannot cache optimized model in {os.path.dirname(cached)}: {e}")
+            return ort.InferenceSession(model_path, sess_options=so)
+        # Written under a temporary name so a concurrent loader never sees half a file
+        tmp_path = f"{cached}.{os.getpid()}.tmp"
+        so.optimized_model_filepath = tmp_path
+        session = ort.InferenceSession(model_path, sess_options=so)
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, cached)
+        return session
+
     def run_inference(self, tokens, embedding, rate=1.0, pitch=0.0, volume=1.0, emotion='neutral', jitter=0.0, shimmer=0.0, emphasis=1.0, breath=False):
+        with span('inference'):
+            metrics.inc('tts_inference_batches_total')
+            metrics.inc('tts_inference_segments_total')
+            return self._run_inference(tokens, embedding, rate, pitch, volume, emotion, jitter, shimmer, emphasis, breath)
+
+    def _run_inference(self, tokens, embedding, rate, pitch, volume, emotion, jitter, shimmer, emphasis, breath):
         if self.session is None or not USE_NUMPY:
-            # Dummy
+            return self._dummy_inference(emphasis, jitter, shimmer, breath)
+
+        # Prepare inputs
+        inputs = {
+            'tokens': np.array([tokens], dtype=np.int64),
+            'speaker_embedding': np.asarray(embedding, dtype=np.float32)[np.newaxis, :],
+            'rate': np.array([rate], dtype=np.float32),
+            'pitch': np.array([pitch], dtype=np.float32),
+            'volume': np.array([volume], dtype=np.float32),
+            'emotion': np.array([emotion_id(emotion)], dtype=np.int64),
+            'emphasis': np.array([emphasis], dtype=np.float32)
+        }
+        self._add_length_inputs(inputs, np.array([len(tokens)], dtype=np.int64))
+
+        outputs = self.session.run(self.output_names, inputs)
+        return np.asarray(outputs[0][0], dtype=np.float32)
+
+    def _add_length_inputs(self, inputs, lengths):
+        # Models that take token lengths or a mask need them for every call, batched or not
+        if TOKEN_LENGTHS_INPUT in self.input_names:
+            inputs[TOKEN_LENGTHS_INPUT] = lengths
+        if TOKEN_MASK_INPUT in self.input_names:
+            inputs[TOKEN_MASK_INPUT] = np.arange(inputs['tokens'].shape[1])[np.newaxis, :] < lengths[:, np.newaxis]
+
+    def supports_batching(self) -> bool:
+        if self.session is None or not USE_NUMPY:
+            return True
+        return TOKEN_LENGTHS_INPUT in self.input_names or TOKEN_MASK_INPUT in self.input_names
+
+    def run_batch_inference(self, jobs):
+        """Run many segments through the model in one call.
+
+        Token sequences are right-padded with 0 and the padding is masked
+        through the model's token length or mask input. Models without either
+        input cannot ignore padding, so their jobs are run one at a time.
+        Rows are cut to the `audio_lengths` output when the model has one,
+        and otherwise in proportion to their token count.
+        """
+        if not jobs:
+            return []
+        if len(jobs) == 1 or not self.supports_batching():
+            return [self.run_inference(j.tokens, j.embedding, j.rate, j.pitch, j.volume, j.emotion, j.jitter, j.shimmer, j.emphasis, j.breath) for j in jobs]
+        with span('inference'):
+            metrics.inc('tts_inference_batches_total')
+            metrics.inc('tts_inference_segments_total', len(jobs))
+            return self._run_batch(jobs)
+
+    def _run_batch(self, jobs):
+        if self.session is None or not USE_NUMPY:
+            return [self._dummy_inference(j.emphasis, j.jitter, j.shimmer, j.breath) for j in jobs]
+
+        tokens, lengths = pad_batch([j.tokens for j in jobs])
+        inputs = {
+            'tokens': tokens,
+            'speaker_embedding': np.stack([np.asarray(j.embedding, dtype=np.float32) for j in jobs]),
+            'rate': np.array([j.rate for j in jobs], dtype=np.float32),
+            'pitch': np.array([j.pitch for j in jobs], dtype=np.float32),
+            'volume': np.array([j.volume for j in jobs], dtype=np.float32),
+            'emotion': np.array([emotion_id(j.emotion) for j in jobs], dtype=np.int64),
+            'emphasis': np.array([j.emphasis for j in jobs], dtype=np.float32)
+        }
+        self._add_length_inputs(inputs, lengths)
+
+        outputs = self.session.run(self.output_names, inputs)
+        audio = np.asarray(outputs[0], dtype=np.float32)
+        if AUDIO_LENGTHS_OUTPUT in self.output_names:
+            audio_lengths = outputs[self.output_names.index(AUDIO_LENGTHS_OUTPUT)]
+            return [audio[row, :int(audio_lengths[row])] for row in range(len(jobs))]
+        # No per-row lengths: audio scales with tokens, so cut the padding tail in proportion
+        frames = audio.shape[1]
+        return [audio[row, :int(round(frames * int(lengths[row]) / tokens.shape[1]))] for row in range(len(jobs))]
+
+    def _dummy_inference(self, emphasis=1.0, jitter=0.0, shimmer=0.0, breath=False, num_samples=44100):
+        if not USE_NUMPY:
             import random
-            audio = [random.gauss(0, 0.1) for _ in range(44100)]
+            audio = [random.gauss(0, 0.1) for _ in range(num_samples)]
             # Apply emphasis
             for i in range(len(audio)):
                 audio[i] *= emphasis
@@ -44,45 +214,49 @@ class ONNXSession:
                 if i > 0:
                     audio[i] += shimmer * (audio[i] - audio[i-1])
             return audio
-
-        # Prepare inputs
-        inputs = {
-            'tokens': np.array([tokens], dtype=np.int64),
-            'speaker_embedding': np.array([embedding], dtype=np.float32),
-            'rate': np.array([rate], dtype=np.float32),
-            'pitch': np.array([pitch], dtype=np.float32),
-            'volume': np.array([volume], dtype=np.float32),
-            'emotion': np.array([0 if emotion == 'neutral' else 1 if emotion == 'happy' else 2 if emotion == 'sad' else 3], dtype=np.int64),
-            'emphasis': np.array([emphasis], dtype=np.float32)
-        }
-
-        outputs = self.session.run(self.output_names, inputs)
-        audio = outputs[0][0].tolist()
+        rng = np.random.default_rng()
+        audio = rng.normal(0, 0.1, num_samples).astype(np.float32)
+        audio *= np.float32(emphasis)
+        if breath:
+            audio += rng.normal(0, 0.05, num_samples).astype(np.float32)
+        if jitter:
+            audio += np.float32(jitter) * (rng.random(num_samples, dtype=np.float32) - 0.5)
+        if shimmer:
+            audio[1:] += np.float32(shimmer) * np.diff(audio)
         return audio
 
-    def run_streaming_inference(self, tokens, embedding, callback, rate=1.0, pitch=0.0, volume=1.0):
-        chunk_size = 10
-        buffer = []
-        buffer_size = 1024
-        for i in range(0, len(tokens), chunk_size):
-            chunk = tokens[i:i+chunk_size]
-            pcm = self.run_inference(chunk, embedding, rate, pitch, volume)
-            buffer.extend(pcm)
-            while len(buffer) >= buffer_size:
-                chunk_pcm = buffer[:buffer_size]
-                callback(chunk_pcm)
-                buffer = buffer[buffer_size:]
-        if buffer:
-            callback(buffer)
+    def run_streaming_inference(self, chunks, callback, frame_size=1024, crossfade_ms=5.0, started_at=None):
+        """Synthesize `chunks` one by one and feed fixed-size frames to `callback`.
+
+        Each chunk is an InferenceJob (usually one prosodic phrase) or an int
+        number of silent samples. Returns the stream's StreamStats.
+        """
+        if not USE_NUMPY:
+            for chunk in chunks:
+                if isinstance(chunk, int):
+                    callback([0.0] * chunk)
+                else:
+                    callback(self.run_inference(chunk.tokens, chunk.embedding, chunk.rate, chunk.pitch, chunk.volume, chunk.emotion, chunk.jitter, chunk.shimmer, chunk.emphasis, chunk.breath))
+            return None
+        from streaming import StreamAssembler
+        assembler = StreamAssembler(callback, frame_size, crossfade_ms)
+        if started_at is not None:
+            assembler.stats.started_at = started_at
+        for chunk in chunks:
+            if isinstance(chunk, int):
+                assembler.push_silence(chunk)
+            else:
+                assembler.push(self.run_inference(chunk.tokens, chunk.embedding, chunk.rate, chunk.pitch, chunk.volume, chunk.emotion, chunk.jitter, chunk.shimmer, chunk.emphasis, chunk.breath))
+        return assembler.close()
 
     def run_extractor_inference(self, pcm):
         if self.session is None:
             # Dummy embedding
-            return np.random.randn(256).tolist()
+            return np.random.randn(256).astype(np.float32)
         # Assume extractor inputs
-        inputs = {'audio': np.array([pcm], dtype=np.float32)}
+        inputs = {'audio': np.asarray(pcm, dtype=np.float32)[np.newaxis, :]}
         outputs = self.session.run(self.output_names, inputs)
-        return outputs[0][0].tolist()
+        return np.asarray(outputs[0][0], dtype=np.float32)
 
     @staticmethod
     def validate_model_checksum(model_path):
@@ -1,5 +1,15 @@
+import json
 import math
+import os
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
 from typing import NamedTuple
+from audio_buffer import SAMPLE_RATE
+from loudness import LoudnessMeter
 
 class QualityReport(NamedTuple):
     has_clipping: bool
@@ -7,11 +17,178 @@ class QualityReport(NamedTuple):
     peak_level: float
     rms_level: float
 
-def analyze_audio_quality(audio: list) -> QualityReport:
-    if not audio:
+DEFAULT_WINDOW_SECONDS = 0.5
+# Full scale once quantized to 16 bits
+CLIP_LEVEL = 32767 / 32768
+SILENCE_DB = -60.0
+# Floor for dBFS values of digital silence, so reports stay numeric
+MIN_DBFS = -120.0
+
+# QA gates applied by check_report; None disables a gate
+DEFAULT_LIMITS = {
+    'max_clipped_samples': 0,
+    'max_silence_ratio': 0.5,
+    'max_dc_offset': 0.01,
+    'min_lufs': -26.0,
+    'max_lufs': -10.0,
+}
+
+def _dbfs(value: float) -> float:
+    return round(max(20 * math.log10(value), MIN_DBFS), 2) if value > 0 else MIN_DBFS
+
+class QualityAnalyzer:
+    """Single-pass quality metrics over PCM fed in chunks.
+
+    Keeps running totals plus one RMS and peak value per window, so it can
+    sit next to an encoder or a spill-file pass and see each sample once:
+
+        analyzer = QualityAnalyzer()
+        for block in blocks:
+            analyzer.add(block)
+        analyzer.report()
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, window_seconds=DEFAULT_WINDOW_SECONDS, silence_db=SILENCE_DB, clip_level=CLIP_LEVEL):
+        self.sample_rate = sample_rate
+        self.window_seconds = window_seconds
+        self.window = max(int(round(window_seconds * sample_rate)), 1)
+        self.silence_level = 10 ** (silence_db / 20)
+        self.clip_level = clip_level
+        self.meter = LoudnessMeter(sample_rate)
+        self.samples = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.peak = 0.0
+        self.clipped = 0
+        self.window_rms = []
+        self.window_peak = []
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def add(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        if not len(block):
+            return
+        block64 = block.astype(np.float64)
+        magnitude = np.abs(block)
+        self.samples += len(block)
+        self.sum += float(block64.sum())
+        self.sum_squares += float(np.dot(block64, block64))
+        self.peak = max(self.peak, float(magnitude.max()))
+        self.clipped += int(np.count_nonzero(magnitude >= self.clip_level))
+        self.meter.add(block)
+
+        if len(self._pending):
+            block = np.concatenate((self._pending, block))
+        complete = len(block) // self.window * self.window
+        if complete:
+            windows = block[:complete].reshape(-1, self.window).astype(np.float64)
+            self.window_rms.extend(np.sqrt(np.mean(np.square(windows), axis=1)).tolist())
+            self.window_peak.extend(np.abs(windows).max(axis=1).tolist())
+        self._pending = block[complete:]
+
+    def _windows(self):
+        # Complete windows plus the partial one still pending
+        rms, peak = list(self.window_rms), list(self.window_peak)
+        if len(self._pending):
+            tail = self._pending.astype(np.float64)
+            rms.append(math.sqrt(float(np.dot(tail, tail)) / len(tail)))
+            peak.append(float(np.abs(tail).max()))
+        return rms, peak
+
+    def report(self) -> dict:
+        rms_values, peak_values = self._windows()
+        rms = math.sqrt(self.sum_squares / self.samples) if self.samples else 0.0
+        silent = sum(1 for value in rms_values if value < self.silence_level)
+        lufs = self.meter.integrated()
+        return {
+            'sample_rate': self.sample_rate,
+            'samples': self.samples,
+            'duration': round(self.samples / self.sample_rate, 3),
+            'peak': round(self.peak, 6),
+            'peak_dbfs': _dbfs(self.peak),
+            'rms': round(rms, 6),
+            'rms_dbfs': _dbfs(rms),
+            'crest_factor_db': round(20 * math.log10(self.peak / rms), 2) if rms > 0 else 0.0,
+            'dc_offset': round(self.sum / self.samples, 6) if self.samples else 0.0,
+            'clipped_samples': self.clipped,
+            'silence_ratio': round(silent / len(rms_values), 4) if rms_values else 1.0,
+            'lufs': round(lufs, 2) if math.isfinite(lufs) else None,
+            'window_seconds': self.window_seconds,
+            'windows': {
+                'rms_dbfs': [_dbfs(value) for value in rms_values],
+                'peak_dbfs': [_dbfs(value) for value in peak_values],
+            },
+        }
+
+def check_report(report: dict, limits=None) -> list:
+    """QA gate failures of a report, as human-readable strings."""
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    issues = []
+    if limits['max_clipped_samples'] is not None and report['clipped_samples'] > limits['max_clipped_samples']:
+        issues.append(f"{report['clipped_samples']} clipped samples")
+    if limits['max_silence_ratio'] is not None and report['silence_ratio'] > limits['max_silence_ratio']:
+        issues.append(f"silence ratio {report['silence_ratio']:.0%}")
+    if limits['max_dc_offset'] is not None and abs(report['dc_offset']) > limits['max_dc_offset']:
+        issues.append(f"DC offset {report['dc_offset']:+.4f}")
+    lufs = report['lufs']
+    if lufs is None:
+        if limits['min_lufs'] is not None:
+            issues.append("silent output")
+    elif limits['min_lufs'] is not None and lufs < limits['min_lufs']:
+        issues.append(f"loudness {lufs:.1f} LUFS below {limits['min_lufs']:.1f}")
+    elif limits['max_lufs'] is not None and lufs > limits['max_lufs']:
+        issues.append(f"loudness {lufs:.1f} LUFS above {limits['max_lufs']:.1f}")
+    return issues
+
+def analyze_pcm(pcm, limits=None, sample_rate=SAMPLE_RATE, chunk=1 << 16) -> dict:
+    """Report for an in-memory buffer, with its QA gate results under 'issues'."""
+    analyzer = QualityAnalyzer(sample_rate)
+    for start in range(0, len(pcm), chunk):
+        analyzer.add(pcm[start:start + chunk])
+    report = analyzer.report()
+    report['issues'] = check_report(report, limits)
+    return report
+
+def quality_report_path(output_path: str) -> str:
+    return os.path.splitext(output_path)[0] + '.quality.json'
+
+def write_report(report: dict, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+def summarize_reports(reports: dict) -> dict:
+    """Batch summary of {file: report}: totals, loudness spread and failing files."""
+    loudness = [r['lufs'] for r in reports.values() if r['lufs'] is not None]
+    failed = {path: r['issues'] for path, r in reports.items() if r.get('issues')}
+    return {
+        'files': len(reports),
+        'passed': len(reports) - len(failed),
+        'failed': len(failed),
+        'audio_seconds': round(sum(r['duration'] for r in reports.values()), 3),
+        'clipped_samples': sum(r['clipped_samples'] for r in reports.values()),
+        'lufs': {
+            'min': min(loudness),
+            'max': max(loudness),
+            'mean': round(sum(loudness) / len(loudness), 2),
+        } if loudness else None,
+        'max_silence_ratio': max((r['silence_ratio'] for r in reports.values()), default=0.0),
+        'failures': failed,
+    }
+
+def analyze_audio_quality(audio) -> QualityReport:
+    if len(audio) == 0:
         return QualityReport(False, 0.0, 0.0, 0.0)
-    peak = max(abs(x) for x in audio)
-    rms = math.sqrt(sum(x**2 for x in audio) / len(audio))
+    if USE_NUMPY:
+        pcm = np.asarray(audio, dtype=np.float32)
+        peak = float(np.max(np.abs(pcm)))
+        rms = math.sqrt(float(np.dot(pcm, pcm)) / len(pcm))
+    else:
+        peak = 0.0
+        sum_squares = 0.0
+        for x in audio:
+            peak = max(peak, abs(x))
+            sum_squares += x * x
+        rms = math.sqrt(sum_squares / len(audio))
     snr = 20 * math.log10(peak / rms) if rms > 0 else 0
     clipping = peak >= 1.0
-    return QualityReport(clipping, snr, peak, rms)
\ No newline at end of file
+    return QualityReport(clipping, snr, peak, rms)
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from onnx_session import ONNXSession
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+SESSION_CONFIG_PATH = 'models/session_options.json'
+# path -> (mtime_ns, config)
+_config_cache = {}
+
+def load_session_config(path=SESSION_CONFIG_PATH) -> dict:
+    """Read the session options file: a "default" entry plus per-model entries.
+
+        {"default": {"graph_optimization_level": "all", "intra_op_num_threads": 4},
+         "models": {"tts_fr.onnx": {"execution_mode": "parallel"}}}
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    cached = _config_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cached = (mtime, json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error reading session config {path}: {e}")
+            cached = (mtime, {})
+        _config_cache[path] = cached
+    return cached[1]
+
+def session_options_for(model_path, config_path=SESSION_CONFIG_PATH, overrides=None):
+    """Session options for one model: config defaults, then the model's entry, then overrides."""
+    config = load_session_config(config_path)
+    options = dict(config.get('default', {}))
+    options.update(config.get('models', {}).get(os.path.basename(model_path), {}))
+    options.update(overrides or {})
+    return options or None
+
+class _PoolEntry:
+    def __init__(self, session, size_bytes):
+        self.session = session
+        self.size_bytes = size_bytes
+        self.last_used = time.monotonic()
+
+class SessionPool:
+    """Process-wide registry of ONNX sessions keyed by model path and options.
+
+    Each model is loaded once and shared between callers. When the estimated
+    size of the loaded models exceeds the memory budget, the least recently
+    used sessions are dropped from the pool.
+    """
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, default_options=None, config_path=SESSION_CONFIG_PATH):
+        self.memory_budget_mb = memory_budget_mb
+        # Used when a caller does not ask for specific session options;
+        # applied on top of the model's entry in the config file
+        self.default_options = default_options
+        self.config_path = config_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    @staticmethod
+    def make_key(model_path, session_options=None):
+        options = tuple(sorted((session_options or {}).items()))
+        return (os.path.abspath(model_path), options)
+
+    def get(self, model_path, session_options=None) -> ONNXSession:
+        if session_options is None:
+            session_options = session_options_for(model_path, self.config_path, self.default_options)
+        key = self.make_key(model_path, session_options)
+        with self._lock:
+            entry = self._touch(key)
+            if entry is not None:
+                return entry.session
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the pool lock so other models stay available, but
+        # serialize loads of the same model so it is only read once.
+        with load_lock:
+            with self._lock:
+                entry = self._touch(key)
+                if entry is not None:
+                    return entry.session
+            session = ONNXSession(model_path, session_options)
+            try:
+                size_bytes = os.path.getsize(model_path)
+            except OSError:
+                size_bytes = 0
+            with self._lock:
+                self._entries[key] = _PoolEntry(session, size_bytes)
+                self._load_locks.pop(key, None)
+                self._enforce_budget()
+            return session
+
+    def _touch(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+        return entry
+
+    def _enforce_budget(self):
+        budget = self.memory_budget_mb * 1024 * 1024
+        # Always keep the most recently used session, even if it alone is
+        # over budget, so the caller that just loaded it is not starved.
+        while len(self._entries) > 1 and self.memory_usage_bytes() > budget:
+            self._entries.popitem(last=False)
+
+    def memory_usage_bytes(self) -> int:
+        return sum(e.size_bytes for e in self._entries.values())
+
+    def evict_idle(self, max_idle_seconds: float) -> int:
+        cutoff = time.monotonic() - max_idle_seconds
+        with self._lock:
+            idle = [k for k, e in self._entries.items() if e.last_used <= cutoff]
+            for key in idle:
+                del self._entries[key]
+        return len(idle)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, model_path):
+        with self._lock:
+            path = os.path.abspath(model_path)
+            return any(key[0] == path for key in self._entries)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_pool() -> SessionPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool()
+        return _default_pool
+
+def get_session(model_path, session_options=None) -> ONNXSession:
+    return get_pool().get(model_path, session_options)
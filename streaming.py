@@ -0,0 +1,170 @@
+import re
+import time
+
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+from audio_buffer import SAMPLE_RATE, as_pcm
+from onnx_session import InferenceJob
+from tokenizer import tokenize
+
+DEFAULT_FRAME_SIZE = 1024
+DEFAULT_CROSSFADE_MS = 5.0
+# Short first phrase so the first audio is out before the sentence is done
+FIRST_PHRASE_MAX_WORDS = 6
+PHRASE_MAX_WORDS = 16
+
+_phrase_boundary = re.compile(r'(?<=[.!?;:,])\s+')
+
+def split_prosodic_phrases(text: str, first_max_words=FIRST_PHRASE_MAX_WORDS, max_words=PHRASE_MAX_WORDS):
+    """Split text at punctuation, then cap phrases at a word count."""
+    phrases = []
+    for phrase in _phrase_boundary.split(text.strip()):
+        words = phrase.split()
+        while words:
+            limit = first_max_words if not phrases else max_words
+            phrases.append(' '.join(words[:limit]))
+            words = words[limit:]
+    return phrases
+
+def iter_stream_chunks(segments, embedding, locale='en-US', rate=1.0, pitch=0.0, volume=1.0, emotion='neutral', jitter=0.0, shimmer=0.0):
+    """Yield one InferenceJob per prosodic phrase, or silent sample counts for breaks."""
+    for seg in segments:
+        if seg.break_time > 0:
+            yield int(seg.break_time * SAMPLE_RATE)
+            continue
+        # Segments with no words (whitespace between tags) have nothing to synthesize
+        for phrase in split_prosodic_phrases(seg.text):
+            yield InferenceJob(tokenize(phrase, locale), embedding, rate * seg.rate, pitch + seg.pitch, volume * seg.volume,
+                               emotion, jitter, shimmer, seg.emphasis, seg.breath)
+
+class RingBuffer:
+    """Fixed-capacity float32 FIFO; writes and reads never reallocate."""
+
+    def __init__(self, capacity: int):
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._start = 0
+        self._size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self._size
+
+    def __len__(self):
+        return self._size
+
+    def write(self, pcm) -> int:
+        n = min(len(pcm), self.free)
+        end = (self._start + self._size) % self.capacity
+        first = min(n, self.capacity - end)
+        self._data[end:end + first] = pcm[:first]
+        self._data[:n - first] = pcm[first:n]
+        self._size += n
+        return n
+
+    def read(self, out) -> int:
+        n = min(len(out), self._size)
+        first = min(n, self.capacity - self._start)
+        out[:first] = self._data[self._start:self._start + first]
+        out[first:n] = self._data[:n - first]
+        self._start = (self._start + n) % self.capacity
+        self._size -= n
+        return n
+
+class StreamStats:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.time_to_first_audio_ms = None
+        self.frames = 0
+        self.samples = 0
+        self.elapsed_ms = 0.0
+
+    @property
+    def audio_duration(self) -> float:
+        return self.samples / SAMPLE_RATE
+
+    @property
+    def real_time_factor(self) -> float:
+        return (self.elapsed_ms / 1000.0) / self.audio_duration if self.samples else 0.0
+
+class StreamAssembler:
+    """Joins synthesized chunks into fixed-size frames for a callback.
+
+    The last few milliseconds of each chunk are held back and crossfaded
+    with the start of the next one so chunk seams do not click. Frames
+    handed to the callback are only valid for the duration of the call.
+    """
+
+    def __init__(self, callback, frame_size=DEFAULT_FRAME_SIZE, crossfade_ms=DEFAULT_CROSSFADE_MS, sample_rate=SAMPLE_RATE):
+        self.callback = callback
+        self.frame_size = frame_size
+        self.crossfade = int(sample_rate * crossfade_ms / 1000.0)
+        self._ring = RingBuffer(4 * frame_size)
+        self._frame = np.empty(frame_size, dtype=np.float32)
+        self._tail = np.empty(self.crossfade, dtype=np.float32)
+        self._tail_len = 0
+        # Equal-power fade curves
+        t = (np.arange(self.crossfade, dtype=np.float32) + 0.5) / max(self.crossfade, 1)
+        self._fade_in = np.sin(t * np.pi / 2).astype(np.float32)
+        self._fade_out = np.cos(t * np.pi / 2).astype(np.float32)
+        self.stats = StreamStats()
+
+    def push(self, pcm, crossfade=True):
+        pcm = as_pcm(pcm)
+        n = self.crossfade
+        if crossfade and self._tail_len == n and n > 0 and len(pcm) >= 2 * n:
+            seam = pcm[:n] * self._fade_in
+            seam += self._tail * self._fade_out
+            self._write(seam)
+            pcm = pcm[n:]
+        else:
+            self._flush_tail()
+        if n > 0 and len(pcm) >= n:
+            self._write(pcm[:-n])
+            self._tail[:] = pcm[-n:]
+            self._tail_len = n
+        else:
+            self._write(pcm)
+
+    def push_silence(self, num_samples: int):
+        self._flush_tail()
+        zeros = np.zeros(min(num_samples, self.frame_size), dtype=np.float32)
+        remaining = num_samples
+        while remaining > 0:
+            self._write(zeros[:remaining])
+            remaining -= len(zeros)
+
+    def close(self) -> StreamStats:
+        self._flush_tail()
+        if len(self._ring):
+            n = self._ring.read(self._frame)
+            self._emit(self._frame[:n])
+        self.stats.elapsed_ms = (time.perf_counter() - self.stats.started_at) * 1000.0
+        return self.stats
+
+    def _flush_tail(self):
+        if self._tail_len:
+            self._write(self._tail[:self._tail_len])
+            self._tail_len = 0
+
+    def _write(self, pcm):
+        offset = 0
+        while offset < len(pcm):
+            offset += self._ring.write(pcm[offset:])
+            while len(self._ring) >= self.frame_size:
+                self._ring.read(self._frame)
+                self._emit(self._frame)
+
+    def _emit(self, frame):
+        if self.stats.time_to_first_audio_ms is None:
+            self.stats.time_to_first_audio_ms = (time.perf_counter() - self.stats.started_at) * 1000.0
+        self.stats.frames += 1
+        self.stats.samples += len(frame)
+        self.callback(frame)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+
+DEFAULT_CACHE_SIZE_MB = 512
+CACHE_KEY_VERSION = 2
+
+def embedding_checksum(embedding) -> str:
+    if USE_NUMPY:
+        data = np.ascontiguousarray(embedding, dtype=np.float32)
+    else:
+        from array import array
+        data = array('f', embedding).tobytes()
+    return hashlib.sha256(data).hexdigest()
+
+def segment_cache_key(locale: str, embedding_sum: str, model_sum: str, job, **effects) -> str:
+    """Content address of one segment's inference output.
+
+    `job` supplies the token ids and prosody parameters; the tokens already
+    reflect the locale's text processing, which can differ between locales
+    that share a model. `effects` holds anything else that changes the
+    rendered samples.
+    """
+    payload = {
+        'v': CACHE_KEY_VERSION,
+        'locale': locale,
+        'tokens': [int(token) for token in job.tokens],
+        'embedding': embedding_sum,
+        'model': model_sum,
+        'rate': job.rate,
+        'pitch': job.pitch,
+        'volume': job.volume,
+        'emotion': job.emotion,
+        'jitter': job.jitter,
+        'shimmer': job.shimmer,
+        'emphasis': job.emphasis,
+        'breath': job.breath,
+        'effects': effects,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'stores': self.stores,
+                'evictions': self.evictions, 'hit_rate': self.hit_rate}
+
+class SynthCache:
+    """On-disk, size-bounded LRU cache of per-segment inference output.
+
+    Entries are .npy files named by their content address and loaded
+    memory-mapped. Recency is kept in file mtimes, so LRU order survives
+    restarts. Processes may share a directory: a key missing from this
+    process's index is looked up on disk before it counts as a miss, but
+    each process bounds the size only of the entries it knows about.
+    """
+
+    def __init__(self, cache_dir: str, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.npy')
+
+    def _scan(self):
+        found = []
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.npy'):
+                    st = entry.stat()
+                    found.append((st.st_mtime_ns, entry.name[:-len('.npy')], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                # Written by another process since the directory was scanned
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    self.stats.misses += 1
+                    return None
+                self._entries[key] = size
+                self._size += size
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+        try:
+            pcm = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.stats.hits -= 1
+                self.stats.misses += 1
+            return None
+        return pcm
+
+    def put(self, key: str, pcm):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(pcm, dtype=np.float32))
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self.stats.stores += 1
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.stats.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    os.unlink(self._path(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._size = 0
@@ -1,19 +1,65 @@
 import pytest
 from text_normalizer import parse_and_normalize_text
 from tokenizer import tokenize
-from voice import list_voices, import_voice
+from voice import list_voices, import_voice, VoiceIndex
+from session_pool import SessionPool
+from embedding_loader import EmbeddingCache, morph_embeddings, EMBEDDING_DIM
+import advanced_audio
+from audio_postprocess import postprocess_audio
+from audio_buffer import PCMBuffer, to_int16
+from onnx_session import ONNXSession, InferenceJob
+from batching import BatchEntry, plan_batches, InferenceBatcher
+from engine import SynthesisEngine, SynthRequest
+import hashlib
+import json
 import os
 import tempfile
+import time
 
 def test_parse_and_normalize_text():
     segments = parse_and_normalize_text("Hello world!")
     assert len(segments) == 1
     assert segments[0].text == "Hello world!"
 
+def test_ssml_parser_handles_nested_tags_lazily():
+    from text_normalizer import iter_segments
+    segments = iter_segments('Hi <prosody rate="1.5" pitch="2"><emphasis level="strong">loud</emphasis> fast</prosody>'
+                             '<break time="250ms"/><breath/> <unknown>done</unknown>')
+    first = next(segments)
+    assert first.text == 'Hi '
+    rest = [(seg.text, seg.rate, seg.pitch, seg.emphasis, seg.break_time, seg.breath) for seg in segments]
+    assert rest == [('loud', 1.5, 2.0, 1.5, 0.0, False), (' fast', 1.5, 2.0, 1.0, 0.0, False),
+                    ('', 1.0, 0.0, 1.0, 0.25, False), ('', 1.0, 0.0, 1.0, 0.0, True), ('done', 1.0, 0.0, 1.0, 0.0, False)]
+    assert len(parse_and_normalize_text('')) == 1
+
+def test_ssml_parser_strips_malformed_markup():
+    texts = [seg.text for seg in parse_and_normalize_text('One <foo/> two </s> three <prosody rate="1.2')]
+    assert not any('<' in text or '>' in text for text in texts)
+    assert ' '.join(' '.join(texts).split()) == 'One two three'
+
+def test_ssml_parser_is_linear_in_unterminated_tags():
+    start = time.perf_counter()
+    segments = parse_and_normalize_text('<prosody rate="' * 4000 + ' <break time="1s"/>')
+    assert time.perf_counter() - start < 1.0
+    assert segments[-1].break_time == 1.0
+
 def test_tokenize():
     tokens = tokenize("Hello world", "en-US")
     assert isinstance(tokens, list)
 
+def test_tokenizer_memoizes_words_and_pads_batches():
+    np = pytest.importorskip("numpy")
+    from tokenizer import Tokenizer, grapheme_to_phoneme
+    assert grapheme_to_phoneme('Chthonic') == ['tʃ', 'θ', 'o', 'n', 'i', 'c']
+    tokenizer = Tokenizer.from_file('models/tokenizer_en.json', 'en-US')
+    assert tokenizer.encode('A cat, a hat') == tokenize('A cat, a hat', 'en-US')
+    assert tokenizer.word_ids.cache_info().hits == 1
+    ids, lengths = tokenizer.tokenize_batch(['I am', 'a', ''])
+    assert ids.dtype == np.int64 and ids.shape == (3, 3)
+    assert lengths.tolist() == [3, 1, 0]
+    assert ids[0].tolist() == tokenize('I am') and ids[1].tolist() == [2, 0, 0]
+    assert Tokenizer('es-ES').encode('el perro') == [1, 0]
+
 def test_list_voices():
     voices = list_voices()
     assert isinstance(voices, list)
@@ -39,5 +85,749 @@ def test_import_voice():
         if os.path.exists('voices/test_voice_sample.mp3'):
             os.unlink('voices/test_voice_sample.mp3')
 
+def test_session_pool_reuses_sessions():
+    pool = SessionPool()
+    s1 = pool.get('models/tts.onnx')
+    s2 = pool.get('models/tts.onnx')
+    assert s1 is s2
+    s3 = pool.get('models/tts.onnx', {'intra_op_num_threads': 1})
+    assert s3 is not s1
+    assert len(pool) == 2
+
+def test_session_pool_evicts_over_budget():
+    pool = SessionPool(memory_budget_mb=0)
+    pool.get('models/tts.onnx')
+    pool.get('models/tts_es.onnx')
+    assert len(pool) == 1
+    assert 'models/tts_es.onnx' in pool
+    assert pool.evict_idle(0) == 1
+
+def test_session_config_and_warm_up(tmp_path):
+    from session_pool import session_options_for
+    from warmup import warm_up, manifest_model_paths
+    config = tmp_path / 'session_options.json'
+    config.write_text(json.dumps({'default': {'intra_op_num_threads': 2, 'graph_optimization_level': 'all'},
+                                  'models': {'tts_fr.onnx': {'intra_op_num_threads': 1}}}))
+    assert session_options_for('models/tts.onnx', str(config)) == {'intra_op_num_threads': 2, 'graph_optimization_level': 'all'}
+    assert session_options_for('models/tts_fr.onnx', str(config))['intra_op_num_threads'] == 1
+    assert session_options_for('models/tts_fr.onnx', str(config), {'intra_op_num_threads': 4})['intra_op_num_threads'] == 4
+    assert session_options_for('models/tts.onnx', str(tmp_path / 'missing.json')) is None
+
+    paths = manifest_model_paths()
+    # Listed in the manifest but not shipped
+    assert 'models/tts_en.onnx' not in paths
+    pool = SessionPool(config_path=str(config))
+    timings = warm_up(paths, token_lengths=(4,), batch_size=2, pool=pool, log=None)
+    assert set(timings) == set(paths)
+    assert all(path in pool for path in paths)
+
+def test_embedding_cache_maps_once_per_version():
+    np = pytest.importorskip("numpy")
+    cache = EmbeddingCache()
+    emb = cache.get('narrator')
+    assert isinstance(emb, np.ndarray)
+    assert emb.dtype == np.float32
+    assert cache.get('narrator') is emb
+    morphed = cache.get_morphed('narrator', 'narrator', 0.25)
+    assert cache.get_morphed('narrator', 'narrator', 0.25) is morphed
+    assert np.allclose(morphed, morph_embeddings(emb, emb, 0.25))
+
+def test_embedding_cache_revalidates_on_metadata_change():
+    np = pytest.importorskip("numpy")
+    with tempfile.TemporaryDirectory() as voices_dir:
+        emb = np.arange(EMBEDDING_DIM, dtype=np.float32)
+        emb.tofile(os.path.join(voices_dir, 'alice.bin'))
+        meta_path = os.path.join(voices_dir, 'alice.json')
+        def write_meta(checksum, mtime):
+            with open(meta_path, 'w') as f:
+                json.dump({'name': 'alice', 'checksum': checksum}, f)
+            os.utime(meta_path, (mtime, mtime))
+        write_meta(hashlib.sha256(emb).hexdigest(), 1000)
+        cache = EmbeddingCache(voices_dir)
+        assert np.array_equal(cache.get('alice'), emb)
+        write_meta('0' * 64, 2000)
+        with pytest.raises(RuntimeError, match='Checksum mismatch'):
+            cache.get('alice')
+        open(os.path.join(voices_dir, 'alice.bin'), 'w').close()
+        with pytest.raises(RuntimeError, match='empty'):
+            cache.get('alice')
+
+def test_voice_index_refreshes_changed_files():
+    import json
+    with tempfile.TemporaryDirectory() as voices_dir:
+        def write_voice(name, locale, gender, **extra):
+            with open(os.path.join(voices_dir, f'{name}.json'), 'w') as f:
+                json.dump(dict(name=name, locale=locale, gender=gender, **extra), f)
+        write_voice('alice', 'en-US', 'female')
+        write_voice('pablo', 'es-ES', 'male')
+        index_path = os.path.join(voices_dir, '.index.json')
+        index = VoiceIndex(voices_dir, index_path, ttl=0)
+        assert index.get('alice').locale == 'en-US'
+        assert [v.name for v in index.find(locale='es-ES')] == ['pablo']
+        assert [v.name for v in index.find(gender='female')] == ['alice']
+        write_voice('alice', 'en-GB', 'female', description='British narrator')
+        os.unlink(os.path.join(voices_dir, 'pablo.json'))
+        assert index.get('alice').locale == 'en-GB'
+        assert index.get('pablo') is None
+        assert os.path.exists(index_path)
+        reloaded = VoiceIndex(voices_dir, index_path, ttl=60)
+        assert [v.name for v in reloaded.all()] == ['alice']
+        # Writing the index inside voices_dir must not defeat the ttl throttle
+        write_voice('pablo', 'es-ES', 'male')
+        assert [v.name for v in reloaded.all()] == ['alice', 'pablo']
+        write_voice('pablo', 'es-MX', 'male')
+        assert reloaded.get('pablo').locale == 'es-ES'
+
+def _dsp_test_signal(n=20000):
+    import random
+    rng = random.Random(1234)
+    # Silence, quiet noise and loud bursts so every branch of each stage is hit
+    audio = [0.0] * 500 + [rng.gauss(0, 0.0005) for _ in range(1000)]
+    audio += [rng.gauss(0, 0.3) for _ in range(n)] + [0.0] * 500
+    return audio
+
+@pytest.mark.parametrize('stage', [
+    lambda a: advanced_audio.apply_noise_gate(a),
+    lambda a: advanced_audio.apply_noise_gate(a, threshold=-30.0, ratio=4.0),
+    lambda a: advanced_audio.apply_compressor(a),
+    lambda a: advanced_audio.apply_compressor(a, threshold=-10.0, ratio=8.0),
+    lambda a: advanced_audio.apply_limiter(a),
+    lambda a: advanced_audio.apply_limiter(a, threshold=-1.0),
+])
+def test_vectorized_dsp_matches_reference_loops(stage):
+    np = pytest.importorskip("numpy")
+    reference = _dsp_test_signal()
+    vectorized = np.array(reference, dtype=np.float32)
+    stage(reference)
+    stage(vectorized)
+    assert np.allclose(vectorized, reference, atol=1e-6)
+
+def test_vectorized_trim_silence_matches_reference():
+    np = pytest.importorskip("numpy")
+    reference = _dsp_test_signal()
+    trimmed = advanced_audio.trim_silence(np.array(reference, dtype=np.float32))
+    expected = advanced_audio.trim_silence(reference)
+    assert len(trimmed) == len(expected)
+    assert np.allclose(trimmed, expected, atol=1e-6)
+    silent = np.zeros(100, dtype=np.float32)
+    assert len(advanced_audio.trim_silence(silent)) == len(advanced_audio.trim_silence([0.0] * 100))
+
+def test_vectorized_dithering_stays_within_lsb():
+    np = pytest.importorskip("numpy")
+    audio = np.zeros(10000, dtype=np.float32)
+    advanced_audio.apply_dithering(audio, 8)
+    assert np.all(np.abs(audio) <= 0.5 / 256)
+    assert audio.std() > 0
+
+def test_postprocess_chain_matches_reference_loops():
+    np = pytest.importorskip("numpy")
+    audio = _dsp_test_signal()
+    reference = advanced_audio.trim_silence(list(audio))
+    peak = max(abs(x) for x in reference)
+    reference = [x / peak for x in reference]
+    advanced_audio.apply_noise_gate(reference)
+    advanced_audio.apply_compressor(reference)
+    from loudness import integrated_loudness
+    gain = 10 ** ((-16.0 - integrated_loudness(np.array(reference))) / 20)
+    reference = [x * gain for x in reference]
+    advanced_audio.apply_limiter(reference)
+
+    # Small blocks so the block-wise processors cross many block boundaries
+    block_size, advanced_audio.BLOCK_SIZE = advanced_audio.BLOCK_SIZE, 1000
+    try:
+        processed = postprocess_audio(audio, dither_bits=24)
+    finally:
+        advanced_audio.BLOCK_SIZE = block_size
+    assert isinstance(processed, np.ndarray)
+    assert processed.dtype == np.float32
+    assert np.allclose(processed, reference, atol=1e-5)
+    assert np.allclose(audio, reference, atol=1e-5)
+
+def test_loudness_meter_follows_bs1770():
+    np = pytest.importorskip("numpy")
+    from loudness import LoudnessMeter, integrated_loudness, StreamingNormalizer
+    # A 997 Hz sine at -20 dBFS reads -23.01 LUFS at any sample rate
+    for rate in (44100, 48000):
+        sine = (0.1 * np.sin(2 * np.pi * 997 * np.arange(rate * 3) / rate)).astype(np.float32)
+        assert integrated_loudness(sine, rate) == pytest.approx(-23.01, abs=0.02)
+    # One rate throughout: the 48 kHz sine from the last iteration
+    meter = LoudnessMeter(rate)
+    for start in range(0, len(sine), 1000):
+        meter.add(sine[start:start + 1000])
+    assert meter.integrated() == pytest.approx(integrated_loudness(sine, rate), abs=1e-6)
+    # Quiet passages fall under the relative gate instead of pulling the level down
+    quiet = np.concatenate((sine, sine * np.float32(0.001)))
+    assert integrated_loudness(quiet, rate) == pytest.approx(-23.01, abs=0.5)
+    assert integrated_loudness(np.zeros(rate, dtype=np.float32), rate) == float('-inf')
+
+    normalizer = StreamingNormalizer(-16.0, rate)
+    streamed = np.concatenate([normalizer.process(sine[i:i + 4096].copy()) for i in range(0, len(sine), 4096)])
+    assert integrated_loudness(streamed[-rate:], rate) == pytest.approx(-16.0, abs=0.1)
+
+def test_eq_presets_filter_block_wise():
+    np = pytest.importorskip("numpy")
+    from audio_postprocess import eq_filter, apply_eq_preset, preset_sos
+    from engine import eq_preset_for
+    rate = 44100
+    t = np.arange(rate) / rate
+    # The narration preset lifts 300 Hz by 2 dB and leaves 5 kHz alone
+    for freq, gain_db in ((300.0, 2.0), (5000.0, 0.0)):
+        tone = np.sin(2 * np.pi * freq * t).astype(np.float32)
+        apply_eq_preset(tone, 'narration')
+        assert 20 * np.log10(np.abs(tone[rate // 2:]).max()) == pytest.approx(gain_db, abs=0.1)
+    assert preset_sos('narration', rate) is preset_sos('narration', rate)
+    assert eq_filter('neutral') is None
+
+    signal = np.array(_dsp_test_signal(), dtype=np.float32)
+    whole = signal.copy()
+    apply_eq_preset(whole, 'podcast')
+    eq = eq_filter('podcast')
+    blocks = [eq.process(signal[i:i + 999].copy()) for i in range(0, len(signal), 999)]
+    assert np.allclose(np.concatenate(blocks), whole, atol=1e-6)
+    reference = _dsp_test_signal()
+    advanced_audio.apply_3band_eq(reference, 3.0, -2.0, 1.5)
+    vectorized = np.array(_dsp_test_signal(), dtype=np.float32)
+    advanced_audio.apply_3band_eq(vectorized, 3.0, -2.0, 1.5)
+    assert np.allclose(vectorized, reference, atol=1e-5)
+
+    assert eq_preset_for(SynthRequest(voice='narrator', eq_preset='podcast')) == 'podcast'
+    assert eq_preset_for(SynthRequest(voice='narrator')) == 'neutral'
+    assert eq_preset_for(SynthRequest(voice='nobody')) == 'neutral'
+    # Falls back to the voice's own preset
+    import voice
+    with tempfile.TemporaryDirectory() as voices_dir:
+        with open(os.path.join(voices_dir, 'host.json'), 'w') as f:
+            json.dump({'name': 'host', 'eq_preset': 'podcast'}, f)
+        index = VoiceIndex(voices_dir, os.path.join(voices_dir, '.index.json'))
+        original, voice.get_voice_index = voice.get_voice_index, lambda voices_dir='voices/': index
+        try:
+            assert eq_preset_for(SynthRequest(voice='host')) == 'podcast'
+        finally:
+            voice.get_voice_index = original
+
+def test_quality_analyzer_single_pass_windows():
+    np = pytest.importorskip("numpy")
+    from quality_metrics import QualityAnalyzer, analyze_pcm, analyze_audio_quality, summarize_reports
+    rate = 44100
+    tone = (0.5 * np.sin(2 * np.pi * 440 * np.arange(rate) / rate)).astype(np.float32)
+    pcm = np.concatenate((tone, np.zeros(rate, np.float32), tone + np.float32(0.02)))
+    pcm[100:103] = 1.0
+    analyzer = QualityAnalyzer(window_seconds=0.5)
+    for start in range(0, len(pcm), 3333):
+        analyzer.add(pcm[start:start + 3333])
+    report = analyzer.report()
+    whole = analyze_pcm(pcm)
+    assert report['lufs'] == whole['lufs'] and report['windows'] == whole['windows']
+    assert len(report['windows']['rms_dbfs']) == 6
+    assert report['silence_ratio'] == pytest.approx(2 / 6, abs=1e-4)
+    assert report['clipped_samples'] == 3
+    assert report['dc_offset'] == pytest.approx(0.02 / 3, abs=1e-4)
+    assert any('clipped' in issue for issue in whole['issues'])
+    assert analyze_audio_quality(pcm).peak_level == pytest.approx(report['peak'])
+
+    summary = summarize_reports({'a.mp3': whole, 'b.mp3': analyze_pcm(tone * np.float32(0.2))})
+    assert summary['files'] == 2 and summary['failed'] == 1 and list(summary['failures']) == ['a.mp3']
+
+def test_pcm_buffer_grows_without_python_lists():
+    np = pytest.importorskip("numpy")
+    buf = PCMBuffer(capacity=4)
+    buf.append(np.ones(3, dtype=np.float32))
+    buf.append_silence(5)
+    buf.append(np.full(2, 0.5, dtype=np.float32))
+    assert len(buf) == 10
+    samples = buf.samples
+    assert isinstance(samples, np.ndarray) and samples.dtype == np.float32
+    assert samples.tolist() == [1.0] * 3 + [0.0] * 5 + [0.5] * 2
+    processed = postprocess_audio(samples, trim_silence_flag=False)
+    assert processed is not None and processed.dtype == np.float32
+    assert to_int16(np.array([2.0, -2.0, 0.5], dtype=np.float32)).tolist() == [32767, -32768, 16383]
+
+def test_plan_batches_groups_by_voice_and_prosody():
+    entries = [
+        BatchEntry('models/tts.onnx', 'narrator', InferenceJob([1, 2, 3], None)),
+        BatchEntry('models/tts.onnx', 'narrator', InferenceJob([1], None, rate=1.2)),
+        BatchEntry('models/tts.onnx', 'narrator', InferenceJob([1], None)),
+        BatchEntry('models/tts_es.onnx', 'narrator', InferenceJob([1], None)),
+    ]
+    batches = sorted(plan_batches(entries))
+    assert batches == [[1], [2, 0], [3]]
+    assert len(plan_batches(entries[:1] * 5, max_batch_size=2)) == 3
+
+def test_batch_inference_pads_masks_and_splits():
+    np = pytest.importorskip("numpy")
+    class FakeModel:
+        def run(self, output_names, inputs):
+            self.inputs = inputs
+            lengths = inputs['token_lengths']
+            audio = np.repeat(inputs['tokens'].astype(np.float32), 10, axis=1)
+            return [audio, lengths * 10]
+    session = ONNXSession.__new__(ONNXSession)
+    session.session = FakeModel()
+    session.input_names = ['tokens', 'token_lengths']
+    session.output_names = ['audio', 'audio_lengths']
+    emb = np.zeros(4, dtype=np.float32)
+    outputs = session.run_batch_inference([InferenceJob([5, 6], emb), InferenceJob([7, 8, 9], emb, rate=0.5)])
+    assert session.session.inputs['tokens'].tolist() == [[5, 6, 0], [7, 8, 9]]
+    assert session.session.inputs['rate'].tolist() == [1.0, 0.5]
+    assert [len(pcm) for pcm in outputs] == [20, 30]
+    # Single jobs get the length input too
+    session.run_batch_inference([InferenceJob([5, 6], emb)])
+    assert session.session.inputs['token_lengths'].tolist() == [2]
+    # Without an audio_lengths output, each row loses its share of the padding
+    session.output_names = ['audio']
+    session.session.run = lambda names, inputs: FakeModel.run(session.session, names, inputs)[:1]
+    outputs = session.run_batch_inference([InferenceJob([5, 6], emb), InferenceJob([7, 8, 9], emb)])
+    assert [len(pcm) for pcm in outputs] == [20, 30]
+
+def test_inference_batcher_coalesces_concurrent_requests():
+    pytest.importorskip("numpy")
+    import threading
+    from tracing import metrics
+    batcher = InferenceBatcher(max_wait_ms=50)
+    batches_before = metrics.value('tts_inference_batches_total') or 0
+    results = []
+    def request():
+        entry = BatchEntry('models/tts.onnx', 'narrator', InferenceJob([1, 2], [0.5]))
+        results.extend(batcher.run([entry]))
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.stop()
+    assert len(results) == 4
+    assert all(len(pcm) == 44100 for pcm in results)
+    # Coalesced: fewer model calls than requests
+    assert (metrics.value('tts_inference_batches_total') or 0) - batches_before < 4
+
+def test_split_prosodic_phrases():
+    from streaming import split_prosodic_phrases
+    phrases = split_prosodic_phrases("One two three four five six seven, eight nine. Ten!", first_max_words=4)
+    assert phrases == ["One two three four", "five six seven,", "eight nine.", "Ten!"]
+    from streaming import iter_stream_chunks
+    from text_normalizer import TextSegment
+    chunks = list(iter_stream_chunks([TextSegment('  '), TextSegment('', break_time=0.5), TextSegment('Hi.')], None))
+    assert chunks[0] == 22050 and len(chunks) == 2 and chunks[1].tokens
+
+def test_ring_buffer_wraps_around():
+    np = pytest.importorskip("numpy")
+    from streaming import RingBuffer
+    ring = RingBuffer(4)
+    out = np.zeros(4, dtype=np.float32)
+    assert ring.write(np.array([1, 2, 3], dtype=np.float32)) == 3
+    assert ring.read(out[:2]) == 2
+    assert ring.write(np.array([4, 5, 6, 7], dtype=np.float32)) == 3
+    assert ring.read(out) == 4
+    assert out.tolist() == [3, 4, 5, 6]
+
+def test_stream_assembler_crossfades_and_frames():
+    np = pytest.importorskip("numpy")
+    from streaming import StreamAssembler
+    frames = []
+    assembler = StreamAssembler(lambda f: frames.append(f.copy()), frame_size=100, crossfade_ms=1.0)
+    fade = assembler.crossfade
+    assembler.push(np.ones(500, dtype=np.float32))
+    assembler.push(np.ones(500, dtype=np.float32))
+    assembler.push_silence(50)
+    stats = assembler.close()
+    audio = np.concatenate(frames)
+    assert len(audio) == 1000 - fade + 50
+    assert all(len(f) == 100 for f in frames[:-1])
+    # Equal-power fade of two identical signals never drops below -3 dB
+    assert audio[:1000 - fade].min() > 0.7
+    assert stats.time_to_first_audio_ms is not None
+    assert stats.samples == len(audio)
+
+def test_synth_request_from_json():
+    req = SynthRequest.from_dict({'text': 'Hi', 'normalize-lufs': '-14', 'rate': 1.5})
+    assert req.normalize_lufs == -14.0
+    assert req.rate == 1.5
+    assert req.voice == 'narrator'
+    with pytest.raises(ValueError):
+        SynthRequest.from_dict({'text': 'Hi', 'speed': 2})
+    with pytest.raises(ValueError):
+        SynthRequest.from_dict({'text': 'Hi', 'rate': 'fast'})
+
+def test_client_requests_only_name_dictionaries_in_dict_dir():
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'names.txt'), 'w') as f:
+            f.write('GIF jif\n')
+        with pytest.raises(ValueError):
+            SynthRequest.from_client({'text': 'Hi', 'dict': os.path.join(tmp, 'names.txt')})
+        for name in (os.path.join(tmp, 'names.txt'), '../names.txt', 'missing.txt', '..'):
+            with pytest.raises(ValueError):
+                SynthRequest.from_client({'text': 'Hi', 'dict': name}, tmp)
+        req = SynthRequest.from_client({'text': 'Hi', 'dict': 'names.txt'}, tmp)
+        assert req.dict == os.path.join(os.path.realpath(tmp), 'names.txt')
+        assert SynthRequest.from_client({'text': 'Hi'}).dict is None
+
+def test_engine_renders_concurrent_requests_independently():
+    pytest.importorskip("numpy")
+    engine = SynthesisEngine(max_workers=2)
+    try:
+        short = engine.submit(SynthRequest(text='Hello', locale='en-US'))
+        longer = engine.submit(SynthRequest(text='Hello <break time="1s"/> world', locale='en-US'))
+        assert longer.result().duration > short.result().duration
+    finally:
+        engine.close()
+
+def test_http_synth_rejects_bad_parameters():
+    pytest.importorskip("flask")
+    import http_server
+    client = http_server.app.test_client()
+    assert client.post('/synth', json={'text': 'Hi', 'speed': 2}).status_code == 400
+    assert client.post('/synth', json={'voice': 'narrator'}).status_code == 400
+    assert client.get('/status').get_json()['status'] == 'running'
+    assert b'# TYPE tts_stage_duration_seconds histogram' in client.get('/metrics').data
+
+def test_async_scheduler_batches_and_applies_backpressure():
+    pytest.importorskip("numpy")
+    import asyncio
+    from async_server import MicroBatchScheduler, QueueFullError, DeadlineExceededError
+
+    class Engine(SynthesisEngine):
+        def encode(self, result, request):
+            return str(len(result.pcm)).encode()
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        scheduler = MicroBatchScheduler(Engine(), queue_size=2, batch_window_ms=20, workers=2)
+        deadline = loop.time() + 10
+        requests = [SynthRequest(text=f'Line {i}', locale='en-US') for i in range(3)]
+        waiting = [loop.create_task(scheduler.submit(r, deadline)) for r in requests[:2]]
+        await asyncio.sleep(0.1)
+        with pytest.raises(QueueFullError):
+            await scheduler.submit(requests[2], deadline)
+        with pytest.raises(DeadlineExceededError):
+            await scheduler.submit(SynthRequest(text='Late', locale='en-US'), loop.time())
+        scheduler.start()
+        results = await asyncio.gather(*waiting)
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(results) == 2 and all(int(r) > 0 for r in results)
+
+    class SlowEngine(Engine):
+        def prepare(self, request):
+            time.sleep(0.3)
+            return super().prepare(request)
+
+    async def slow_prepare():
+        loop = asyncio.get_running_loop()
+        scheduler = MicroBatchScheduler(SlowEngine(), queue_size=1, workers=1)
+        first = loop.create_task(scheduler.submit(SynthRequest(text='Slow', locale='en-US'), loop.time() + 0.05))
+        await asyncio.sleep(0)
+        # Still preparing, but already counted against the bound
+        assert scheduler.in_flight == 1
+        with pytest.raises(QueueFullError):
+            await scheduler.submit(SynthRequest(text='Next', locale='en-US'), loop.time() + 10)
+        started = loop.time()
+        with pytest.raises(DeadlineExceededError):
+            await first
+        assert loop.time() - started < 0.2 and scheduler.in_flight == 0
+        await scheduler.stop()
+
+    asyncio.run(slow_prepare())
+
+def test_async_server_filters_voices():
+    import asyncio
+    from async_server import AsyncHTTPServer
+
+    async def get(target):
+        reader = asyncio.StreamReader()
+        reader.feed_data(f'GET {target} HTTP/1.1\r\nHost: x\r\n\r\n'.encode('latin-1'))
+        reader.feed_eof()
+        status, _, body = await AsyncHTTPServer(None)._respond(reader)
+        return status, [v['name'] for v in json.loads(body)]
+
+    assert asyncio.run(get('/voices?locale=en-US')) == (200, ['narrator'])
+    assert asyncio.run(get('/voices?locale=fr-FR')) == (200, [])
+
+def test_plan_batch_skips_up_to_date_outputs():
+    from batch_render import plan_batch
+    with tempfile.TemporaryDirectory() as input_dir, tempfile.TemporaryDirectory() as out_dir:
+        for name in ('a.txt', 'b.txt', 'notes.md'):
+            with open(os.path.join(input_dir, name), 'w') as f:
+                f.write('Hello')
+        with open(os.path.join(out_dir, 'a.mp3'), 'wb') as f:
+            f.write(b'ID3')
+        todo, skipped = plan_batch(input_dir, out_dir)
+        assert [os.path.basename(i) for i, _ in todo] == ['b.txt']
+        assert [os.path.basename(o) for _, o in skipped] == ['a.mp3']
+        os.utime(os.path.join(out_dir, 'a.mp3'), (0, 0))
+        todo, skipped = plan_batch(input_dir, out_dir)
+        assert len(todo) == 2 and not skipped
+        todo, skipped = plan_batch(input_dir, out_dir, force=True)
+        assert len(todo) == 2
+
+def test_load_quality_reports_requeues_missing_reports():
+    from batch_render import load_quality_reports
+    from quality_metrics import quality_report_path, write_report
+    with tempfile.TemporaryDirectory() as out_dir:
+        pairs = []
+        for name in ('a', 'b'):
+            output_path = os.path.join(out_dir, name + '.mp3')
+            with open(output_path, 'wb') as f:
+                f.write(b'ID3')
+            pairs.append((name + '.txt', output_path))
+        write_report({'issues': []}, quality_report_path(pairs[0][1]))
+        reports, missing = load_quality_reports(pairs)
+        assert reports == {pairs[0][1]: {'issues': []}}
+        assert missing == [pairs[1]]
+
+def test_synth_cache_lru_and_stats():
+    np = pytest.importorskip("numpy")
+    from synth_cache import SynthCache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = SynthCache(cache_dir, max_size_mb=0.01)
+        pcm = np.arange(1000, dtype=np.float32)
+        cache.put('aa' * 32, pcm)
+        assert np.array_equal(cache.get('aa' * 32), pcm)
+        assert cache.get('bb' * 32) is None
+        cache.put('bb' * 32, pcm)
+        cache.put('cc' * 32, pcm)
+        assert cache.get('aa' * 32) is None
+        assert cache.stats.hits == 1 and cache.stats.evictions == 1
+        reopened = SynthCache(cache_dir, max_size_mb=0.01)
+        assert len(reopened) == 2
+        # Entries another process writes later are found on disk
+        cache.put('dd' * 32, pcm)
+        assert np.array_equal(reopened.get('dd' * 32), pcm) and len(reopened) == 3
+
+def test_synth_cache_dir_does_not_leak_into_shared_engine():
+    pytest.importorskip("numpy")
+    from cli import synth_command
+    from engine import get_engine
+    with tempfile.TemporaryDirectory() as tmp:
+        synth_command(['--text', 'Hello', '--out', os.path.join(tmp, 'out.mp3'), '--locale', 'en-US',
+                       '--cache-dir', os.path.join(tmp, 'cache')])
+        assert get_engine().cache is None
+
+def test_engine_serves_repeated_segments_from_cache():
+    np = pytest.importorskip("numpy")
+    from synth_cache import SynthCache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        engine = SynthesisEngine(cache=SynthCache(cache_dir))
+        request = SynthRequest(text='Welcome back. <break time="0.1s"/> Welcome back.', locale='en-US', dither_bits=32)
+        first = engine.synthesize(request)
+        assert engine.cache.stats.misses == 2 and engine.cache.stats.stores == 1
+        second = engine.synthesize(request)
+        assert engine.cache.stats.hits == 2
+        assert np.allclose(first.pcm, second.pcm, atol=1e-6)
+        changed = SynthRequest(text='Welcome back.', locale='en-US', rate=1.1)
+        engine.synthesize(changed)
+        assert engine.cache.stats.misses == 3
+
+def test_segment_cache_keys_differ_between_locales_sharing_a_model():
+    pytest.importorskip("numpy")
+    from synth_cache import SynthCache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        engine = SynthesisEngine(cache=SynthCache(cache_dir))
+        engine.synthesize(SynthRequest(text='Read the colour chart.', locale='en-US'))
+        engine.synthesize(SynthRequest(text='Read the colour chart.', locale='en-GB'))
+        assert engine.cache.stats.misses == 2 and engine.cache.stats.hits == 0
+
+def test_incremental_render_only_resynthesizes_changed_units():
+    np = pytest.importorskip("numpy")
+    from incremental import IncrementalRenderer, split_units
+
+    assert split_units('One. <prosody rate="1.2">Two. Three.</prosody> Four?\n\nFive') == \
+        ['One.', '<prosody rate="1.2">Two. Three.</prosody> Four?', 'Five']
+
+    class Engine(SynthesisEngine):
+        embedding = np.full(256, 0.5, dtype=np.float32)
+
+        def embedding_for(self, request):
+            return self.embedding
+
+        def encode(self, result, request):
+            return b''
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        engine = Engine()
+        renderer = IncrementalRenderer(engine, os.path.join(out_dir, 'book.mp3'))
+        request = SynthRequest(locale='en-US')
+        assert renderer.render('First line. Second line. Third line.', request) == {'units': 3, 'rendered': 3, 'reused': 0}
+        first = np.fromfile(renderer.pcm_path, dtype=np.float32)
+        assert renderer.render('First line. Second line, fixed. Third line.', request) == {'units': 3, 'rendered': 1, 'reused': 2}
+        spliced = np.fromfile(renderer.pcm_path, dtype=np.float32)
+        unit = len(first) // 3
+        assert np.array_equal(spliced[:unit], first[:unit])
+        assert np.array_equal(spliced[-unit:], first[-unit:])
+        assert renderer.render('First line. Second line, fixed. Third line.', request)['rendered'] == 0
+        assert renderer.render('First line. Second line. Third line.', SynthRequest(locale='en-US', rate=1.2))['rendered'] == 3
+        # A re-recorded voice under the same name invalidates everything
+        engine.embedding = engine.embedding + 0.1
+        assert renderer.render('First line. Second line. Third line.', SynthRequest(locale='en-US', rate=1.2))['rendered'] == 3
+
+def test_dialogue_script_groups_voices_and_places_lines():
+    pytest.importorskip("numpy")
+    from dialogue import parse_script, group_lines, render_script
+    script = parse_script('@speaker ALICE voice=narrator locale=en-US\n'
+                          '@speaker BOB voice=narrator locale=es-ES rate=1.1\n'
+                          'ALICE: Did you hear that?\n'
+                          'BOB [pitch=-1]: Only the wind.\n'
+                          '  It is always the wind.\n'
+                          '@pause 1.5\n'
+                          'ALICE [gap=-0.2]: There it is again!\n')
+    assert [line.speaker for line in script.lines] == ['ALICE', 'BOB', 'ALICE']
+    assert script.lines[1].text == 'Only the wind. It is always the wind.'
+    assert script.lines[1].params == {'voice': 'narrator', 'locale': 'es-ES', 'rate': '1.1', 'pitch': '-1'}
+    groups = group_lines(script.lines, {})
+    assert [[line.index for line, _ in members] for members in groups.values()] == [[0, 2], [1]]
+    with pytest.raises(ValueError):
+        parse_script('ALICE [speed=2]: Hi')
+    # Colons in ordinary text do not start a turn unless the tag is a speaker
+    notes = parse_script('@speaker Alice voice=narrator\nAlice: We meet\nat 10:30.\nNote: bring the map.\nBOB: Fine.')
+    assert [(line.speaker, line.text) for line in notes.lines] == \
+        [('Alice', 'We meet at 10:30. Note: bring the map.'), ('BOB', 'Fine.')]
+    assert notes.lines[1].params == {'voice': 'bob'}
+
+    engine = SynthesisEngine(max_workers=2)
+    try:
+        pcm, timeline = render_script(engine, script, default_gap=0.5)
+    finally:
+        engine.close()
+    first, second, third = timeline
+    assert first['start'] == 0.0 and second['locale'] == 'es-ES'
+    assert second['start'] == pytest.approx(first['end'] + 0.5, abs=1e-3)
+    assert third['start'] == pytest.approx(second['end'] + 1.3, abs=1e-3)
+    assert len(pcm) / 44100 == pytest.approx(third['end'], abs=1e-3)
+
+def test_lexicon_longest_match_and_compiled_format():
+    from lexicon import LEXICON_MAGIC, Lexicon, compile_lexicon, load_lexicon
+    lexicon = Lexicon({'Dr.': 'Doctor', 'Dr': 'Drive', 'AT&T': 'A T and T', 'TTS': 'text to speech'})
+    assert lexicon.apply('Dr. Who lives on Elm Dr, near AT&T. TTSs, TTS!') == \
+        'Doctor Who lives on Elm Drive, near A T and T. TTSs, text to speech!'
+    with tempfile.TemporaryDirectory() as tmp:
+        dict_path = os.path.join(tmp, 'words.txt')
+        with open(dict_path, 'w') as f:
+            f.write('ONNX onyx\nGIF jif\n')
+        compiled = load_lexicon(compile_lexicon(dict_path))
+        assert len(compiled) == 2 and compiled.apply('A GIF of ONNX') == 'A jif of onyx'
+        # Compiled files are plain data: anything but a JSON entry list is refused
+        forged = os.path.join(tmp, 'forged.lex')
+        with open(forged, 'wb') as f:
+            f.write(LEXICON_MAGIC + b'\x80\x04cos\nsystem\n.')
+        assert load_lexicon(forged) is None
+        assert load_lexicon(dict_path) is load_lexicon(dict_path)
+        assert parse_and_normalize_text('GIF <break time="1s"/> ONNX', dict_file=dict_path)[2].text == ' onyx'
+
+def test_mp3_stream_encoder_writes_frames_incrementally():
+    np = pytest.importorskip("numpy")
+    import io
+    from mp3_encoder import MP3StreamEncoder, id3_tag, streaming_available
+    tag = id3_tag(title='Chapter 1')
+    assert tag[:3] == b'ID3' and tag.endswith(b'Chapter 1') and id3_tag() == b''
+    if not streaming_available():
+        pytest.skip("no MP3 encoder backend")
+    out = io.BytesIO()
+    pcm = (0.3 * np.sin(np.arange(44100, dtype=np.float32) * 0.06)).astype(np.float32)
+    with MP3StreamEncoder(out, bitrate=128, title='Chapter 1') as encoder:
+        produced = [encoder.write(pcm[i:i + 4410]) for i in range(0, len(pcm), 4410)]
+        assert sum(map(len, produced)) > 0
+    data = out.getvalue()
+    assert data.startswith(tag) and data[len(tag)] == 0xFF
+    assert encoder.bytes_written == len(data)
+
+def test_engine_streams_mp3_before_synthesis_finishes():
+    pytest.importorskip("numpy")
+    from mp3_encoder import streaming_available
+    from tracing import metrics
+    if not streaming_available():
+        pytest.skip("no MP3 encoder backend")
+    text = 'One two three, four five six. Seven eight nine, ten eleven twelve. Thirteen!'
+    before = metrics.value('tts_inference_segments_total') or 0
+    chunks = SynthesisEngine().stream_mp3(SynthRequest(text=text, locale='en-US'))
+    first = next(chunks)
+    # Only the first phrase has been synthesized when the first bytes go out
+    assert first.startswith(b'\xff') and (metrics.value('tts_inference_segments_total') or 0) - before == 1
+    rest = list(chunks)
+    assert len(rest) >= 4 and (metrics.value('tts_inference_segments_total') or 0) - before == 5
+
+def test_long_form_block_postprocessing_matches_whole_buffer():
+    np = pytest.importorskip("numpy")
+    from longform import SpillFile, postprocess_spill
+    rng = np.random.default_rng(3)
+    pcm = np.concatenate([np.zeros(3000, np.float32), (0.4 * rng.standard_normal(50000)).astype(np.float32),
+                          np.zeros(2000, np.float32)])
+    expected = postprocess_audio(pcm.copy(), 'neutral', -16.0, 32)
+    with tempfile.TemporaryDirectory() as tmp:
+        spill = SpillFile(os.path.join(tmp, 'book.spill'))
+        for start in range(0, len(pcm), 7777):
+            spill.append(pcm[start:start + 7777])
+        assert spill.bounds == (3000, 53000)
+        blocks = []
+        postprocess_spill(spill, SynthRequest(dither_bits=32), lambda block: blocks.append(block.copy()), block_size=4096)
+        spill.remove()
+    assert np.allclose(np.concatenate(blocks), expected, atol=1e-6)
+
+def test_long_form_eq_matches_whole_buffer():
+    np = pytest.importorskip("numpy")
+    from longform import SpillFile, postprocess_spill
+    rng = np.random.default_rng(4)
+    pcm = (0.3 * rng.standard_normal(60000)).astype(np.float32)
+    expected = postprocess_audio(pcm.copy(), 'narration', -16.0, 32)
+    with tempfile.TemporaryDirectory() as tmp:
+        spill = SpillFile(os.path.join(tmp, 'book.spill'))
+        for start in range(0, len(pcm), 7777):
+            spill.append(pcm[start:start + 7777])
+        blocks = []
+        postprocess_spill(spill, SynthRequest(dither_bits=32, eq_preset='narration'), lambda block: blocks.append(block.copy()), block_size=4096)
+        spill.remove()
+    assert np.allclose(np.concatenate(blocks), expected, atol=1e-6)
+
+def test_bench_compare_flags_regressions():
+    from benchmarks.suite import compare, percentile
+    assert percentile([5, 1, 4, 2, 3], 50) == 3 and percentile(list(range(1, 101)), 99) == 99
+    def report(p50, rss):
+        stages = {'normalize': 1.0, 'tokenize': 1.0, 'inference': p50 - 2.0, 'postprocess': 0.5, 'encode': None}
+        return {'results': {'short': {'cold': {'total_ms': 50.0}, 'warm': {'p50_ms': p50, 'p99_ms': p50, 'stages_p50_ms': stages},
+                                      'real_time_factor': p50 / 1000.0, 'peak_rss_mb': rss}}}
+    assert compare(report(20.0, 100.0), report(20.5, 100.0)) == []
+    regressions = compare(report(30.0, 150.0), report(20.0, 100.0), threshold=0.1)
+    assert {r['metric'] for r in regressions} == {'warm.p50_ms', 'warm.p99_ms', 'warm.inference_ms', 'real_time_factor', 'peak_rss_mb'}
+
+def test_tracing_spans_feed_histograms_and_chrome_trace():
+    import json
+    from tracing import MetricsRegistry, span, metrics, start_trace, write_chrome_trace, STAGE_HISTOGRAM
+    registry = MetricsRegistry()
+    registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        registry.observe('latency_seconds', value, stage='infer')
+    registry.counter('jobs_total', 'Jobs.')
+    registry.inc('jobs_total', 2, kind='a"b')
+    text = registry.render()
+    assert 'latency_seconds_bucket{stage="infer",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{stage="infer",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="infer"} 3' in text
+    assert 'jobs_total{kind="a\\"b"} 2' in text
+
+    before = metrics.value(STAGE_HISTOGRAM, stage='unit_test')
+    start_trace()
+    with span('unit_test'):
+        with span('inner'):
+            pass
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'trace.json')
+        assert write_chrome_trace(path) == 2
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+    assert [e['name'] for e in events] == ['inner', 'unit_test'] and events[1]['ph'] == 'X'
+    assert metrics.value(STAGE_HISTOGRAM, stage='unit_test').count == (before.count if before else 0) + 1
+
+def test_cli_startup_does_not_import_heavy_modules():
+    import subprocess
+    import sys
+    heavy = ('numpy', 'onnxruntime', 'flask', 'pydub', 'lameenc', 'engine', 'onnx_session', 'http_server')
+    code = ("import sys, time; start = time.perf_counter(); import cli; elapsed = time.perf_counter() - start; "
+            f"print(elapsed, [m for m in {heavy!r} if m in sys.modules])")
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split(' ', 1)
+    assert out[1].strip() == '[]'
+    # Generous budget: the CLI module itself should import in well under this
+    assert float(out[0]) < 0.25
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -1,5 +1,6 @@
 import re
 from typing import List
+from lexicon import Lexicon, load_lexicon
 
 class TextSegment:
     def __init__(self, text, rate=1.0, pitch=0.0, volume=1.0, break_time=0.0, emphasis=1.0, breath=False):
@@ -11,99 +12,98 @@ class TextSegment:
         self.emphasis = emphasis
         self.breath = breath
 
-def parse_and_normalize_text(text: str, locale='en-US', dict_file=None) -> List[TextSegment]:
-    # Load dictionary
-    dict_map = {}
-    if dict_file:
-        try:
-            with open(dict_file, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) >= 2:
-                        dict_map[parts[0]] = ' '.join(parts[1:])
-        except:
-            pass
-
-    segments = []
-    # Parse <break>, <prosody>, <emphasis>, <breath>
-    break_pattern = r'<break\s+time="([^"]+)"/>'
-    prosody_pattern = r'<prosody\s+([^>]+)>(.*?)</prosody>'
-    emphasis_pattern = r'<emphasis\s+level="([^"]+)">(.*?)</emphasis>'
-    breath_pattern = r'<breath\s*/>'
+# One scanner for the whole supported SSML subset: <break/>, <breath/>,
+# <prosody> and <emphasis>, which may nest. Unknown tags are dropped. A
+# tag never spans a '<', so an unterminated tag fails at the next one
+# instead of rescanning the rest of the text.
+_tag_pattern = re.compile(r'<(/?)([A-Za-z][\w:-]*)((?:"[^"<]*"|\'[^\'<]*\'|[^<>"\'/]|/(?!>))*)(/?)>')
+_attr_pattern = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\']+))')
+# Leftover markup: complete tags, and an unterminated tag at the end of a segment
+_any_tag = re.compile(r'<[^<>]*>|<[A-Za-z/][^<>]*$')
+EMPHASIS_LEVELS = {'strong': 1.5, 'moderate': 1.2, 'reduced': 1.0, 'none': 1.0}
 
-    while text:
-        break_match = re.search(break_pattern, text)
-        prosody_match = re.search(prosody_pattern, text)
-        emphasis_match = re.search(emphasis_pattern, text)
-        breath_match = re.search(breath_pattern, text)
+class _Prosody:
+    # Effective prosody inside a tag; nested tags compose with their parent
+    def __init__(self, tag='', rate=1.0, pitch=0.0, volume=1.0, emphasis=1.0):
+        self.tag = tag
+        self.rate = rate
+        self.pitch = pitch
+        self.volume = volume
+        self.emphasis = emphasis
 
-        if not break_match and not prosody_match and not emphasis_match and not breath_match:
-            if text.strip():
-                segments.append(TextSegment(normalize_segment(text, dict_map)))
-            break
+def parse_attrs(attrs: str) -> dict:
+    """Attributes of a tag as a dict, e.g. 'rate="1.2" level=strong' -> {'rate': '1.2', 'level': 'strong'}."""
+    return {m.group(1): next(v for v in m.group(2, 3, 4) if v is not None) for m in _attr_pattern.finditer(attrs)}
 
-        # Find earliest match
-        matches = [(break_match, 'break'), (prosody_match, 'prosody'), (emphasis_match, 'emphasis'), (breath_match, 'breath')]
-        matches = [(m, t) for m, t in matches if m]
-        if not matches:
-            segments.append(TextSegment(normalize_segment(text, dict_map)))
-            break
+def _float_attr(attrs: dict, name: str, default: float) -> float:
+    try:
+        return float(attrs[name])
+    except (KeyError, ValueError):
+        return default
 
-        matches.sort(key=lambda x: x[0].start())
-        match, tag = matches[0]
+def _break_seconds(value) -> float:
+    try:
+        if value.endswith('ms'):
+            return float(value[:-2]) / 1000.0
+        return float(value.rstrip('s'))
+    except (AttributeError, ValueError):
+        return 1.0
 
-        # Text before
-        before = text[:match.start()]
+def iter_segments(text: str, locale='en-US', dict_file=None):
+    """Parse SSML in a single left-to-right pass, yielding segments as they are found."""
+    lexicon = load_lexicon(dict_file)
+    stack = [_Prosody()]
+    pos = 0
+    emitted = False
+    for match in _tag_pattern.finditer(text):
+        before = text[pos:match.start()]
+        pos = match.end()
         if before.strip():
-            segments.append(TextSegment(normalize_segment(before, dict_map)))
-
-        if tag == 'break':
-            time_str = match.group(1)
-            try:
-                time_val = float(time_str.rstrip('s'))
-            except:
-                time_val = 1.0
-            segments.append(TextSegment('', break_time=time_val))
+            top = stack[-1]
+            yield TextSegment(_normalize(before, lexicon), top.rate, top.pitch, top.volume, emphasis=top.emphasis)
+            emitted = True
+        closing, tag, attrs, self_closing = match.groups()
+        tag = tag.lower()
+        if closing:
+            # Pop back to the matching open tag; stray closers are ignored
+            for i in range(len(stack) - 1, 0, -1):
+                if stack[i].tag == tag:
+                    del stack[i:]
+                    break
+        elif tag == 'break':
+            yield TextSegment('', break_time=_break_seconds(parse_attrs(attrs).get('time')))
+            emitted = True
+        elif tag == 'breath':
+            yield TextSegment('', breath=True)
+            emitted = True
+        elif self_closing:
+            continue
         elif tag == 'prosody':
-            attrs = match.group(1)
-            content = match.group(2)
-            rate = 1.0
-            pitch = 0.0
-            volume = 1.0
-            for attr in attrs.split():
-                if attr.startswith('rate='):
-                    rate = float(attr.split('=')[1])
-                elif attr.startswith('pitch='):
-                    pitch = float(attr.split('=')[1])
-                elif attr.startswith('volume='):
-                    volume = float(attr.split('=')[1])
-            segments.append(TextSegment(normalize_segment(content, dict_map), rate, pitch, volume))
+            attrs = parse_attrs(attrs)
+            top = stack[-1]
+            stack.append(_Prosody(tag, top.rate * _float_attr(attrs, 'rate', 1.0), top.pitch + _float_attr(attrs, 'pitch', 0.0),
+                                  top.volume * _float_attr(attrs, 'volume', 1.0), top.emphasis))
         elif tag == 'emphasis':
-            level = match.group(1)
-            content = match.group(2)
-            emphasis = 1.5 if level == 'strong' else 1.2 if level == 'moderate' else 1.0
-            segments.append(TextSegment(normalize_segment(content, dict_map), emphasis=emphasis))
-        elif tag == 'breath':
-            segments.append(TextSegment('', breath=True))
+            level = parse_attrs(attrs).get('level', 'moderate')
+            top = stack[-1]
+            stack.append(_Prosody(tag, top.rate, top.pitch, top.volume, max(top.emphasis, EMPHASIS_LEVELS.get(level, 1.0))))
+    rest = text[pos:]
+    if rest.strip() or not emitted:
+        top = stack[-1]
+        yield TextSegment(_normalize(rest, lexicon), top.rate, top.pitch, top.volume, emphasis=top.emphasis)
 
-        text = text[match.end():]
-
-    if not segments:
-        segments.append(TextSegment(normalize_segment(text, dict_map)))
+def parse_and_normalize_text(text: str, locale='en-US', dict_file=None) -> List[TextSegment]:
+    return list(iter_segments(text, locale, dict_file))
 
-    return segments
+def _normalize(text: str, lexicon) -> str:
+    # Markup the parser did not consume never reaches the tokenizer
+    text = _any_tag.sub(' ', text)
+    if lexicon is not None:
+        text = lexicon.apply(text)
+    return text
 
 def normalize_segment(text: str, dict_map: dict) -> str:
-    result = text
-    # Apply dict
-    for word, repl in dict_map.items():
-        result = re.sub(r'\b' + re.escape(word) + r'\b', repl, result)
-    # Remove other tags
-    result = re.sub(r'<break[^>]*>', ' ', result)
-    result = re.sub(r'<prosody[^>]*>.*?</prosody>', ' ', result)
-    result = re.sub(r'<emphasis[^>]*>.*?</emphasis>', ' ', result)
-    result = re.sub(r'<breath[^>]*>', ' ', result)
-    return result
+    return _normalize(text, Lexicon(dict_map))
 
 def normalize_text(text: str, locale='en-US', dict_file=None) -> str:
     segments = parse_and_normalize_text(text, locale, dict_file)
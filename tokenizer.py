@@ -1,6 +1,21 @@
+import itertools
+import json
+import os
 import re
+import threading
+from functools import lru_cache
 from typing import List
 
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+    np = None
+
+PAD_ID = 0
+WORD_CACHE_SIZE = 65536
+
 # Vocabularies
 vocabs = {
     'en-US': {
@@ -45,38 +60,100 @@ vocabs = {
 def get_vocab(locale: str) -> dict:
     return vocabs.get(locale, vocabs['en-US'])
 
-def tokenize(text: str, locale='en-US') -> List[int]:
-    vocab = get_vocab(locale)
-    tokens = []
-    words = re.findall(r'\b\w+\b', text.lower())
-    for word in words:
-        if locale == 'en-US':
-            phonemes = grapheme_to_phoneme(word)
-            for p in phonemes:
-                tokens.append(vocab.get(p, 0))
-        else:
-            tokens.append(vocab.get(word, 0))
-    return tokens
+_word = re.compile(r'\b\w+\b')
+# Digraphs first so "th" wins over "t" at the same position
+_grapheme = re.compile(r'th|sh|ch|.', re.S)
+_DIGRAPHS = {'th': 'θ', 'sh': 'ʃ', 'ch': 'tʃ'}
 
 def grapheme_to_phoneme(word: str) -> List[str]:
     # Basic G2P for English
-    phonemes = []
-    word = word.lower()
-    i = 0
-    while i < len(word):
-        if word[i:i+2] == 'th':
-            phonemes.append('θ')
-            i += 2
-        elif word[i:i+2] == 'sh':
-            phonemes.append('ʃ')
-            i += 2
-        elif word[i:i+2] == 'ch':
-            phonemes.append('tʃ')
-            i += 2
-        elif word[i] in 'aeiou':
-            phonemes.append(word[i])
-            i += 1
-        else:
-            phonemes.append(word[i])
-            i += 1
-    return phonemes
\ No newline at end of file
+    return [_DIGRAPHS.get(g, g) for g in _grapheme.findall(word.lower())]
+
+def pad_batch(sequences, pad_id=PAD_ID):
+    """Right-pad token sequences into an int64 [batch, max_len] array plus lengths."""
+    lengths = np.fromiter((len(seq) for seq in sequences), dtype=np.int64, count=len(sequences))
+    ids = np.full((len(sequences), max(int(lengths.max(initial=0)), 1)), pad_id, dtype=np.int64)
+    for row, seq in enumerate(sequences):
+        ids[row, :lengths[row]] = seq
+    return ids, lengths
+
+class Tokenizer:
+    """Text to token ids for one locale.
+
+    Each distinct word goes through G2P and the vocabulary once; after
+    that its ids come from an LRU cache, so running text costs a regex
+    scan plus one dict lookup per word.
+    """
+
+    def __init__(self, locale='en-US', vocab=None, g2p=None, cache_size=WORD_CACHE_SIZE):
+        self.locale = locale
+        self.vocab = vocab or get_vocab(locale)
+        # Only the English vocabulary is phoneme based
+        self.g2p = (locale == 'en-US') if g2p is None else g2p
+        self.word_ids = lru_cache(maxsize=cache_size)(self._lookup_word)
+
+    @classmethod
+    def from_file(cls, path: str, locale='en-US', cache_size=WORD_CACHE_SIZE) -> 'Tokenizer':
+        """Load models/tokenizer_*.json; an empty vocabulary means the built-in one."""
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(locale, config.get('vocab') or None, config.get('g2p'), cache_size)
+
+    def _lookup_word(self, word: str) -> tuple:
+        vocab = self.vocab
+        if self.g2p:
+            return tuple(vocab.get(p, 0) for p in grapheme_to_phoneme(word))
+        return (vocab.get(word, 0),)
+
+    def encode(self, text: str) -> List[int]:
+        return list(itertools.chain.from_iterable(map(self.word_ids, _word.findall(text.lower()))))
+
+    def encode_array(self, text: str):
+        ids = itertools.chain.from_iterable(map(self.word_ids, _word.findall(text.lower())))
+        return np.fromiter(ids, dtype=np.int64)
+
+    def tokenize_batch(self, texts, pad_id=PAD_ID):
+        """Tokenize many texts into a padded int64 id matrix and their lengths."""
+        word_ids = self.word_ids
+        per_text = [[word_ids(w) for w in _word.findall(text.lower())] for text in texts]
+        lengths = np.fromiter((sum(map(len, words)) for words in per_text), dtype=np.int64, count=len(texts))
+        flat = np.fromiter(itertools.chain.from_iterable(itertools.chain.from_iterable(per_text)), dtype=np.int64,
+                           count=int(lengths.sum()))
+        ids = np.full((len(texts), max(int(lengths.max(initial=0)), 1)), pad_id, dtype=np.int64)
+        # Row-major fill of the unpadded positions, in one assignment
+        ids[np.arange(ids.shape[1]) < lengths[:, np.newaxis]] = flat
+        return ids, lengths
+
+# locale -> ((path, file version), Tokenizer)
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+def get_tokenizer(locale='en-US') -> Tokenizer:
+    from multilingual import get_model_for_locale
+    path = get_model_for_locale(locale).tokenizer_path
+    try:
+        st = os.stat(path)
+        version = (path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        version = None
+    with _tokenizers_lock:
+        cached = _tokenizers.get(locale)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    tokenizer = None
+    if version is not None:
+        try:
+            tokenizer = Tokenizer.from_file(path, locale)
+        except (OSError, ValueError) as e:
+            print(f"Error loading tokenizer {path}: {e}")
+    if tokenizer is None:
+        tokenizer = Tokenizer(locale)
+    with _tokenizers_lock:
+        _tokenizers[locale] = (version, tokenizer)
+    return tokenizer
+
+def tokenize(text: str, locale='en-US') -> List[int]:
+    return get_tokenizer(locale).encode(text)
+
+def tokenize_batch(texts, locale='en-US'):
+    return get_tokenizer(locale).tokenize_batch(texts)
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; suits anything from a tokenizer call to a long render
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_HISTOGRAM = 'tts_stage_duration_seconds'
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Per-bucket counts; the last slot is +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Process-wide counters and histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, help, buckets)
+        self._families = {}
+        # name -> {label tuple: value or Histogram}
+        self._series = {}
+
+    def counter(self, name: str, help_text: str):
+        with self._lock:
+            self._families.setdefault(name, ('counter', help_text, None))
+            self._series.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            self._families.setdefault(name, ('histogram', help_text, tuple(buckets)))
+            self._series.setdefault(name, {})
+
+    def inc(self, name: str, value=1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                family = self._families.get(name)
+                histogram = series[key] = Histogram(family[2] if family else DEFAULT_BUCKETS)
+            histogram.observe(value)
+
+    def value(self, name: str, **labels):
+        with self._lock:
+            return self._series.get(name, {}).get(tuple(sorted(labels.items())))
+
+    def clear(self):
+        with self._lock:
+            for series in self._series.values():
+                series.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted(self._series):
+                kind, help_text, _ = self._families.get(name, ('untyped', '', None))
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(self._series[name].items()):
+                    if isinstance(value, Histogram):
+                        cumulative = 0
+                        for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                            cumulative += count
+                            le = '+Inf' if bound == float('inf') else repr(bound)
+                            lines.append(f"{name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+                        lines.append(f"{name}_sum{_labels(key)} {value.sum!r}")
+                        lines.append(f"{name}_count{_labels(key)} {value.count}")
+                    else:
+                        lines.append(f"{name}{_labels(key)} {value!r}")
+        return '\n'.join(lines) + '\n'
+
+def _labels(key) -> str:
+    if not key:
+        return ''
+    pairs = []
+    for name, value in key:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+metrics = MetricsRegistry()
+metrics.histogram(STAGE_HISTOGRAM, 'Time spent in each synthesis pipeline stage.')
+metrics.counter('tts_requests_total', 'Synthesis requests completed.')
+metrics.counter('tts_audio_seconds_total', 'Seconds of audio synthesized.')
+metrics.counter('tts_inference_batches_total', 'Model calls made for inference.')
+metrics.counter('tts_inference_segments_total', 'Segments run through the model.')
+
+# Span events recorded for a Chrome trace: (name, start_ns, end_ns, thread id).
+# None while no trace is being recorded, which keeps spans to two clock reads.
+_trace = None
+_trace_started_ns = 0
+
+class span:
+    """Times a pipeline stage into the stage histogram (and the trace, if recording).
+
+        with span('inference'):
+            ...
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        metrics.observe(STAGE_HISTOGRAM, (end - self.start) / 1e9, stage=self.name)
+        trace = _trace
+        if trace is not None:
+            trace.append((self.name, self.start, end, threading.get_ident()))
+        return False
+
+def start_trace():
+    global _trace, _trace_started_ns
+    _trace_started_ns = time.perf_counter_ns()
+    _trace = []
+
+def stop_trace() -> list:
+    global _trace
+    events, _trace = _trace or [], None
+    return events
+
+def write_chrome_trace(path: str, events=None) -> int:
+    """Write recorded spans as Chrome trace JSON (chrome://tracing, Perfetto)."""
+    if events is None:
+        events = stop_trace()
+    pid = os.getpid()
+    trace_events = [{'name': name, 'cat': 'tts', 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': (start - _trace_started_ns) / 1000.0, 'dur': (end - start) / 1000.0}
+                    for name, start, end, tid in events]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+    return len(trace_events)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def render_metrics() -> str:
+    return metrics.render()
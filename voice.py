@@ -1,10 +1,12 @@
 import json
 import os
 import shutil
+import threading
+import time
 from typing import List
 
 class VoiceMetadata:
-    def __init__(self, name, gender='unknown', locale='en-US', sample_rate=44100, description='', sample_file='', checksum=''):
+    def __init__(self, name, gender='unknown', locale='en-US', sample_rate=44100, description='', sample_file='', checksum='', eq_preset='neutral'):
         self.name = name
         self.gender = gender
         self.locale = locale
@@ -12,38 +14,198 @@ class VoiceMetadata:
         self.description = description
         self.sample_file = sample_file
         self.checksum = checksum
+        self.eq_preset = eq_preset
 
-def list_voices() -> List[VoiceMetadata]:
-    voices = []
-    voices_dir = "voices/"
-    if not os.path.exists(voices_dir):
-        return voices
-    for file in os.listdir(voices_dir):
-        if file.endswith('.json'):
-            json_path = os.path.join(voices_dir, file)
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'gender': self.gender,
+            'locale': self.locale,
+            'sample_rate': self.sample_rate,
+            'description': self.description,
+            'sample_file': self.sample_file,
+            'checksum': self.checksum,
+            'eq_preset': self.eq_preset
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'VoiceMetadata':
+        return cls(
+            data['name'],
+            data.get('gender', 'unknown'),
+            data.get('locale', 'en-US'),
+            data.get('sample_rate', 44100),
+            data.get('description', ''),
+            data.get('sample_file', ''),
+            data.get('checksum', ''),
+            data.get('eq_preset', 'neutral')
+        )
+
+INDEX_FILE_NAME = ".index.json"
+INDEX_VERSION = 2
+
+class VoiceIndex:
+    """In-process index of the voice bank, refreshed incrementally.
+
+    Only metadata files whose (mtime, size) changed since the last scan are
+    parsed again. Directory scans are throttled to one per `ttl` seconds
+    unless the directory itself changed (a voice was added or removed).
+    """
+
+    def __init__(self, voices_dir="voices/", index_path=None, ttl=1.0):
+        self.voices_dir = voices_dir
+        self.index_path = index_path
+        self.ttl = ttl
+        self._files = {}
+        self._by_name = {}
+        self._by_locale = {}
+        self._by_gender = {}
+        self._dir_mtime = None
+        self._scanned_at = None
+        self._lock = threading.Lock()
+        if index_path:
+            self._load_index_file()
+
+    def _load_index_file(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != INDEX_VERSION:
+                return
+            for file, entry in data['files'].items():
+                meta = VoiceMetadata.from_dict(entry['meta']) if entry['meta'] else None
+                self._files[file] = (entry['mtime_ns'], entry['size'], meta)
+            self._rebuild()
+        except (OSError, ValueError, KeyError):
+            self._files = {}
+
+    def _save_index_file(self):
+        data = {
+            'version': INDEX_VERSION,
+            'files': {
+                file: {'mtime_ns': mtime_ns, 'size': size, 'meta': meta.to_dict() if meta else None}
+                for file, (mtime_ns, size, meta) in self._files.items()
+            }
+        }
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass
+
+    def _rebuild(self):
+        by_name = {}
+        for file in sorted(self._files):
+            meta = self._files[file][2]
+            if meta is not None:
+                by_name[meta.name] = meta
+        by_locale = {}
+        by_gender = {}
+        for meta in sorted(by_name.values(), key=lambda m: m.name):
+            by_locale.setdefault(meta.locale, []).append(meta)
+            by_gender.setdefault(meta.gender, []).append(meta)
+        self._by_name, self._by_locale, self._by_gender = by_name, by_locale, by_gender
+
+    def invalidate(self):
+        with self._lock:
+            self._scanned_at = None
+
+    def refresh(self, force=False):
+        with self._lock:
             try:
-                with open(json_path, 'r') as f:
-                    data = json.load(f)
-                meta = VoiceMetadata(
-                    data['name'],
-                    data.get('gender', 'unknown'),
-                    data.get('locale', 'en-US'),
-                    data.get('sample_rate', 44100),
-                    data.get('description', ''),
-                    data.get('sample_file', ''),
-                    data.get('checksum', '')
-                )
-                voices.append(meta)
-            except:
-                pass
-    return voices
+                dir_mtime = os.stat(self.voices_dir).st_mtime_ns
+            except OSError:
+                if self._files:
+                    self._files = {}
+                    self._rebuild()
+                return
+            now = time.monotonic()
+            if (not force and self._scanned_at is not None and dir_mtime == self._dir_mtime
+                    and now - self._scanned_at < self.ttl):
+                return
+            self._dir_mtime = dir_mtime
+            self._scanned_at = now
+
+            changed = False
+            seen = set()
+            for entry in os.scandir(self.voices_dir):
+                if not entry.name.endswith('.json') or entry.name == INDEX_FILE_NAME:
+                    continue
+                seen.add(entry.name)
+                st = entry.stat()
+                cached = self._files.get(entry.name)
+                if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                    continue
+                try:
+                    with open(entry.path, 'r') as f:
+                        meta = VoiceMetadata.from_dict(json.load(f))
+                except Exception:
+                    meta = None
+                self._files[entry.name] = (st.st_mtime_ns, st.st_size, meta)
+                changed = True
+            for file in set(self._files) - seen:
+                del self._files[file]
+                changed = True
+            if changed:
+                self._rebuild()
+                if self.index_path:
+                    self._save_index_file()
+                    # The index may live in the directory it describes; its
+                    # own write must not look like a voice being added
+                    try:
+                        self._dir_mtime = os.stat(self.voices_dir).st_mtime_ns
+                    except OSError:
+                        pass
+
+    def get(self, name: str):
+        self.refresh()
+        return self._by_name.get(name)
+
+    def all(self) -> List[VoiceMetadata]:
+        self.refresh()
+        return sorted(self._by_name.values(), key=lambda m: m.name)
+
+    def find(self, locale=None, gender=None) -> List[VoiceMetadata]:
+        self.refresh()
+        if locale is not None:
+            voices = self._by_locale.get(locale, [])
+            if gender is not None:
+                voices = [v for v in voices if v.gender == gender]
+            return list(voices)
+        if gender is not None:
+            return list(self._by_gender.get(gender, []))
+        return self.all()
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_voice_index(voices_dir="voices/", index_path=None) -> VoiceIndex:
+    """Shared index for `voices_dir`, persisted to `index_path` if one is given."""
+    key = os.path.abspath(voices_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = VoiceIndex(voices_dir, index_path)
+            _indexes[key] = index
+        return index
+
+def list_voices() -> List[VoiceMetadata]:
+    return get_voice_index().all()
+
+def find_voices(locale=None, gender=None) -> List[VoiceMetadata]:
+    return get_voice_index().find(locale, gender)
 
 def get_voice_metadata(name: str) -> VoiceMetadata:
-    voices = list_voices()
-    for v in voices:
-        if v.name == name:
-            return v
-    raise RuntimeError("Voice not found")
+    meta = get_voice_index().get(name)
+    if meta is None:
+        raise RuntimeError("Voice not found")
+    return meta
+
+def get_voice_eq_preset(name: str) -> str:
+    meta = get_voice_index().get(name)
+    return meta.eq_preset if meta else 'neutral'
 
 def import_voice(embedding_path: str, name: str) -> bool:
     try:
@@ -62,6 +224,7 @@ def import_voice(embedding_path: str, name: str) -> bool:
         }
         with open(json_path, 'w') as f:
             json.dump(data, f, indent=4)
+        get_voice_index().invalidate()
         # Generate sample audio
         generate_voice_sample(name)
         return True
@@ -0,0 +1,65 @@
+import os
+import time
+from multilingual import MANIFEST_PATH, load_model_manifest
+from session_pool import get_pool
+from onnx_session import InferenceJob
+from embedding_loader import EMBEDDING_DIM
+from batching import DEFAULT_MAX_BATCH_SIZE
+from tokenizer import get_tokenizer
+
+# A short phrase, a typical sentence and a long one; the first run at each
+# shape is where ONNX Runtime sizes its arena and picks kernels
+WARMUP_TOKEN_LENGTHS = (8, 32, 128)
+
+def manifest_model_paths(manifest_path=MANIFEST_PATH):
+    """Models listed in the manifest that exist on disk, in manifest order."""
+    model_dir = os.path.dirname(manifest_path)
+    paths = []
+    for name in load_model_manifest(manifest_path):
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            paths.append(path)
+    return paths
+
+def warm_up_model(model_path, token_lengths=WARMUP_TOKEN_LENGTHS, batch_size=DEFAULT_MAX_BATCH_SIZE, pool=None):
+    """Load one model into the pool and run dummy inferences through it.
+
+    Returns (load seconds, warm-up inference seconds).
+    """
+    if pool is None:
+        pool = get_pool()
+    started = time.perf_counter()
+    session = pool.get(model_path)
+    loaded = time.perf_counter()
+    embedding = [0.0] * EMBEDDING_DIM
+    for length in token_lengths:
+        job = InferenceJob([1] * length, embedding)
+        session.run_inference(job.tokens, job.embedding)
+        if batch_size > 1 and session.supports_batching():
+            session.run_batch_inference([job] * batch_size)
+    return loaded - started, time.perf_counter() - loaded
+
+def warm_up(model_paths=None, token_lengths=WARMUP_TOKEN_LENGTHS, batch_size=DEFAULT_MAX_BATCH_SIZE, pool=None, log=print):
+    """Preload every manifest model (or `model_paths`) before serving traffic.
+
+    Also loads the tokenizer for each model's locale. Returns
+    {model path: (load seconds, warm-up seconds)}.
+    """
+    manifest = load_model_manifest()
+    timings = {}
+    started = time.perf_counter()
+    for path in model_paths if model_paths is not None else manifest_model_paths():
+        entry = manifest.get(os.path.basename(path), {})
+        if entry.get('locale'):
+            get_tokenizer(entry['locale'])
+        try:
+            timings[path] = warm_up_model(path, token_lengths, batch_size, pool)
+        except Exception as e:
+            print(f"Warm-up of {path} failed: {e}")
+            continue
+        if log:
+            load_s, warm_s = timings[path]
+            log(f"Warmed {path}: loaded in {load_s * 1000:.0f} ms, warm-up inference {warm_s * 1000:.0f} ms")
+    if log:
+        log(f"Warm-up finished in {time.perf_counter() - started:.2f}s ({len(timings)} models)")
+    return timings